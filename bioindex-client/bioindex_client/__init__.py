@@ -0,0 +1,3 @@
+from .client import BIOINDEX_URL, BioindexClient, BioindexError
+
+__all__ = ["BIOINDEX_URL", "BioindexClient", "BioindexError"]
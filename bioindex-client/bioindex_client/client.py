@@ -0,0 +1,389 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - depends on the environment
+    ijson = None
+
+# Base URL of the bioindex API, overridable e.g. to point clients at a local stand-in
+BIOINDEX_URL = os.getenv("BIOINDEX_URL", "https://bioindex-dev.hugeamp.org")
+
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Request errors worth retrying: connection failures, timeouts and bodies cut off or
+# garbled in transit
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+)
+
+# Endpoint name under which continuation requests are counted
+CONTINUATION_ENDPOINT = "cont"
+
+# Called with every successful response and the number of body bytes received
+ResponseCallback = Callable[[requests.Response, int], None]
+
+
+class BioindexError(ValueError):
+    """A bioindex request that failed, after retries where the failure was transient."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _require_ijson():
+    if ijson is None:
+        raise ImportError("Streaming decoding requires ijson: pip install 'bioindex-client[streaming]'")
+
+
+def _project(record: dict, fields: Optional[Sequence[str]]) -> dict:
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def _close_fetched(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+class _CountingReader:
+    """File-like wrapper counting the bytes read from a response body."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class BioindexClient:
+    """
+    HTTP client for the bioindex API shared by kg_ingress and portal_tools.
+
+    Every thread gets its own requests.Session, so connections are kept alive and reused
+    across pages and queries without sharing a session between threads. The sessions of
+    threads that have ended are closed once another thread first uses the client, so a
+    client used from many short-lived threads keeps about one per live thread.
+
+    Requests time out after `timeout` seconds (a number, or a (connect, read) tuple) and
+    ask for gzip encoded responses. Connection errors, timeouts, truncated or undecodable
+    bodies and 429 or 5xx responses are retried up to `retries` times with exponential backoff and full jitter: attempt n
+    waits a random time up to min(`max_backoff`, `backoff` * 2**n) seconds, or the
+    server's Retry-After.
+
+    Requests, retries, failures, bytes received and seconds spent are counted per
+    endpoint, i.e. per index queried plus "cont" for continuation pages; see stats().
+
+    With `prefetch`, paginated queries fetch and decode the next page in a background
+    thread while the caller consumes the current one, see query_pages.
+
+    With `stream=True`, query_pages and query_records decode response bodies
+    incrementally with ijson as they arrive, keeping only the requested `fields` of every
+    record, instead of reading a whole body and building all of its records first. This
+    needs the optional ijson dependency.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Union[float, Tuple[float, float]] = (10, 120),
+        retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        pool_size: int = 16,
+        prefetch: bool = True,
+    ):
+        if retries < 0:
+            raise ValueError(f"retries must not be negative, got {retries}")
+        self.base_url = (base_url or BIOINDEX_URL).rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.prefetch = prefetch
+        self._prefetcher = None
+        # Session of every thread that used the client, keyed by its Thread object
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's session, created on first use."""
+        thread = threading.current_thread()
+        session = self._sessions.get(thread)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Accept-Encoding"] = "gzip"
+            with self._lock:
+                ended = [self._sessions.pop(other) for other in list(self._sessions) if not other.is_alive()]
+                self._sessions[thread] = session
+            for other in ended:
+                other.close()
+        return session
+
+    def close(self):
+        """Stops the prefetch threads and closes the sessions of all threads."""
+        with self._lock:
+            prefetcher, self._prefetcher = self._prefetcher, None
+        if prefetcher is not None:
+            prefetcher.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _count(self, endpoint: str, **values):
+        with self._lock:
+            counters = self._counters.setdefault(
+                endpoint, {"requests": 0, "retries": 0, "failures": 0, "bytes": 0, "seconds": 0.0}
+            )
+            for field, value in values.items():
+                counters[field] += value
+
+    def stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """Returns a copy of the request counters, keyed by endpoint."""
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, path: str, params: Optional[dict] = None, endpoint: Optional[str] = None, stream: bool = False) -> requests.Response:
+        """
+        Sends a GET request to `path` under the base URL, retrying transient failures.
+
+        Returns the successful response. Raises BioindexError if the response status is
+        not 200, or if the request still fails after the last retry. With `stream`, the
+        body of a successful response is left unread for the caller, who must close it,
+        and only failures before the body is read are retried; errors reading it later
+        are raised as BioindexError.
+        """
+        url = f"{self.base_url}{path}"
+        endpoint = endpoint or path
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+                # Bodies are read inside the try, so one cut off in transit is retried, except
+                # the streamed body of a successful response, which is left to the caller
+                size = 0 if stream and response.status_code == 200 else len(response.content)
+            except RETRY_ERRORS as e:
+                error, status_code = e, None
+            else:
+                self._count(endpoint, bytes=size)
+                if response.status_code == 200:
+                    self._count(endpoint, requests=1, seconds=time.perf_counter() - start)
+                    return response
+                error, status_code = None, response.status_code
+            self._count(endpoint, requests=1, seconds=time.perf_counter() - start)
+            transient = status_code is None or status_code in RETRY_STATUSES
+            if not transient or attempt == self.retries:
+                self._count(endpoint, failures=1)
+                if error is not None:
+                    raise BioindexError(f"Request to {endpoint} failed: {error}") from error
+                raise BioindexError(f"Request to {endpoint} failed with status {status_code}", status_code)
+            self._count(endpoint, retries=1)
+            time.sleep(self._delay(attempt, response))
+
+    def _fetch_page(self, path: str, params: dict, endpoint: str) -> Tuple[requests.Response, dict]:
+        response = self.get(path, params=params, endpoint=endpoint)
+        return response, response.json()
+
+    def _submit(self, function, *args, **kwargs):
+        with self._lock:
+            if self._prefetcher is None:
+                self._prefetcher = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="bioindex-prefetch")
+            prefetcher = self._prefetcher
+        return prefetcher.submit(function, *args, **kwargs)
+
+    def _stream_records(self, response: requests.Response, endpoint: str, fields: Optional[Sequence[str]], page: dict, on_continuation: Callable[[Optional[str]], None]) -> Iterator[dict]:
+        """
+        Yields the records of a streamed response as they are decoded, projected to
+        `fields`. Stores the continuation token and the bytes read in `page`, and calls
+        `on_continuation` as soon as the token is decoded.
+        """
+        response.raw.decode_content = True
+        reader = _CountingReader(response.raw)
+        builder = None
+        try:
+            for prefix, event, value in ijson.parse(reader, use_float=True):
+                if prefix == "continuation":
+                    page["continuation"] = value
+                    on_continuation(value)
+                elif prefix == "data.item":
+                    # Record boundaries and keys; nested values come with longer prefixes
+                    if event == "start_map":
+                        builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    if event == "end_map":
+                        yield _project(builder.value, fields)
+                        builder = None
+                elif builder is not None:
+                    builder.event(event, value)
+        except urllib3.exceptions.HTTPError as e:
+            # Rows of the page may already be yielded, so a streamed body is not retried
+            self._count(endpoint, failures=1)
+            raise BioindexError(f"Reading the response from {endpoint} failed: {e}") from e
+        finally:
+            response.close()
+            page["bytes"] = reader.bytes_read
+            self._count(endpoint, bytes=reader.bytes_read)
+
+    def _stream_pages(self, index: str, q: str, fields: Optional[Sequence[str]], on_response: Optional[ResponseCallback]) -> Iterator[Tuple[Iterator[dict], dict]]:
+        """
+        Yields an iterator over the records of every page, decoded as they arrive, and the
+        dict its continuation token is stored in. Each iterator must be exhausted before
+        the next page is taken. With prefetch, the next page is requested as soon as the
+        continuation token of the current one is decoded.
+        """
+        _require_ijson()
+        response = self.get(f"/api/bio/query/{index}", params={"q": q}, endpoint=index, stream=True)
+        endpoint = index
+        upcoming = []
+
+        def on_continuation(token):
+            if token and self.prefetch:
+                upcoming.append(self._submit(self.get, "/api/bio/cont", params={"token": token}, endpoint=CONTINUATION_ENDPOINT, stream=True))
+
+        try:
+            while True:
+                page = {"continuation": None, "bytes": 0}
+                yield self._stream_records(response, endpoint, fields, page, on_continuation), page
+                if on_response is not None:
+                    on_response(response, page["bytes"])
+                if not page["continuation"]:
+                    return
+                endpoint = CONTINUATION_ENDPOINT
+                if upcoming:
+                    response = upcoming.pop().result()
+                else:
+                    response = self.get("/api/bio/cont", params={"token": page["continuation"]}, endpoint=endpoint, stream=True)
+        finally:
+            # A caller that stops early leaves the current body unread, and a page fetched
+            # ahead is discarded once its request completes, without waiting for it
+            response.close()
+            for future in upcoming:
+                if not future.cancel():
+                    future.add_done_callback(_close_fetched)
+
+    def query_pages(
+        self,
+        index: str,
+        q: str,
+        on_response: Optional[ResponseCallback] = None,
+        fields: Optional[Sequence[str]] = None,
+        stream: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Queries a bioindex index and follows its continuation tokens.
+
+        Yields the body of every response, a dict whose 'data' holds the rows of the page
+        and whose 'continuation' is None on the last page. `on_response` is called with
+        every successful response and its body size, e.g. to record its size and latency.
+        With `fields`, rows only keep those fields.
+
+        The continuation token of a page is only known once the page is decoded, so pages
+        are requested one after the other. With prefetch, the request for page N+1 is
+        sent and its body decoded in a background thread before page N is yielded, so
+        the network round trip overlaps with whatever the caller does with page N. Errors
+        of a prefetched page are raised when the caller asks for it.
+
+        With `stream`, every body is decoded incrementally and only its projected rows are
+        kept; the yielded dicts then hold just 'data' and 'continuation'.
+        """
+        if stream:
+            for records, page in self._stream_pages(index, q, fields, on_response):
+                rows = list(records)
+                yield {"data": rows, "continuation": page["continuation"]}
+            return
+        page = self._fetch_page(f"/api/bio/query/{index}", {"q": q}, index)
+        upcoming = None
+        try:
+            while True:
+                response, data = page
+                continuation = data.get("continuation")
+                if continuation and self.prefetch:
+                    upcoming = self._submit(self._fetch_page, "/api/bio/cont", {"token": continuation}, CONTINUATION_ENDPOINT)
+                if on_response is not None:
+                    on_response(response, len(response.content))
+                if fields is not None:
+                    data["data"] = [_project(row, fields) for row in data["data"]]
+                yield data
+                if not continuation:
+                    return
+                if upcoming is not None:
+                    page, upcoming = upcoming.result(), None
+                else:
+                    page = self._fetch_page("/api/bio/cont", {"token": continuation}, CONTINUATION_ENDPOINT)
+        finally:
+            # A caller that stops early does not wait for the page fetched ahead
+            if upcoming is not None:
+                upcoming.cancel()
+
+    def query_records(
+        self,
+        index: str,
+        q: str,
+        fields: Optional[Sequence[str]] = None,
+        stream: bool = True,
+        on_response: Optional[ResponseCallback] = None,
+    ) -> Iterator[dict]:
+        """
+        Yields the rows of a bioindex query one by one, projected to `fields`.
+
+        With `stream`, rows are decoded from the response body as it is read, so at most
+        one row is held in full at a time; otherwise pages are read as in query_pages.
+        """
+        if not stream:
+            for data in self.query_pages(index, q, on_response=on_response, fields=fields):
+                yield from data["data"]
+            return
+        for records, _ in self._stream_pages(index, q, fields, on_response):
+            yield from records
+
+    def query(
+        self,
+        index: str,
+        q: str,
+        on_response: Optional[ResponseCallback] = None,
+        fields: Optional[Sequence[str]] = None,
+        stream: bool = False,
+    ) -> List[dict]:
+        """Returns all rows of a bioindex query, fetched page by page."""
+        rows = []
+        for data in self.query_pages(index, q, on_response=on_response, fields=fields, stream=stream):
+            rows.extend(data["data"])
+        return rows
@@ -0,0 +1,242 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from bioindex_client import BioindexClient, BioindexError
+
+
+class ScriptedBioindex:
+    """
+    Local server answering each path with the next of its scripted (status, body) responses.
+    A response scripted as (status, body, True) is cut off halfway and its connection closed.
+    """
+
+    def __init__(self, responses):
+        self.responses = {path: list(answers) for path, answers in responses.items()}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                server.requests.append((url.path, parse_qs(url.query), self.headers.get("Accept-Encoding"), self.client_address))
+                status, body, *truncated = server.responses[url.path].pop(0)
+                encoded = gzip.compress(json.dumps(body).encode("utf-8"))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                if truncated:
+                    self.wfile.write(encoded[:len(encoded) // 2])
+                    self.close_connection = True
+                else:
+                    self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def page(rows, continuation=None):
+    return 200, {"data": rows, "continuation": continuation, "count": len(rows)}
+
+
+def test_query_follows_continuations_and_retries():
+    """Test that a query pages through continuations, retries a 503 and reuses its connection"""
+    responses = {
+        "/api/bio/query/pigean-gene-phenotype": [page([{"gene": "TCF7L2"}], "token-1")],
+        "/api/bio/cont": [(503, {}), page([{"gene": "PPARG"}], "token-2"), page([{"gene": "FTO"}])],
+    }
+    with ScriptedBioindex(responses) as server, BioindexClient(server.url, backoff=0) as client:
+        seen = []
+        rows = client.query("pigean-gene-phenotype", "T2D,2,large", on_response=lambda response, size: seen.append(size))
+
+        assert [row["gene"] for row in rows] == ["TCF7L2", "PPARG", "FTO"]
+        assert len(seen) == 3 and all(size > 0 for size in seen)
+        assert server.requests[0][1] == {"q": ["T2D,2,large"]}
+        assert [request[1]["token"] for request in server.requests[1:]] == [["token-1"], ["token-1"], ["token-2"]]
+        assert all(request[2] == "gzip" for request in server.requests)
+        # Keep-alive: continuations are fetched ahead in a background thread, which reuses
+        # one connection for all of them
+        assert len({request[3] for request in server.requests[1:]}) == 1
+
+        stats = client.stats()
+        assert stats["pigean-gene-phenotype"]["requests"] == 1
+        assert stats["cont"]["requests"] == 3
+        assert stats["cont"]["retries"] == 1
+        assert stats["cont"]["failures"] == 0
+        assert stats["cont"]["bytes"] > 0
+
+
+def test_query_gives_up():
+    """Test that client errors fail at once and transient errors fail after the last retry"""
+    responses = {
+        "/api/bio/query/missing": [(404, {})],
+        "/api/bio/query/flaky": [(502, {})] * 3,
+    }
+    with ScriptedBioindex(responses) as server, BioindexClient(server.url, retries=2, backoff=0) as client:
+        with pytest.raises(BioindexError) as error:
+            client.query("missing", "1")
+        assert error.value.status_code == 404
+        with pytest.raises(BioindexError) as error:
+            client.query("flaky", "1")
+        assert error.value.status_code == 502
+
+        stats = client.stats()
+        assert stats["missing"] == {"requests": 1, "retries": 0, "failures": 1, "bytes": 2, "seconds": stats["missing"]["seconds"]}
+        assert stats["flaky"]["requests"] == 3
+        assert stats["flaky"]["retries"] == 2
+        assert stats["flaky"]["failures"] == 1
+
+
+def test_query_retries_truncated_bodies():
+    """Test that bodies cut off in transit are retried, and raised as BioindexError after the last retry"""
+    rows = [{"gene": f"GENE{i}", "combined": i} for i in range(200)]
+    responses = {
+        "/api/bio/query/pigean-gene-phenotype": [(*page(rows), True), page(rows)],
+        "/api/bio/query/broken": [(*page(rows), True)] * 2,
+    }
+    with ScriptedBioindex(responses) as server, BioindexClient(server.url, retries=1, backoff=0) as client:
+        assert client.query("pigean-gene-phenotype", "T2D,2,large") == rows
+        with pytest.raises(BioindexError):
+            client.query("broken", "1")
+
+        stats = client.stats()
+        assert stats["pigean-gene-phenotype"]["retries"] == 1
+        assert stats["pigean-gene-phenotype"]["failures"] == 0
+        assert stats["broken"]["requests"] == 2
+        assert stats["broken"]["failures"] == 1
+
+    # A streamed body cut off part way through cannot be retried, but fails the same way
+    pytest.importorskip("ijson")
+    responses = {"/api/bio/query/broken": [(*page(rows), True)]}
+    with ScriptedBioindex(responses) as server, BioindexClient(server.url, backoff=0) as client:
+        with pytest.raises(BioindexError):
+            list(client.query_records("broken", "1"))
+
+
+def test_query_pages_prefetch():
+    """Test that the next page is requested while the caller holds the current one, and only with prefetch"""
+    def responses():
+        return {
+            "/api/bio/query/pigean-phenotypes": [page([{"phenotype": "T2D"}], "token-1")],
+            "/api/bio/cont": [page([{"phenotype": "BMI"}])],
+        }
+
+    for prefetch, requested in ((True, 2), (False, 1)):
+        with ScriptedBioindex(responses()) as server, BioindexClient(server.url, prefetch=prefetch) as client:
+            pages = client.query_pages("pigean-phenotypes", "1")
+            first = next(pages)
+            time.sleep(0.1)
+            assert first["data"] == [{"phenotype": "T2D"}]
+            assert len(server.requests) == requested
+            assert [data["data"] for data in pages] == [[{"phenotype": "BMI"}]]
+            assert len(server.requests) == 2
+
+
+def test_query_stream_projects_records():
+    """Test that streamed decoding yields the same rows, projected to the requested fields"""
+    pytest.importorskip("ijson")
+    rows = [
+        {"gene": "TCF7L2", "phenotype": "T2D", "combined": 3.5, "log_bf": 2, "prior": 0.1, "extra": {"nested": [1, 2]}},
+        {"gene": "PPARG", "phenotype": "T2D", "combined": 1.25, "prior": -0.5, "extra": None},
+    ]
+
+    def responses():
+        return {
+            "/api/bio/query/pigean-gene-phenotype": [page(rows[:1], "token-1")],
+            "/api/bio/cont": [page(rows[1:])],
+        }
+
+    fields = ["gene", "phenotype", "combined", "log_bf", "prior"]
+    with ScriptedBioindex(responses()) as server, BioindexClient(server.url) as client:
+        sizes = []
+        pages = list(client.query_pages("pigean-gene-phenotype", "T2D", fields=fields, stream=True, on_response=lambda response, size: sizes.append(size)))
+        assert [data["continuation"] for data in pages] == ["token-1", None]
+        assert [data["data"] for data in pages] == [
+            [{"gene": "TCF7L2", "phenotype": "T2D", "combined": 3.5, "log_bf": 2, "prior": 0.1}],
+            [{"gene": "PPARG", "phenotype": "T2D", "combined": 1.25, "prior": -0.5}],
+        ]
+        assert len(sizes) == 2 and client.stats()["cont"]["bytes"] == sizes[1] > 0
+
+    for fields in (None, ["gene", "combined"]):
+        with ScriptedBioindex(responses()) as server, BioindexClient(server.url) as client:
+            streamed = list(client.query_records("pigean-gene-phenotype", "T2D", fields=fields))
+        with ScriptedBioindex(responses()) as server, BioindexClient(server.url) as client:
+            decoded = list(client.query_records("pigean-gene-phenotype", "T2D", fields=fields, stream=False))
+        assert streamed == decoded
+    assert streamed == [{"gene": "TCF7L2", "combined": 3.5}, {"gene": "PPARG", "combined": 1.25}]
+
+
+def test_sessions_of_ended_threads_are_closed():
+    """Test that a client used from short-lived threads closes their sessions instead of keeping one per thread"""
+    closed = []
+
+    def use_client(client):
+        session = client.session
+        session.close = lambda: closed.append(session)
+
+    with BioindexClient("http://127.0.0.1:1") as client:
+        for _ in range(5):
+            thread = threading.Thread(target=use_client, args=(client,))
+            thread.start()
+            thread.join()
+        # Each thread's session is closed when the next thread first uses the client
+        assert len(closed) == 4 and len(set(map(id, closed))) == 4
+        assert client.session is client.session
+        assert list(client._sessions) == [threading.current_thread()]
+        assert len(closed) == 5
+
+
+def test_stream_stopped_early_does_not_wait_for_prefetch():
+    """Test that a streamed query stopped early returns at once and closes the page fetched ahead when it arrives"""
+    pytest.importorskip("ijson")
+    responses = {
+        "/api/bio/query/pigean-gene-phenotype": [page([{"gene": "TCF7L2"}], "token-1")],
+        "/api/bio/cont": [page([{"gene": "PPARG"}])],
+    }
+    with ScriptedBioindex(responses) as server, BioindexClient(server.url) as client:
+        release = threading.Event()
+        closed = threading.Event()
+        get = client.get
+
+        def slow_get(path, **kwargs):
+            response = get(path, **kwargs)
+            if path == "/api/bio/cont":
+                release.wait(5)
+                close = response.close
+                response.close = lambda: (close(), closed.set())
+            return response
+
+        client.get = slow_get
+        pages = client.query_pages("pigean-gene-phenotype", "T2D", stream=True)
+        assert next(pages)["data"] == [{"gene": "TCF7L2"}]
+        start = time.perf_counter()
+        pages.close()
+        assert time.perf_counter() - start < 1
+        assert not closed.is_set()
+        release.set()
+        assert closed.wait(5)
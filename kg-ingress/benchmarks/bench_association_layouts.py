@@ -0,0 +1,138 @@
+"""
+Compares the two association layouts in Neo4j: SupportAssociation nodes linked by
+SUBJECT and OBJECT relationships, and scores stored on a direct
+(:Gene)-[:SUPPORTS]->(:Phenotype) relationship.
+
+For each layout the benchmark loads the same synthetic associations, then reports
+node, relationship and property counts, the on-disk store size when --store-dir
+points at the database directory, and the latency of the top-genes query of
+portal_tools.tools.cypher_utils, imported from the portal-tools directory next to
+kg-ingress.
+
+The database is emptied before each layout is loaded, so only run it against a
+scratch instance, e.g. the one from compose.yaml.
+
+Usage:
+    python benchmarks/bench_association_layouts.py --rows 200000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from neo4j import GraphDatabase
+
+from bench_association_records import make_rows
+from kg_ingress.assets import ensure_schema, insert_data_batched, transform_gene_phenotype_data
+from kg_ingress.models.portal_model import Phenotype
+from kg_ingress.pipeline import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+
+# The portal-tools package pulls in heavy serving dependencies, so its query module is
+# imported from the source tree rather than requiring the package to be installed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "portal-tools"))
+from portal_tools.tools.cypher_utils import top_genes_query
+
+COUNT_QUERIES = {
+    "nodes": "MATCH (n) RETURN count(n) AS count",
+    "relationships": "MATCH ()-[r]->() RETURN count(r) AS count",
+    "properties": """
+        CALL { MATCH (n) RETURN sum(size(keys(n))) AS count
+               UNION ALL
+               MATCH ()-[r]->() RETURN sum(size(keys(r))) AS count }
+        RETURN sum(count) AS count
+        """,
+}
+
+
+def clear_database(driver):
+    with driver.session() as session:
+        session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS").consume()
+
+
+def directory_size(path):
+    """Returns the total size in bytes of the files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def load(driver, rows, phenotype_index, layout, batch_size):
+    """Loads the synthetic associations with the given layout and returns the load seconds."""
+    genes, associations = transform_gene_phenotype_data(rows, phenotype_index, compact=True)
+    start = time.perf_counter()
+    insert_data_batched(list(phenotype_index.values()) + genes, driver=driver, batch_size=batch_size)
+    insert_data_batched(associations, driver=driver, batch_size=batch_size, match_endpoints=True, association_layout=layout)
+    return time.perf_counter() - start
+
+
+def query_latencies(driver, layout, phenotypes, n_queries, top_n, seed=0):
+    """Runs the top-genes query for random phenotypes and returns the latencies in milliseconds."""
+    rng = random.Random(seed)
+    query = top_genes_query(layout=layout)
+    latencies = []
+    with driver.session() as session:
+        # Warm up the page cache and query plan before timing
+        for phenotype in phenotypes:
+            session.run(query, phenotype=phenotype, top_n=top_n).consume()
+        for _ in range(n_queries):
+            phenotype = rng.choice(phenotypes)
+            start = time.perf_counter()
+            session.run(query, phenotype=phenotype, top_n=top_n).consume()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="Number of associations to load")
+    parser.add_argument("--phenotypes", type=int, default=100, help="Number of synthetic phenotypes")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed top-genes queries per layout")
+    parser.add_argument("--top-n", type=int, default=10, help="Genes returned by each top-genes query")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UNWIND batch")
+    parser.add_argument("--store-dir", default=None, help="Database directory to measure the store size of, e.g. /data/databases/neo4j")
+    parser.add_argument("--neo4j-uri", default=NEO4J_URI)
+    parser.add_argument("--neo4j-user", default=NEO4J_USER)
+    parser.add_argument("--neo4j-password", default=NEO4J_PASSWORD)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, n_phenotypes=args.phenotypes)
+    phenotype_index = {
+        name: Phenotype(id=f"PORTAL.TRAIT:{name}", name=name)
+        for name in {row["phenotype"] for row in rows}
+    }
+    phenotypes = sorted(phenotype_index)
+
+    results = {}
+    with GraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_password)) as driver:
+        for layout in ("node", "relationship"):
+            clear_database(driver)
+            ensure_schema(driver=driver)
+            base_size = directory_size(args.store_dir) if args.store_dir else None
+            seconds = load(driver, rows, phenotype_index, layout, args.batch_size)
+            with driver.session() as session:
+                counts = {name: session.run(query).single()["count"] for name, query in COUNT_QUERIES.items()}
+            latencies = sorted(query_latencies(driver, layout, phenotypes, args.queries, args.top_n))
+            results[layout] = {
+                **counts,
+                "store_mb": (directory_size(args.store_dir) - base_size) / 2**20 if args.store_dir else None,
+                "load_rows_per_sec": args.rows / seconds,
+                "p50_ms": statistics.median(latencies),
+                "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+            }
+        clear_database(driver)
+
+    print(f"{'layout':<14}{'nodes':>10}{'rels':>10}{'props':>11}{'store MB':>10}{'load rows/s':>13}{'p50 ms':>9}{'p95 ms':>9}")
+    for layout, r in results.items():
+        store = f"{r['store_mb']:.1f}" if r["store_mb"] is not None else "-"
+        print(
+            f"{layout:<14}{r['nodes']:>10,}{r['relationships']:>10,}{r['properties']:>11,}{store:>10}"
+            f"{r['load_rows_per_sec']:>13,.0f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
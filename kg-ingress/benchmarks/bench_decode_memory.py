@@ -0,0 +1,96 @@
+"""
+Compares decoding bioindex responses whole against streamed decoding with field
+projection, on gene-phenotype pages served by the local bioindex stub.
+
+Pages are consumed one at a time like the pipeline does, keeping only the rows of the
+current page. Reports seconds and peak traced memory per mode:
+
+    json          whole responses decoded, rows kept with all their fields
+    json+project  whole responses decoded, rows projected to GENE_PHENOTYPE_FIELDS
+    stream        responses decoded as they are read, rows projected while decoding
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_decode_memory.py --genes 20000 --page-size 10000 --extra-fields 20
+"""
+import argparse
+import gc
+import multiprocessing
+import time
+import tracemalloc
+
+from bioindex_client import BioindexClient
+from bioindex_stub import BioindexStub
+from kg_ingress.assets import GENE_PHENOTYPE_FIELDS
+from synthetic import phenotype_records
+
+MODES = {
+    "json": {"fields": None, "stream": False},
+    "json+project": {"fields": GENE_PHENOTYPE_FIELDS, "stream": False},
+    "stream": {"fields": GENE_PHENOTYPE_FIELDS, "stream": True},
+}
+
+
+def serve(records, args, urls, stop):
+    """Runs the stub in its own process, so building its responses is not traced."""
+    with BioindexStub(records, args.genes, page_size=args.page_size, extra_fields=args.extra_fields) as stub:
+        urls.put(stub.url)
+        stop.wait()
+
+
+def consume(client, phenotype, fields, stream):
+    """Reads all pages of a phenotype holding one at a time; returns the row count and bytes received."""
+    rows, received = 0, []
+    for data in client.query_pages(
+        "pigean-gene-phenotype", f"{phenotype},2,large", fields=fields, stream=stream,
+        on_response=lambda response, size: received.append(size),
+    ):
+        rows += len(data["data"])
+        del data
+    return rows, sum(received)
+
+
+def measure(url, phenotype, fields, stream):
+    """Returns the row count, bytes received, seconds and peak traced bytes of one mode."""
+    # Prefetching would hold a second page, so both modes read pages one after the other
+    with BioindexClient(url, prefetch=False) as client:
+        consume(client, phenotype, fields, stream)
+        gc.collect()
+        start = time.perf_counter()
+        rows, received = consume(client, phenotype, fields, stream)
+        elapsed = time.perf_counter() - start
+
+        # Memory is traced in a separate run since tracing slows decoding down
+        gc.collect()
+        tracemalloc.start()
+        consume(client, phenotype, fields, stream)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return rows, received, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--genes", type=int, default=20_000, help="Number of gene-phenotype rows served")
+    parser.add_argument("--page-size", type=int, default=10_000, help="Number of rows per response")
+    parser.add_argument("--extra-fields", type=int, default=20, help="Number of scores per row the pipeline does not read")
+    args = parser.parse_args()
+
+    records = phenotype_records(1)
+    phenotype = records[0]["phenotype"]
+    urls, stop = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(records, args, urls, stop), daemon=True)
+    server.start()
+    try:
+        url = urls.get()
+        results = {mode: measure(url, phenotype, **options) for mode, options in MODES.items()}
+    finally:
+        stop.set()
+        server.join()
+
+    print(f"{args.genes} rows, {args.page_size} per page, {len(GENE_PHENOTYPE_FIELDS) + args.extra_fields} fields per row")
+    for mode, (rows, received, elapsed, peak) in results.items():
+        print(f"{mode:>13}: {rows} rows, {received / 1e6:.1f} MB received in {elapsed:.2f}s, peak {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
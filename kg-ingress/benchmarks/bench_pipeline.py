@@ -0,0 +1,123 @@
+"""
+Times every pipeline stage on synthetic data, offline.
+
+For each requested scale the benchmark generates phenotype records, the matching
+portal, GCAT and ORDO mapping files and the gene-phenotype payloads, serves them from
+a local bioindex stand-in and runs the pipeline against it. Writes go to a recording
+fake driver by default, or to a local Neo4j with --neo4j (which cleans the database
+first, so only use a scratch instance). Per-stage seconds and items per second come
+from the pipeline's run report.
+
+Results can be saved with --save and compared with a previous run with --baseline;
+the script exits with status 1 if a stage's throughput dropped by more than
+--tolerance.
+
+Usage:
+    python benchmarks/bench_pipeline.py --associations 1000 100000 1000000
+    python benchmarks/bench_pipeline.py --associations 100000 --save before.json
+    python benchmarks/bench_pipeline.py --associations 100000 --baseline before.json
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+
+from bioindex_stub import BioindexStub
+from fake_driver import RecordingDriver
+from synthetic import phenotype_records, write_mapping_files
+from kg_ingress import assets
+from kg_ingress.pipeline import PipelineResources, parse_args, run
+from kg_ingress.utils.bulk_export import BulkCsvWriter
+from kg_ingress.utils.instrumentation import RunReport
+
+
+def run_benchmark(n_associations, n_phenotypes=100, page_size=1000, neo4j=False, row_latency=0.0, pipeline_args=()):
+    """
+    Runs the pipeline on `n_associations` synthetic associations spread over
+    `n_phenotypes` phenotypes and returns the run report.
+    """
+    n_phenotypes = min(n_phenotypes, n_associations)
+    records = phenotype_records(n_phenotypes)
+    genes_per_phenotype = n_associations // n_phenotypes
+    with tempfile.TemporaryDirectory() as data_dir, BioindexStub(records, genes_per_phenotype, page_size) as stub:
+        write_mapping_files(data_dir, records)
+        argv = ["--data-dir", data_dir] + (["--clean-db"] if neo4j else []) + list(pipeline_args)
+        args = parse_args(argv)
+        report = RunReport(options={"associations": n_associations, "phenotypes": n_phenotypes, **vars(args)})
+        # --export-bulk-csv in the pipeline args writes CSV files instead of the database, as in the pipeline
+        exporter = BulkCsvWriter(args.export_bulk_csv, association_layout=args.association_layout) if args.export_bulk_csv else None
+        bioindex_url = assets.BIOINDEX_URL
+        assets.BIOINDEX_URL = stub.url
+        try:
+            with PipelineResources(data_dir=data_dir) as resources:
+                if not neo4j:
+                    resources.__dict__["driver"] = RecordingDriver(row_latency=row_latency)
+                run(args, resources, exporter, report)
+        finally:
+            assets.BIOINDEX_URL = bioindex_url
+            if exporter is not None:
+                exporter.close()
+    return report.to_dict()
+
+
+def regressions(results, baseline, tolerance):
+    """Returns (scale, stage, rate, baseline rate) for stages whose items/sec dropped by more than tolerance."""
+    found = []
+    for scale, report in results.items():
+        for stage, stats in report["stages"].items():
+            previous = baseline.get(scale, {}).get("stages", {}).get(stage)
+            if not previous or not previous["items_per_sec"] or not stats["items_per_sec"]:
+                continue
+            if stats["items_per_sec"] < previous["items_per_sec"] * (1 - tolerance):
+                found.append((scale, stage, stats["items_per_sec"], previous["items_per_sec"]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--associations", type=int, nargs="+", default=[1000, 10_000, 100_000], help="Scales to run, in associations")
+    parser.add_argument("--phenotypes", type=int, default=100, help="Number of phenotypes the associations are spread over")
+    parser.add_argument("--page-size", type=int, default=1000, help="Rows per bioindex response")
+    parser.add_argument("--neo4j", action="store_true", help="Write to the local Neo4j configured in the pipeline instead of the fake driver")
+    parser.add_argument("--row-latency", type=float, default=0.0, help="Seconds the fake driver spends per written row")
+    parser.add_argument("--pipeline-args", default="", help="Extra pipeline options, e.g. \"--batch-size 5000 --load-mode match\"")
+    parser.add_argument("--save", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative drop in items/sec before a stage counts as regressed")
+    args = parser.parse_args()
+
+    logging.getLogger("pipeline").setLevel(logging.WARNING)
+    results = {}
+    for n_associations in args.associations:
+        results[str(n_associations)] = run_benchmark(
+            n_associations,
+            n_phenotypes=args.phenotypes,
+            page_size=args.page_size,
+            neo4j=args.neo4j,
+            row_latency=args.row_latency,
+            pipeline_args=args.pipeline_args.split(),
+        )
+
+    print(f"{'associations':>12}  {'stage':<26}{'seconds':>10}{'items':>12}{'items/sec':>14}{'MB':>9}")
+    for scale, report in results.items():
+        for stage, stats in report["stages"].items():
+            rate = f"{stats['items_per_sec']:,.0f}" if stats["items_per_sec"] else "-"
+            print(f"{int(scale):>12,}  {stage:<26}{stats['seconds']:>10.3f}{stats['items']:>12,}{rate:>14}{stats['bytes'] / 2**20:>9.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        for scale, stage, rate, previous in found:
+            print(f"REGRESSION {scale} associations, {stage}: {rate:,.0f} items/sec, baseline {previous:,.0f}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
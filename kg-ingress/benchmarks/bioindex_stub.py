@@ -0,0 +1,122 @@
+"""
+Local stand-in for the bioindex API serving synthetic data.
+
+Implements the endpoints the pipeline uses, with the same response shape and
+continuation-token pagination:
+
+    /api/bio/query/pigean-phenotypes?q=1
+    /api/bio/query/pigean-gene-phenotype?q=<phenotype>,<sigma>,<gene set size>
+    /api/bio/cont?token=<continuation>
+
+Point the pipeline at it by setting kg_ingress.assets.BIOINDEX_URL, or the
+BIOINDEX_URL environment variable, to BioindexStub.url.
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from synthetic import gene_phenotype_rows
+
+
+class BioindexStub:
+    """
+    Serves phenotype records and `genes_per_phenotype` synthetic gene-phenotype rows for
+    each of them, `page_size` rows per response, on a local port. Rows carry
+    `extra_fields` additional scores, to make payloads wider than the pipeline reads.
+    """
+
+    def __init__(self, records, genes_per_phenotype, page_size=1000, host="127.0.0.1", port=0, extra_fields=0):
+        self.records = records
+        self.phenotypes = {record["phenotype"] for record in records}
+        self.genes_per_phenotype = genes_per_phenotype
+        self.page_size = page_size
+        self.extra_fields = extra_fields
+        self.requests = 0
+        self._continuations = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _rows(self, query, start, stop):
+        if query is None:
+            return self.records[start:stop]
+        return gene_phenotype_rows(query, self.genes_per_phenotype, start, stop, self.extra_fields)
+
+    def _total(self, query):
+        if query is None:
+            return len(self.records)
+        return self.genes_per_phenotype if query in self.phenotypes else 0
+
+    def page(self, query, start):
+        """Returns the response body for rows from `start` of a query, None being the phenotype list."""
+        stop = start + self.page_size
+        continuation = None
+        with self._lock:
+            self.requests += 1
+            if stop < self._total(query):
+                continuation = uuid.uuid4().hex
+                self._continuations[continuation] = (query, stop)
+        rows = self._rows(query, start, stop)
+        return {"data": rows, "continuation": continuation, "count": len(rows)}
+
+    def continue_page(self, token):
+        with self._lock:
+            query, start = self._continuations.pop(token)
+        return self.page(query, start)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                try:
+                    if url.path == "/api/bio/query/pigean-phenotypes":
+                        body = stub.page(None, 0)
+                    elif url.path == "/api/bio/query/pigean-gene-phenotype":
+                        phenotype = params["q"][0].split(",")[0]
+                        body = stub.page(phenotype, 0)
+                    elif url.path == "/api/bio/cont":
+                        body = stub.continue_page(params["token"][0])
+                    else:
+                        self.send_error(404)
+                        return
+                except KeyError:
+                    self.send_error(400)
+                    return
+                encoded = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
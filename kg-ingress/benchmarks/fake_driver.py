@@ -0,0 +1,85 @@
+"""
+Recording stand-in for the Neo4j driver, so insert throughput can be benchmarked
+without a database.
+
+Statements are accepted and counted instead of executed: every statement reports all
+of its rows as written. `row_latency` adds a fixed cost per written row to emulate a
+database of a given speed.
+"""
+import threading
+import time
+from collections import Counter
+
+from neo4j import SummaryCounters
+
+
+class RecordingResult:
+    def __init__(self, written):
+        self.written = written
+
+    def single(self):
+        return {"written": self.written}
+
+    def consume(self):
+        summary = type("Summary", (), {})()
+        summary.counters = SummaryCounters({})
+        return summary
+
+    def __iter__(self):
+        return iter(())
+
+
+class RecordingTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        return self.driver.record(query, {**(parameters or {}), **kwargs})
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class RecordingSession(RecordingTransaction):
+    def begin_transaction(self):
+        return RecordingTransaction(self.driver)
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        return transaction_function(RecordingTransaction(self.driver), *args, **kwargs)
+
+    def close(self):
+        pass
+
+
+class RecordingDriver:
+    """Counts the statements and rows the pipeline sends, keyed by statement text."""
+
+    def __init__(self, row_latency=0.0):
+        self.row_latency = row_latency
+        self.statements = Counter()
+        self.rows = Counter()
+        self._lock = threading.Lock()
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    def close(self):
+        pass
+
+    def record(self, query, parameters):
+        rows = len(parameters.get("rows", ()))
+        with self._lock:
+            self.statements[query] += 1
+            self.rows[query] += rows
+        if self.row_latency:
+            time.sleep(rows * self.row_latency)
+        return RecordingResult(rows)
@@ -0,0 +1,133 @@
+"""
+Synthetic inputs for the kg_ingress benchmarks.
+
+Generates phenotype records, gene-phenotype rows and the portal, GCAT and ORDO mapping
+files at any scale. Everything is derived from the phenotype name and row number, so
+the same scale always produces the same data and any page of a phenotype's rows can
+be generated on its own.
+"""
+import csv
+import os
+import random
+import zlib
+from xml.sax.saxutils import escape
+
+from kg_ingress.pipeline import PORTAL_PHENOTYPES_FILE, GCAT_FILE, ORDO_FILE
+
+# Header of the GCAT studies table; MAPPED_TRAIT and MAPPED_TRAIT_URI are columns 13 and 14
+GCAT_HEADER = [
+    "DATE ADDED TO CATALOG", "PUBMEDID", "FIRST AUTHOR", "DATE", "JOURNAL", "LINK", "STUDY",
+    "DISEASE/TRAIT", "INITIAL SAMPLE SIZE", "REPLICATION SAMPLE SIZE", "PLATFORM [SNPS PASSING QC]",
+    "ASSOCIATION COUNT", "MAPPED_TRAIT", "MAPPED_TRAIT_URI", "STUDY ACCESSION", "GENOTYPING TECHNOLOGY",
+]
+
+# Number of distinct gene symbols associations are drawn from, roughly the protein-coding genes
+GENE_POOL_SIZE = 20_000
+
+# Number of GWAS studies per synthetic GCAT trait
+STUDIES_PER_TRAIT = 3
+
+
+def phenotype_records(n_phenotypes):
+    """
+    Returns bioindex phenotype records, cycling through portal, GCAT and Orphanet
+    phenotypes so every transform path is exercised.
+    """
+    records = []
+    for i in range(n_phenotypes):
+        if i % 3 == 0:
+            name, group = f"SYNTH_TRAIT_{i}", "portal"
+        elif i % 3 == 1:
+            name, group = f"gcat_trait_synthetic_trait_{i}", "gcat_trait"
+        else:
+            name, group = f"Synthetic_disease_{i}_Orphanet_{100000 + i}", "orphanet"
+        records.append({
+            "trait_group": group,
+            "phenotype": name,
+            "phenotype_name": f"Synthetic phenotype {i}",
+            "display_group": "SYNTHETIC",
+        })
+    return records
+
+
+def gene_phenotype_row(phenotype, index, n_genes, extra_fields=0):
+    """
+    Returns row `index` of the gene-phenotype payload of a phenotype with `n_genes` genes,
+    with `extra_fields` additional scores the pipeline does not read.
+    """
+    rng = random.Random(zlib.crc32(f"{phenotype}:{index}".encode()))
+    # Consecutive genes from a per-phenotype offset, so genes are unique within a phenotype
+    # and shared between phenotypes like real results
+    pool_size = max(GENE_POOL_SIZE, n_genes)
+    offset = zlib.crc32(phenotype.encode()) % pool_size
+    log_bf = rng.uniform(-2, 5)
+    prior = rng.uniform(0, 2)
+    row = {
+        "gene": f"GENE{(offset + index) % pool_size}",
+        "phenotype": phenotype,
+        "combined": log_bf + prior,
+        "log_bf": log_bf,
+        "prior": prior,
+        "sigma": 2,
+        "gene_set_size": "large",
+    }
+    for i in range(extra_fields):
+        row[f"score_{i}"] = rng.uniform(-2, 5)
+    return row
+
+
+def gene_phenotype_rows(phenotype, n_genes, start=0, stop=None, extra_fields=0):
+    """Returns rows start to stop of the gene-phenotype payload of a phenotype."""
+    stop = n_genes if stop is None else min(stop, n_genes)
+    return [gene_phenotype_row(phenotype, i, n_genes, extra_fields) for i in range(start, stop)]
+
+
+def write_mapping_files(data_dir, records):
+    """
+    Writes the portal, GCAT and ORDO mapping files matching the records to data_dir,
+    under the file names the pipeline reads.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    portal = [r for r in records if r["trait_group"] == "portal"]
+    gcat = [r for r in records if r["trait_group"] == "gcat_trait"]
+    orphanet = [r for r in records if r["trait_group"] == "orphanet"]
+
+    with open(os.path.join(data_dir, PORTAL_PHENOTYPES_FILE), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "description", "EFO_id"])
+        for i, record in enumerate(portal):
+            writer.writerow([i, record["phenotype"], record["phenotype_name"], f"EFO:{i:07d},MONDO:{i:07d}"])
+
+    with open(os.path.join(data_dir, GCAT_FILE), "w", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(GCAT_HEADER)
+        for i, record in enumerate(gcat):
+            trait = record["phenotype"][len("gcat_trait_"):].replace("_", " ")
+            for study in range(STUDIES_PER_TRAIT):
+                row = dict.fromkeys(GCAT_HEADER, "NR")
+                row["STUDY"] = f"Synthetic study {study} of {trait}"
+                row["MAPPED_TRAIT"] = trait
+                row["MAPPED_TRAIT_URI"] = f"http://www.ebi.ac.uk/efo/EFO_{i:07d}"
+                row["STUDY ACCESSION"] = f"GCST{i * STUDIES_PER_TRAIT + study:07d}"
+                writer.writerow([row[column] for column in GCAT_HEADER])
+
+    with open(os.path.join(data_dir, ORDO_FILE), "w") as f:
+        f.write(
+            '<?xml version="1.0"?>\n'
+            '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n'
+            '         xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"\n'
+            '         xmlns:owl="http://www.w3.org/2002/07/owl#"\n'
+            '         xmlns:efo="http://www.ebi.ac.uk/efo/"\n'
+            '         xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">\n'
+        )
+        for record in orphanet:
+            orpha_id = record["phenotype"].split("_")[-1]
+            label = escape(record["phenotype_name"])
+            f.write(
+                f'    <owl:Class rdf:about="http://www.orpha.net/ORDO/Orphanet_{orpha_id}">\n'
+                f'        <rdfs:label xml:lang="en">{label}</rdfs:label>\n'
+                f'        <efo:definition xml:lang="en">Definition of {label}.</efo:definition>\n'
+                f'        <oboInOwl:hasDbXref>OMIM:{orpha_id}</oboInOwl:hasDbXref>\n'
+                f'    </owl:Class>\n'
+            )
+        f.write("</rdf:RDF>\n")
@@ -1,79 +1,376 @@
-import requests
 from neo4j import GraphDatabase
 from .models.portal_model import *
+from .models.association_records import SupportAssociationBatch
 from .utils.phenotype_utils import (
     create_orphanet_phenotype,
     create_gcat_phenotype,
     create_portal_phenotype,
     preprocess_gcat_info,
-    lookup_trait_with_db_refs
+    load_gcat_info,
+    lookup_trait_with_db_refs,
+    build_orphanet_index,
+    load_orphanet_index,
+    build_gcat_index,
+    build_portal_index
 )
+from .utils.instrumentation import counters_dict
+from .utils.ids import canonical_sigma
+import bioindex_client
 import tqdm
 import uuid
+import zlib
+import contextlib
+import time
+import math
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
-def fetch_phenotype_data():
+# Base URL of the bioindex API, overridable e.g. to point runs at a local stand-in
+BIOINDEX_URL = bioindex_client.BIOINDEX_URL
+
+# Options of the shared bioindex client, see configure_bioindex_client
+_bioindex_client_options = {}
+_bioindex_client = None
+_bioindex_client_lock = threading.Lock()
+
+# Source the fetch functions read bioindex data from instead of the API, see set_data_source
+_data_source = None
+
+# Uniqueness constraints backing every MERGE on id, plus indexes for the lookups and
+# score orderings used by portal-tools queries. All statements are idempotent.
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT phenotype_id IF NOT EXISTS FOR (n:Phenotype) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT gene_id IF NOT EXISTS FOR (n:Gene) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT gwas_id IF NOT EXISTS FOR (n:Gwas) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT support_association_id IF NOT EXISTS FOR (n:SupportAssociation) REQUIRE n.id IS UNIQUE",
+    "CREATE INDEX phenotype_name IF NOT EXISTS FOR (n:Phenotype) ON (n.name)",
+    "CREATE INDEX gene_symbol IF NOT EXISTS FOR (n:Gene) ON (n.symbol)",
+    "CREATE INDEX support_association_combined_support IF NOT EXISTS FOR (n:SupportAssociation) ON (n.combined_support)",
+    "CREATE INDEX support_association_direct_support IF NOT EXISTS FOR (n:SupportAssociation) ON (n.direct_support)",
+    "CREATE INDEX support_association_indirect_support IF NOT EXISTS FOR (n:SupportAssociation) ON (n.indirect_support)",
+    "CREATE INDEX supports_id IF NOT EXISTS FOR ()-[r:SUPPORTS]-() ON (r.id)",
+    "CREATE INDEX supports_combined_support IF NOT EXISTS FOR ()-[r:SUPPORTS]-() ON (r.combined_support)",
+    "CREATE INDEX supports_direct_support IF NOT EXISTS FOR ()-[r:SUPPORTS]-() ON (r.direct_support)",
+    "CREATE INDEX supports_indirect_support IF NOT EXISTS FOR ()-[r:SUPPORTS]-() ON (r.indirect_support)",
+]
+
+SHOW_INDEXES_QUERY = """
+    SHOW INDEXES YIELD name, type, labelsOrTypes, properties, state, populationPercent
+    RETURN name, type, labelsOrTypes, properties, state, populationPercent
+    ORDER BY name
+    """
+
+# Namespace of the deterministic SupportAssociation ids
+SUPPORT_ASSOCIATION_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://w3id.org/a2f/portal-model/SupportAssociation")
+
+DELETE_SUPPORT_ASSOCIATIONS_QUERIES = {
+    "node": """
+    UNWIND $gene_ids AS gene_id
+    MATCH (sa:SupportAssociation)-[:SUBJECT]->(:Gene {id: gene_id})
+    MATCH (sa)-[:OBJECT]->(:Phenotype {id: $phenotype_id})
+    DETACH DELETE sa
+    """,
+    "relationship": """
+    UNWIND $gene_ids AS gene_id
+    MATCH (:Gene {id: gene_id})-[r:SUPPORTS]->(:Phenotype {id: $phenotype_id})
+    DELETE r
+    """,
+}
+
+# Parameterized UNWIND statements used by insert_data_batched, one per item type.
+# Each statement receives a list of row dicts as $rows, writes the whole batch
+# in a single round trip and returns the number of rows written.
+PHENOTYPE_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MERGE (p:Phenotype {id: row.id})
+    SET p.name = row.name,
+        p.description = row.description,
+        p.display_name = row.display_name
+    RETURN count(*) AS written
+    """
+
+GWAS_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MERGE (g:Gwas {id: row.id})
+    SET g.name = row.name,
+        g.description = row.description
+    RETURN count(*) AS written
+    """
+
+GENE_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MERGE (g:Gene {id: row.id})
+    SET g.symbol = row.symbol
+    RETURN count(*) AS written
+    """
+
+SUPPORT_ASSOCIATION_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MERGE (g:Gene {id: row.gene_id})
+    MERGE (p:Phenotype {id: row.phenotype_id})
+    MERGE (sa:SupportAssociation {id: row.association_id})
+    SET sa.predicate = row.predicate,
+        sa.direct_support = row.direct_support,
+        sa.indirect_support = row.indirect_support,
+        sa.combined_support = row.combined_support
+    MERGE (sa)-[:SUBJECT]->(g)
+    MERGE (sa)-[:OBJECT]->(p)
+    RETURN count(*) AS written
+    """
+
+# Association statement for loads where all Gene and Phenotype nodes are written first.
+# Endpoints are looked up with MATCH instead of MERGE, so rows whose gene or phenotype
+# does not exist are dropped (and counted as missed) rather than creating stub nodes.
+SUPPORT_ASSOCIATION_MATCH_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MATCH (g:Gene {id: row.gene_id})
+    MATCH (p:Phenotype {id: row.phenotype_id})
+    MERGE (sa:SupportAssociation {id: row.association_id})
+    SET sa.predicate = row.predicate,
+        sa.direct_support = row.direct_support,
+        sa.indirect_support = row.indirect_support,
+        sa.combined_support = row.combined_support
+    MERGE (sa)-[:SUBJECT]->(g)
+    MERGE (sa)-[:OBJECT]->(p)
+    RETURN count(*) AS written
+    """
+
+# Statements for the relationship layout, where each association is stored as a
+# (:Gene)-[:SUPPORTS]->(:Phenotype) relationship carrying the scores instead of a
+# SupportAssociation node with SUBJECT and OBJECT relationships.
+SUPPORTS_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MERGE (g:Gene {id: row.gene_id})
+    MERGE (p:Phenotype {id: row.phenotype_id})
+    MERGE (g)-[r:SUPPORTS {id: row.association_id}]->(p)
+    SET r.predicate = row.predicate,
+        r.direct_support = row.direct_support,
+        r.indirect_support = row.indirect_support,
+        r.combined_support = row.combined_support
+    RETURN count(*) AS written
+    """
+
+SUPPORTS_MATCH_BATCH_QUERY = """
+    UNWIND $rows AS row
+    MATCH (g:Gene {id: row.gene_id})
+    MATCH (p:Phenotype {id: row.phenotype_id})
+    MERGE (g)-[r:SUPPORTS {id: row.association_id}]->(p)
+    SET r.predicate = row.predicate,
+        r.direct_support = row.direct_support,
+        r.indirect_support = row.indirect_support,
+        r.combined_support = row.combined_support
+    RETURN count(*) AS written
+    """
+
+# How associations are stored in the graph
+ASSOCIATION_LAYOUTS = ("node", "relationship")
+
+# Association statements keyed by (association layout, match endpoints)
+SUPPORT_ASSOCIATION_QUERIES = {
+    ("node", False): SUPPORT_ASSOCIATION_BATCH_QUERY,
+    ("node", True): SUPPORT_ASSOCIATION_MATCH_BATCH_QUERY,
+    ("relationship", False): SUPPORTS_BATCH_QUERY,
+    ("relationship", True): SUPPORTS_MATCH_BATCH_QUERY,
+}
+
+
+def get_bioindex_client():
+    """
+    Returns the bioindex client shared by the fetch functions, so connections are pooled
+    and kept alive across pages, phenotypes and threads. A new client is created when
+    BIOINDEX_URL or the client options change.
+    """
+    global _bioindex_client
+    with _bioindex_client_lock:
+        if _bioindex_client is None or _bioindex_client.base_url != BIOINDEX_URL.rstrip("/"):
+            if _bioindex_client is not None:
+                _bioindex_client.close()
+            _bioindex_client = bioindex_client.BioindexClient(BIOINDEX_URL, **_bioindex_client_options)
+        return _bioindex_client
+
+def configure_bioindex_client(**options):
+    """Sets the options, e.g. timeout and retries, of the shared bioindex client (see BioindexClient)."""
+    global _bioindex_client
+    with _bioindex_client_lock:
+        _bioindex_client_options.update(options)
+        if _bioindex_client is not None:
+            _bioindex_client.close()
+            _bioindex_client = None
+
+def set_data_source(source):
+    """
+    Makes the fetch functions read bioindex data from `source` instead of the bioindex
+    API, e.g. a kg_ingress.utils.dumps.LocalDumpSource; None restores the API.
+
+    A source provides phenotype_records(), returning the phenotype records, and
+    gene_phenotype_pages(phenotype_name, sigma, geneset_size, fields=None), yielding
+    response bodies like fetch_gene_phenotype_pages.
+    """
+    global _data_source
+    _data_source = source
+
+def _response_recorder(report, stage):
+    if report is None:
+        return None
+    return lambda response, size: report.record_response(stage, response, size=size)
+
+def fetch_phenotype_data(report=None):
     """
     Fetches phenotype data from the bioindex API using pagination.
     Returns a list of all phenotype records from the API.
+
+    If a RunReport is given, every response is counted towards its fetch_phenotypes stage.
+    The records are read from the source set with set_data_source instead, if any.
     """
-    url = "https://bioindex-dev.hugeamp.org/api/bio/query/pigean-phenotypes?q=1"
-    all_data = []
-    
-    # Initial request
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-        
-    data = response.json()
-    all_data.extend(data['data'])
-    
-    # Handle pagination using continuation tokens
-    while data['continuation']:
-        cont_url = f"https://bioindex-dev.hugeamp.org/api/bio/cont?token={data['continuation']}"
-        response = requests.get(cont_url)
-        if response.status_code != 200:
-            raise ValueError(f"Continuation request failed with status {response.status_code}")
-            
-        data = response.json()
-        all_data.extend(data['data'])
-        
-    return all_data
+    if _data_source is not None:
+        return _data_source.phenotype_records()
+    return get_bioindex_client().query("pigean-phenotypes", "1", on_response=_response_recorder(report, "fetch_phenotypes"))
 
-def fetch_gene_phenotype_data(phenotype_name, sigma=2, geneset_size='large'):
+def fetch_gene_phenotype_pages(phenotype_name, sigma=2, geneset_size='large', report=None, fields=None, stream=False):
     """
-    Fetches gene-phenotype associations from the bioindex API for a specific phenotype.
-    
+    Fetches gene-phenotype associations from the bioindex API for a specific phenotype,
+    one response at a time.
+
+    Yields the body of every response, a dict whose 'data' holds the rows of the page and
+    whose 'continuation' is None on the last page, so callers can process a large
+    payload without holding all of it. The pages are read from the source set with
+    set_data_source instead, if any.
+
     Args:
         phenotype_name: Name of the phenotype to query
         sigma: Statistical significance threshold
         geneset_size: Size of the gene set to return ('large', 'medium', 'small')
+        report: Optional RunReport whose fetch_gene_phenotypes stage counts every response
+        fields: Optional fields rows are projected to, e.g. GENE_PHENOTYPE_FIELDS
+        stream: Decode rows while each response is read instead of decoding whole
+            responses, so unused fields are never materialized (requires ijson)
     """
-    url = f"https://bioindex-dev.hugeamp.org/api/bio/query/pigean-gene-phenotype"
+    if _data_source is not None:
+        # Local rows are decoded whole anyway, so only the projection applies
+        return _data_source.gene_phenotype_pages(phenotype_name, sigma, geneset_size, fields=fields)
     q = f"{phenotype_name},{sigma},{geneset_size}"
-    response = requests.get(url, params={'q': q})
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-    
-    data = response.json()
-    all_data = data['data']
+    return get_bioindex_client().query_pages(
+        "pigean-gene-phenotype",
+        q,
+        on_response=_response_recorder(report, "fetch_gene_phenotypes"),
+        fields=fields,
+        stream=stream,
+    )
+
+def fetch_gene_phenotype_data(phenotype_name, sigma=2, geneset_size='large', report=None):
+    """
+    Fetches gene-phenotype associations from the bioindex API for a specific phenotype.
     
-    while data['continuation']:
-        cont_url = f"https://bioindex-dev.hugeamp.org/api/bio/cont?token={data['continuation']}"
-        response = requests.get(cont_url)
-        if response.status_code != 200:
-            raise ValueError(f"Continuation request failed with status {response.status_code}")
-            
-        data = response.json()
+    Args:
+        phenotype_name: Name of the phenotype to query
+        sigma: Statistical significance threshold
+        geneset_size: Size of the gene set to return ('large', 'medium', 'small')
+        report: Optional RunReport whose fetch_gene_phenotypes stage counts every response
+    """
+    all_data = []
+    for data in fetch_gene_phenotype_pages(phenotype_name, sigma, geneset_size, report=report):
         all_data.extend(data['data'])
     return all_data
 
+def _put_unless_stopped(pages, item, stop):
+    """Puts item on a bounded queue, giving up once `stop` is set. Returns whether it was put."""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def stream_gene_phenotype_pages(phenotype_names, max_workers=8, max_pages=4, sigma=2, geneset_size='large', report=None, fields=None, stream=False):
+    """
+    Streams gene-phenotype associations for many phenotypes page by page with bounded
+    concurrency and bounded memory.
+
+    Up to `max_workers` phenotypes are fetched at once, each by a thread that puts its
+    pages on a queue holding at most `max_pages` of them, so at most
+    max_workers * max_pages pages are buffered however large the payloads are, plus
+    the page each fetch has requested ahead from the bioindex client.
+    Yields a (phenotype_name, rows, error, last) tuple per page, phenotype by phenotype
+    in input order, `last` being True on the final page of a phenotype. A failed fetch
+    yields its exception as `error`, with `rows` set to None and `last` True, possibly
+    after pages of that phenotype that were already yielded.
+
+    Args:
+        phenotype_names: Iterable of phenotype names to query
+        max_workers: Maximum number of phenotypes fetched at once
+        max_pages: Maximum number of fetched pages buffered per phenotype
+        sigma: Statistical significance threshold
+        geneset_size: Size of the gene set to return ('large', 'medium', 'small')
+        report: Optional RunReport passed on to fetch_gene_phenotype_pages
+        fields: Optional fields rows are projected to, passed on to fetch_gene_phenotype_pages
+        stream: Whether fetch_gene_phenotype_pages decodes responses as they are read
+    """
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be positive, got {max_workers}")
+    if max_pages < 1:
+        raise ValueError(f"max_pages must be positive, got {max_pages}")
+    names = iter(phenotype_names)
+    pending = deque()
+    # Set when the consumer stops early, so fetch threads blocked on a full queue exit
+    stop = threading.Event()
+
+    def fetch(name, pages):
+        last = False
+        try:
+            for data in fetch_gene_phenotype_pages(name, sigma, geneset_size, report=report, fields=fields, stream=stream):
+                last = not data['continuation']
+                if not _put_unless_stopped(pages, (data['data'], None, last), stop):
+                    return
+        except Exception as e:
+            _put_unless_stopped(pages, (None, e, True), stop)
+            return
+        if not last:
+            _put_unless_stopped(pages, ([], None, True), stop)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next():
+            for name in names:
+                pages = queue.Queue(maxsize=max_pages)
+                pending.append((name, pages))
+                executor.submit(fetch, name, pages)
+                return
+
+        for _ in range(max_workers):
+            submit_next()
+        try:
+            while pending:
+                name, pages = pending[0]
+                rows, error, last = pages.get()
+                if last:
+                    pending.popleft()
+                    # Refill the window before handing the page over so requests stay in flight
+                    submit_next()
+                yield name, rows, error, last
+        finally:
+            stop.set()
+
+def phenotype_source(phenotype):
+    """
+    Returns the source a bioindex phenotype comes from: 'orphanet', 'gcat' or 'portal'.
+    """
+    if "Orphanet" in phenotype:
+        return "orphanet"
+    if "gcat_trait" in phenotype:
+        return "gcat"
+    return "portal"
+
 def transform_phenotype_data(
         fetch_phenotype_data, 
         portal_phenotype_info, 
         gcat_phenotype_info, 
         orphanet_owl,
-        verbose=False):
+        verbose=False,
+        workers=1):
     """
     Transforms raw phenotype data into structured model objects based on their source.
     
@@ -81,18 +378,36 @@ def transform_phenotype_data(
     1. Orphanet phenotypes (rare diseases)
     2. GCAT phenotypes (GWAS catalog traits)
     3. Portal phenotypes (standard portal traits)
+
+    `orphanet_owl` may be the parsed ORDO graph or an index built from it with
+    build_orphanet_index, which avoids running a SPARQL query per phenotype. Likewise
+    `portal_phenotype_info` and `gcat_phenotype_info` may be the mapping tables or the
+    indexes built by build_portal_index and build_gcat_index, which turn each lookup
+    into a dictionary access instead of a scan over the table.
+
+    With `workers` > 1 the phenotypes are split into chunks transformed by a pool of
+    worker processes, which receive the mapping tables once when they start instead of
+    a pickled copy per task. Chunks are merged in input order, so the result is
+    identical to the serial loop.
     
     Returns a list of transformed phenotype objects and related entities.
     """
+    if workers > 1:
+        items = list(fetch_phenotype_data)
+        if len(items) > 1:
+            tables = (portal_phenotype_info, gcat_phenotype_info, orphanet_owl)
+            return _transform_phenotype_data_parallel(items, tables, workers, verbose)
+        fetch_phenotype_data = items
     transformed = []
     for item in tqdm.tqdm(fetch_phenotype_data, desc="Transforming phenotype data", disable=not verbose):
+        source = phenotype_source(item["phenotype"])
         # Process Orphanet rare disease phenotypes
-        if "Orphanet" in item["phenotype"]:
+        if source == "orphanet":
             phenotype = create_orphanet_phenotype(orphanet_owl, item["phenotype"], item["phenotype_name"])
             if phenotype:
                 transformed.append(phenotype)
         # Process GCAT genetic trait phenotypes
-        elif "gcat_trait" in item["phenotype"]:
+        elif source == "gcat":
             phenotype, studies = create_gcat_phenotype(gcat_phenotype_info, item["phenotype"], item["phenotype_name"])
             if phenotype:
                 transformed.append(phenotype)
@@ -104,16 +419,73 @@ def transform_phenotype_data(
                 transformed.append(phenotype)
     return transformed
 
-def transform_gene_phenotype_data(gene_phenotype_data, phenotype_index):
+# Mapping tables of a transform worker process, set by its pool initializer
+_TRANSFORM_TABLES = None
+
+# Workers are started from a fork server, or spawned where there is none, rather than
+# forked from the pipeline, whose prefetch, progress bar and driver threads would leave
+# locks held in a forked child
+TRANSFORM_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _init_transform_worker(tables):
+    global _TRANSFORM_TABLES
+    _TRANSFORM_TABLES = tables
+
+def _transform_phenotype_chunk(chunk):
+    portal_phenotype_info, gcat_phenotype_info, orphanet_owl = _TRANSFORM_TABLES
+    return transform_phenotype_data(chunk, portal_phenotype_info, gcat_phenotype_info, orphanet_owl)
+
+def _transform_phenotype_data_parallel(items, tables, workers, verbose):
+    """
+    Transforms phenotype records in chunks across a pool of worker processes, returning
+    the results concatenated in chunk order.
+    """
+    # Several chunks per worker even out phenotypes of different cost
+    chunk_size = math.ceil(len(items) / (workers * 4))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    context = multiprocessing.get_context(TRANSFORM_START_METHOD)
+    with context.Pool(min(workers, len(chunks)), initializer=_init_transform_worker, initargs=(tables,)) as pool:
+        transformed = []
+        # imap yields chunk results in submission order, whichever worker finishes first
+        results = pool.imap(_transform_phenotype_chunk, chunks)
+        for result in tqdm.tqdm(results, total=len(chunks), desc="Transforming phenotype data", disable=not verbose):
+            transformed.extend(result)
+    return transformed
+
+def support_association_id(gene, phenotype, sigma, geneset_size):
+    """
+    Returns a deterministic SupportAssociation id for a gene-phenotype result.
+
+    The id is a UUID5 of the gene, the bioindex phenotype name, sigma and gene set size,
+    so reloading the same association MERGEs onto the existing node instead of adding a
+    new one. Sigma is taken in canonical form, so a sigma of 2.0 read from a dump gives
+    the same id as 2 from the API.
+    """
+    key = f"{gene}|{phenotype}|{canonical_sigma(sigma)}|{geneset_size}"
+    return f'sa-{uuid.uuid5(SUPPORT_ASSOCIATION_NAMESPACE, key)}'
+
+# Fields of a gene-phenotype row read by transform_gene_phenotype_data
+GENE_PHENOTYPE_FIELDS = ("gene", "phenotype", "combined", "log_bf", "prior", "sigma", "gene_set_size")
+
+def transform_gene_phenotype_data(gene_phenotype_data, phenotype_index, sigma=2, geneset_size='large', compact=False):
     """
     Transforms gene-phenotype association data into Gene objects and SupportAssociation objects.
     
     Creates:
     1. Gene nodes for each unique gene
     2. SupportAssociation edges connecting genes to phenotypes with evidence scores
+
+    Association ids are derived from the gene, phenotype, sigma and gene set size of each
+    row (see support_association_id). `sigma` and `geneset_size` are used for rows that
+    do not carry their own values and should match the fetch parameters.
+
+    With `compact`, associations are returned as a single validated SupportAssociationBatch
+    instead of a list of SupportAssociation objects, which is much cheaper for large
+    payloads. The writers accept either form.
     """
     # Index phenotypes by name field for quick lookup
-    genes, associations = {}, []
+    genes = {}
+    associations = SupportAssociationBatch() if compact else []
     for item in tqdm.tqdm(gene_phenotype_data, desc="Transforming gene phenotype data"):
         # Create gene node if it doesn't exist
         if item["gene"] not in genes:
@@ -123,9 +495,25 @@ def transform_gene_phenotype_data(gene_phenotype_data, phenotype_index):
             )
             genes[item["gene"]] = gene
         try:
+            association_id = support_association_id(
+                item["gene"],
+                item["phenotype"],
+                item.get("sigma", sigma),
+                item.get("gene_set_size", geneset_size)
+            )
+            if compact:
+                associations.append(
+                    association_id,
+                    genes[item["gene"]].id,
+                    phenotype_index[item["phenotype"]].id,
+                    item["combined"],
+                    item.get("log_bf", 0.0),
+                    item["prior"]
+                )
+                continue
             # Create association node
             association = SupportAssociation(
-                id=f'sa-{uuid.uuid4()}',
+                id=association_id,
                 subject=genes[item["gene"]].id,
                 object=phenotype_index[item["phenotype"]].id,
                 predicate="PORTALLINK:supports",
@@ -137,11 +525,26 @@ def transform_gene_phenotype_data(gene_phenotype_data, phenotype_index):
         except KeyError as e:
             print(f"Error when processing gene {item}: {e}")
 
+    if compact:
+        associations.validate()
 
     # Collect all genes
     genes = list(genes.values())
     return genes, associations
 
+def _expand_batches(transformed):
+    """
+    Yields the items of `transformed`, replacing SupportAssociationBatch entries (or a
+    batch passed on its own) by their SupportAssociation objects.
+    """
+    if isinstance(transformed, SupportAssociationBatch):
+        transformed = [transformed]
+    for item in transformed:
+        if isinstance(item, SupportAssociationBatch):
+            yield from item.to_portal_model()
+        else:
+            yield item
+
 def insert_data(transformed, driver=None, neo4j_uri=None, neo4j_user=None, neo4j_password=None):
     """
     Inserts transformed data into Neo4j graph database.
@@ -151,11 +554,13 @@ def insert_data(transformed, driver=None, neo4j_uri=None, neo4j_user=None, neo4j
     - GWAS study nodes
     - Gene nodes
     - SupportAssociation relationships with evidence scores
+
+    SupportAssociationBatch entries are expanded into SupportAssociation objects.
     """
     if driver is None:
         driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
     with driver.session() as session:
-            for item in transformed:
+            for item in _expand_batches(transformed):
                 if isinstance(item, Phenotype):
                     session.run(
                         """
@@ -217,3 +622,251 @@ def insert_data(transformed, driver=None, neo4j_uri=None, neo4j_user=None, neo4j
                     ) 
                 else:
                     raise ValueError(f"Unknown item type: {type(item)}")
+
+
+def _phenotype_row(item):
+    return {
+        "id": item.id,
+        "name": item.name,
+        "description": item.description,
+        "display_name": item.display_name,
+    }
+
+def _gwas_row(item):
+    return {
+        "id": item.id,
+        "name": item.name,
+        "description": item.description,
+    }
+
+def _gene_row(item):
+    return {
+        "id": item.id,
+        "symbol": item.symbol,
+    }
+
+def _support_association_row(item):
+    return {
+        "gene_id": str(item.subject),
+        "phenotype_id": str(item.object),
+        "association_id": item.id,
+        "combined_support": float(item.combined_support.log_odds),
+        "direct_support": float(item.direct_support.log_odds),
+        "indirect_support": float(item.indirect_support.log_odds),
+        "predicate": item.predicate.split(":")[-1], # Removes curie prefix
+    }
+
+# Maps each supported item type to its batch statement and row builder
+BATCH_WRITERS = {
+    Phenotype: (PHENOTYPE_BATCH_QUERY, _phenotype_row),
+    Gwas: (GWAS_BATCH_QUERY, _gwas_row),
+    Gene: (GENE_BATCH_QUERY, _gene_row),
+    SupportAssociation: (SUPPORT_ASSOCIATION_BATCH_QUERY, _support_association_row),
+}
+
+def _write_batch_tx(tx, query, rows):
+    """Runs one UNWIND batch statement in `tx` and returns its written count and summary counters."""
+    result = tx.run(query, rows=rows)
+    record = result.single()
+    summary = result.consume()
+    return record["written"], counters_dict(summary.counters)
+
+def _write_batch(session, query, rows):
+    """
+    Writes one batch of rows with a single UNWIND statement inside an explicit transaction.
+
+    Returns the number of rows the statement reports as written and the statement's
+    Neo4j summary counters.
+    """
+    with session.begin_transaction() as tx:
+        written, counters = _write_batch_tx(tx, query, rows)
+        tx.commit()
+    return written, counters
+
+def _iter_rows(transformed):
+    """Yields (item type, row) for every item of `transformed`, expanding compact association batches."""
+    if isinstance(transformed, SupportAssociationBatch):
+        transformed = [transformed]
+    for item in transformed:
+        if isinstance(item, SupportAssociationBatch):
+            # Compact batches already hold validated columns and are written row by row
+            for row in item.rows():
+                yield SupportAssociation, row
+            continue
+        for item_type, (_, to_row) in BATCH_WRITERS.items():
+            if isinstance(item, item_type):
+                yield item_type, to_row(item)
+                break
+        else:
+            raise ValueError(f"Unknown item type: {type(item)}")
+
+def _record_batch(stats, item_type, rows, written, counters, seconds):
+    type_stats = stats.setdefault(item_type.__name__, {"rows": 0, "missed": 0, "batches": 0, "seconds": 0.0, "counters": {}})
+    type_stats["rows"] += written
+    type_stats["missed"] += rows - written
+    type_stats["batches"] += 1
+    type_stats["seconds"] += seconds
+    for field, value in counters.items():
+        type_stats["counters"][field] = type_stats["counters"].get(field, 0) + value
+
+def _partition_associations(rows, partitions):
+    """
+    Groups association rows into `partitions` buckets by a hash of their gene id, with
+    the rows of each bucket ordered by phenotype id.
+    """
+    buckets = {}
+    for row in rows:
+        buckets.setdefault(zlib.crc32(row["gene_id"].encode("utf-8")) % partitions, []).append(row)
+    return [sorted(bucket, key=lambda row: row["phenotype_id"]) for bucket in buckets.values()]
+
+def _insert_data_pooled(transformed, driver, batch_size, match_endpoints, association_layout, workers):
+    """
+    Writes transformed data like insert_data_batched with `workers` concurrent sessions.
+
+    Item types are written one after the other, Phenotype, Gwas and Gene before
+    SupportAssociation, so associations can MATCH nodes from the same call. Nodes of a
+    type are spread over the workers in batches. Associations lock their gene and
+    phenotype, so they are partitioned by gene bucket, one bucket per worker, and
+    concurrent workers never touch the same gene. Phenotypes are shared, even by the
+    rows of a single phenotype, but every bucket is written in phenotype order, so
+    concurrent batches take phenotype locks in the same order. Each batch is committed
+    with execute_write, which retries it on deadlocks and other transient errors.
+    """
+    rows = {item_type: [] for item_type in BATCH_WRITERS}
+    for item_type, row in _iter_rows(transformed):
+        rows[item_type].append(row)
+    stats = {}
+    stats_lock = threading.Lock()
+    # Sessions are not thread safe, so every worker thread opens its own
+    local = threading.local()
+    sessions = contextlib.ExitStack()
+    sessions_lock = threading.Lock()
+
+    def write(query, item_type, batch_rows):
+        if not hasattr(local, "session"):
+            with sessions_lock:
+                local.session = sessions.enter_context(driver.session())
+        for i in range(0, len(batch_rows), batch_size):
+            batch = batch_rows[i:i + batch_size]
+            written, counters = local.session.execute_write(_write_batch_tx, query, batch)
+            with stats_lock:
+                # Seconds are the wall time of the whole type, added once it is written
+                _record_batch(stats, item_type, len(batch), written, counters, 0.0)
+
+    with sessions, ThreadPoolExecutor(max_workers=workers) as executor:
+        for item_type, (query, _) in BATCH_WRITERS.items():
+            if not rows[item_type]:
+                continue
+            start = time.perf_counter()
+            if item_type is SupportAssociation:
+                query = SUPPORT_ASSOCIATION_QUERIES[association_layout, match_endpoints]
+                partitions = _partition_associations(rows[item_type], workers)
+            else:
+                partitions = [rows[item_type][i:i + batch_size] for i in range(0, len(rows[item_type]), batch_size)]
+            futures = [executor.submit(write, query, item_type, partition) for partition in partitions]
+            for future in futures:
+                future.result()
+            stats[item_type.__name__]["seconds"] += time.perf_counter() - start
+    return stats
+
+def insert_data_batched(transformed, driver=None, neo4j_uri=None, neo4j_user=None, neo4j_password=None, batch_size=1000, match_endpoints=False, association_layout="node", workers=1):
+    """
+    Inserts transformed data into Neo4j graph database in batches.
+
+    `transformed` may contain SupportAssociationBatch entries (or be one), whose rows are
+    written directly without building SupportAssociation objects. Items are grouped by type and each group is flushed every `batch_size` rows as one
+    parameterized UNWIND statement in an explicit transaction, instead of one auto-commit
+    statement per item as in insert_data.
+
+    With `match_endpoints`, SupportAssociation rows look up their Gene and Phenotype with
+    MATCH instead of MERGE. Those nodes must have been written beforehand; associations
+    whose endpoints are missing are skipped and counted as missed.
+
+    `association_layout` selects how associations are stored: "node" writes a
+    SupportAssociation node linked to its gene and phenotype by SUBJECT and OBJECT
+    relationships, "relationship" writes a single (:Gene)-[:SUPPORTS]->(:Phenotype)
+    relationship holding the scores.
+
+    With `workers` above 1, the batches are written by that many concurrent sessions
+    with retries on transient errors (see _insert_data_pooled). All rows of the call are
+    then held in memory.
+
+    Returns a dictionary of write statistics keyed by item type name, each holding the
+    number of rows, rows missed, batches, seconds spent writing, rows per second and
+    the Neo4j summary counters summed over its batches.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
+    if workers < 1:
+        raise ValueError(f"workers must be positive, got {workers}")
+    if association_layout not in ASSOCIATION_LAYOUTS:
+        raise ValueError(f"Unknown association layout: {association_layout}")
+    if driver is None:
+        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+
+    if workers > 1:
+        stats = _insert_data_pooled(transformed, driver, batch_size, match_endpoints, association_layout, workers)
+    else:
+        buffers = {item_type: [] for item_type in BATCH_WRITERS}
+        stats = {}
+
+        def flush(session, item_type):
+            rows = buffers[item_type]
+            if not rows:
+                return
+            query, _ = BATCH_WRITERS[item_type]
+            if item_type is SupportAssociation:
+                query = SUPPORT_ASSOCIATION_QUERIES[association_layout, match_endpoints]
+            start = time.perf_counter()
+            written, counters = _write_batch(session, query, rows)
+            _record_batch(stats, item_type, len(rows), written, counters, time.perf_counter() - start)
+            buffers[item_type] = []
+
+        with driver.session() as session:
+            for item_type, row in _iter_rows(transformed):
+                buffers[item_type].append(row)
+                if len(buffers[item_type]) >= batch_size:
+                    flush(session, item_type)
+            for item_type in BATCH_WRITERS:
+                flush(session, item_type)
+
+    for type_stats in stats.values():
+        seconds = type_stats["seconds"]
+        type_stats["rows_per_sec"] = type_stats["rows"] / seconds if seconds > 0 else None
+    return stats
+
+def delete_support_associations(phenotype_id, gene_ids, driver=None, neo4j_uri=None, neo4j_user=None, neo4j_password=None, association_layout="node"):
+    """
+    Deletes the associations linking the given genes to a phenotype, stored either as
+    SupportAssociation nodes or as SUPPORTS relationships depending on `association_layout`.
+
+    Returns the number of deleted associations.
+    """
+    gene_ids = list(gene_ids)
+    if not gene_ids:
+        return 0
+    if driver is None:
+        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+    with driver.session() as session:
+        query = DELETE_SUPPORT_ASSOCIATIONS_QUERIES[association_layout]
+        summary = session.run(query, phenotype_id=phenotype_id, gene_ids=gene_ids).consume()
+    if association_layout == "relationship":
+        return summary.counters.relationships_deleted
+    return summary.counters.nodes_deleted
+
+def ensure_schema(driver=None, neo4j_uri=None, neo4j_user=None, neo4j_password=None, timeout=300):
+    """
+    Creates the constraints and indexes the loaders rely on, if they do not exist yet.
+
+    Waits up to `timeout` seconds for all indexes to come online and returns the state
+    of every index in the database as a list of dictionaries with name, type,
+    labelsOrTypes, properties, state and populationPercent.
+    """
+    if driver is None:
+        driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+    with driver.session() as session:
+        for statement in SCHEMA_STATEMENTS:
+            session.run(statement).consume()
+        session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+        return [record.data() for record in session.run(SHOW_INDEXES_QUERY)]
+
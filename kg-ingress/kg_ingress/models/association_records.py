@@ -0,0 +1,84 @@
+from array import array
+from typing import Iterator
+from kg_ingress.models.portal_model import (
+    SupportAssociation,
+    CombinedSupportScore,
+    DirectSupportScore,
+    IndirectSupportScore,
+)
+
+
+class SupportAssociationBatch:
+    """
+    Column-oriented batch of gene-phenotype support associations.
+
+    Holds ids and endpoints in lists and the three log-odds scores in float arrays, so
+    bulk transforms avoid building a SupportAssociation and three nested score objects
+    per row. Scores are coerced to float on append; the remaining fields are validated
+    once for the whole batch by validate(). Callers that need the LinkML model get it
+    from to_portal_model().
+    """
+
+    __slots__ = ("predicate", "ids", "subjects", "objects", "combined_support", "direct_support", "indirect_support")
+
+    def __init__(self, predicate: str = "PORTALLINK:supports"):
+        self.predicate = predicate
+        self.ids = []
+        self.subjects = []
+        self.objects = []
+        self.combined_support = array("d")
+        self.direct_support = array("d")
+        self.indirect_support = array("d")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, id: str, subject: str, object: str, combined_support: float, direct_support: float, indirect_support: float):
+        """Adds one association to the batch. Raises if a score is not a number."""
+        scores = float(combined_support), float(direct_support), float(indirect_support)
+        self.combined_support.append(scores[0])
+        self.direct_support.append(scores[1])
+        self.indirect_support.append(scores[2])
+        self.ids.append(id)
+        self.subjects.append(subject)
+        self.objects.append(object)
+
+    def validate(self):
+        """
+        Checks the batch the way the LinkML model would check each association.
+
+        Raises ValueError if any id, subject or object is missing or not a string.
+        """
+        if not self.predicate:
+            raise ValueError("predicate must be set")
+        for field in ("ids", "subjects", "objects"):
+            for i, value in enumerate(getattr(self, field)):
+                if not isinstance(value, str) or not value:
+                    raise ValueError(f"Invalid {field[:-1]} at row {i}: {value!r}")
+
+    def rows(self) -> Iterator[dict]:
+        """Yields one parameter dictionary per association, as used by the batched writers."""
+        predicate = self.predicate.split(":")[-1] # Removes curie prefix
+        for i in range(len(self.ids)):
+            yield {
+                "gene_id": self.subjects[i],
+                "phenotype_id": self.objects[i],
+                "association_id": self.ids[i],
+                "combined_support": self.combined_support[i],
+                "direct_support": self.direct_support[i],
+                "indirect_support": self.indirect_support[i],
+                "predicate": predicate,
+            }
+
+    def to_portal_model(self) -> Iterator[SupportAssociation]:
+        """Yields the associations as portal_model SupportAssociation objects."""
+        for i in range(len(self.ids)):
+            yield SupportAssociation(
+                id=self.ids[i],
+                subject=self.subjects[i],
+                object=self.objects[i],
+                predicate=self.predicate,
+                combined_support=CombinedSupportScore(log_odds=self.combined_support[i]),
+                direct_support=DirectSupportScore(log_odds=self.direct_support[i]),
+                indirect_support=IndirectSupportScore(log_odds=self.indirect_support[i])
+            )
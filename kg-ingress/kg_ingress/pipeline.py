@@ -1,10 +1,17 @@
 from kg_ingress.assets import *
+from kg_ingress.models.association_records import SupportAssociationBatch
+from kg_ingress.utils.ingest_state import IngestState
+from kg_ingress.utils.checkpoint import RunCheckpoint
+from kg_ingress.utils.bulk_export import BulkCsvWriter
+from kg_ingress.utils.instrumentation import RunReport, counters_dict
+from kg_ingress.utils.staging import StagingArea, new_snapshot_dir, resolve_snapshot_dir
+from kg_ingress.utils.dumps import LocalDumpSource
 import pandas as pd
-from rdflib import Graph
 from neo4j import GraphDatabase
+from functools import cached_property
 import argparse
 import logging
-from datetime import datetime
+import os
 
 # Configure logging
 logging.basicConfig(
@@ -19,24 +26,99 @@ NEO4J_URI = "bolt://localhost:7687"  # Default local Neo4j connection
 NEO4J_USER = "neo4j"                 # Default Neo4j username
 NEO4J_PASSWORD = "mysecret"          # Neo4j password (should be configured securely in production)
 
-# Initialize Neo4j connection
-logger.info("Creating Neo4j driver")
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-logger.info("Neo4j driver created")
-
-# Load required mapping files for phenotype data integration
-logger.info("Loading data files")
-# Portal phenotype mappings - contains standardized trait names and descriptions
-portal_phenotype_info = pd.read_csv("data/amp-traits-mapping-portal-phenotypes_06262024.csv")
-# GCAT phenotype mappings - contains genetic trait associations
-gcat_phenotype_info = pd.read_csv("data/gcat_v1.0.3.1.tsv", sep="\t")
-gcat_phenotype_info = preprocess_gcat_info(gcat_phenotype_info)
-# Load Orphanet ontology for rare disease mappings
-orphanet_owl = Graph()
-orphanet_owl.parse("data/ORDO_en_4.5.owl", format="xml")
-logger.info("Data files loaded")
+# Mapping files for phenotype data integration, relative to the data directory
+DATA_DIR = "data"
+PORTAL_PHENOTYPES_FILE = "amp-traits-mapping-portal-phenotypes_06262024.csv"
+GCAT_FILE = "gcat_v1.0.3.1.tsv"
+ORDO_FILE = "ORDO_en_4.5.owl"
+# Fingerprints recorded by incremental runs, relative to the data directory
+INGEST_STATE_FILE = ".ingest_state.json"
+# Progress of the current run, used by --resume, relative to the data directory
+CHECKPOINT_DIR = ".checkpoint"
 
-if __name__ == "__main__":
+# Number of GCAT rows read and preprocessed at a time
+GCAT_CHUNK_SIZE = 100_000
+
+
+class PipelineResources:
+    """
+    Neo4j connection and phenotype mapping tables used by the pipeline.
+
+    Each resource is built the first time it is accessed, so importing the pipeline
+    or running it with --help costs nothing, and a run only loads the mapping files
+    for the phenotype sources it actually processes.
+    """
+
+    def __init__(self, neo4j_uri=NEO4J_URI, neo4j_user=NEO4J_USER, neo4j_password=NEO4J_PASSWORD, data_dir=DATA_DIR):
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_user = neo4j_user
+        self.neo4j_password = neo4j_password
+        self.data_dir = data_dir
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the Neo4j driver if it was created."""
+        if "driver" in self.__dict__:
+            self.driver.close()
+            del self.__dict__["driver"]
+
+    @cached_property
+    def driver(self):
+        logger.info("Creating Neo4j driver")
+        driver = GraphDatabase.driver(self.neo4j_uri, auth=(self.neo4j_user, self.neo4j_password))
+        logger.info("Neo4j driver created")
+        return driver
+
+    @cached_property
+    def portal_index(self):
+        # Portal phenotype mappings - contains standardized trait names and descriptions
+        logger.info("Loading portal phenotype mappings")
+        portal_phenotype_info = pd.read_csv(os.path.join(self.data_dir, PORTAL_PHENOTYPES_FILE))
+        # Grouped by phenotype name once so each lookup is a dictionary access
+        return build_portal_index(portal_phenotype_info)
+
+    @cached_property
+    def gcat_index(self):
+        # GCAT phenotype mappings - contains genetic trait associations
+        # Only the trait and study columns are read, in chunks to bound peak memory
+        logger.info("Loading GCAT phenotype mappings")
+        gcat_phenotype_info = load_gcat_info(os.path.join(self.data_dir, GCAT_FILE), chunksize=GCAT_CHUNK_SIZE)
+        return build_gcat_index(gcat_phenotype_info)
+
+    @cached_property
+    def orphanet_index(self):
+        # Orphanet ontology for rare disease mappings, indexed once so each phenotype lookup
+        # is a dictionary access. The index is cached on disk keyed by the OWL file hash.
+        logger.info("Loading Orphanet ontology")
+        return load_orphanet_index(os.path.join(self.data_dir, ORDO_FILE))
+
+
+def group_by_phenotype(transformed):
+    """
+    Returns the objects of transform_phenotype_data keyed by phenotype name, relying on
+    every Phenotype being followed by its Gwas studies.
+    """
+    groups, current = {}, None
+    for item in transformed:
+        if isinstance(item, Phenotype):
+            current = groups.setdefault(item.name, [])
+        current.append(item)
+    return groups
+
+
+def count_rows(items):
+    """Returns the number of rows in items, counting every association of a SupportAssociationBatch."""
+    if isinstance(items, SupportAssociationBatch):
+        return len(items)
+    return sum(len(item) if isinstance(item, SupportAssociationBatch) else 1 for item in items)
+
+def parse_args(argv=None):
+    """Parses and validates the pipeline command line arguments."""
     # Set up command line arguments for flexible execution
     parser = argparse.ArgumentParser()
     parser.add_argument("--test", action="store_true", help="Run in test mode")
@@ -45,57 +127,459 @@ if __name__ == "__main__":
     parser.add_argument("--clean-db", action="store_true", help="Clean the database before running")
     parser.add_argument("--log-level", type=str, default="INFO", help="Set the log level")
     parser.add_argument("--phenos", help="Comma-separated list of phenotypes to process", default=None)
-    args = parser.parse_args()
+    parser.add_argument("--batch-size", action="store", type=int, default=1000, help="Number of rows written per UNWIND batch")
+    parser.add_argument("--fetch-workers", action="store", type=int, default=8, help="Number of gene-phenotype requests kept in flight")
+    parser.add_argument("--fetch-buffer-pages", action="store", type=int, default=4, help="Number of fetched pages buffered per phenotype in flight")
+    parser.add_argument("--write-workers", action="store", type=int, default=1, help="Number of concurrent Neo4j sessions writing batches")
+    parser.add_argument("--http-timeout", action="store", type=float, default=None, help="Seconds to wait for a bioindex response before retrying it")
+    parser.add_argument("--http-retries", action="store", type=int, default=None, help="Number of times a failed bioindex request is retried")
+    parser.add_argument("--stream-decode", action="store_true", help="Decode bioindex responses as they are read, keeping only the fields the pipeline uses (requires ijson)")
+    parser.add_argument("--transform-workers", action="store", type=int, default=1, help="Number of processes transforming phenotype records")
+    parser.add_argument("--data-dir", action="store", default=DATA_DIR, help="Directory containing the mapping files")
+    parser.add_argument("--incremental", action="store_true", help="Only ingest phenotypes and associations that changed since the last incremental run")
+    parser.add_argument("--state-file", action="store", default=None, help=f"Incremental state file (default: <data-dir>/{INGEST_STATE_FILE})")
+    parser.add_argument("--export-bulk-csv", action="store", default=None, metavar="DIR", help="Write neo4j-admin import CSV files to DIR instead of loading Neo4j")
+    parser.add_argument("--skip-schema", action="store_true", help="Do not create constraints and indexes before loading")
+    parser.add_argument(
+        "--load-mode",
+        choices=["merge", "match"],
+        default="merge",
+        help="merge: associations MERGE their gene and phenotype; match: nodes are written first and associations MATCH them"
+    )
+    parser.add_argument(
+        "--association-layout",
+        choices=list(ASSOCIATION_LAYOUTS),
+        default="node",
+        help="node: SupportAssociation nodes linked by SUBJECT and OBJECT; relationship: scores stored on (:Gene)-[:SUPPORTS]->(:Phenotype)"
+    )
+    parser.add_argument("--per-item-insert", action="store_true", help="Write one statement per item instead of batching")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoint instead of starting over")
+    parser.add_argument("--checkpoint-dir", action="store", default=None, help=f"Directory holding the run checkpoint (default: <data-dir>/{CHECKPOINT_DIR})")
+    parser.add_argument("--stage-dir", action="store", default=None, metavar="DIR", help="Also write fetched bioindex data to a new Parquet snapshot under DIR")
+    parser.add_argument("--from-stage", action="store", default=None, metavar="PATH", help="Read bioindex data from a staged snapshot, or the latest one under PATH, instead of the API")
+    parser.add_argument("--from-dump", action="store", default=None, metavar="DIR", help="Read bioindex data from the local phenotypes and gene_phenotypes dump files in DIR instead of the API")
+    parser.add_argument("--spool-dir", action="store", default=None, metavar="DIR", help="Keep the per-phenotype split of the --from-dump data in DIR, reused while the dump is unchanged (default: a temporary directory)")
+    parser.add_argument("--report", action="store", default=None, metavar="PATH", help="Write per-stage timing and throughput as a JSON run report to PATH")
+    args = parser.parse_args(argv)
+
+    if args.per_item_insert and args.load_mode == "match":
+        parser.error("--load-mode match requires batched inserts")
+    if args.per_item_insert and args.write_workers > 1:
+        parser.error("--write-workers requires batched inserts")
+    if args.per_item_insert and args.association_layout == "relationship":
+        parser.error("--association-layout relationship requires batched inserts")
+    if args.clean_db and args.incremental:
+        parser.error("--clean-db cannot be combined with --incremental, unchanged data would not be written again")
+    if args.export_bulk_csv and (args.clean_db or args.incremental):
+        parser.error("--export-bulk-csv cannot be combined with --clean-db or --incremental")
+    if args.export_bulk_csv and args.resume:
+        parser.error("--resume cannot be used with --export-bulk-csv, exports always start over")
+    if args.stage_dir and args.from_stage:
+        parser.error("--stage-dir cannot be combined with --from-stage, the staged data is already on disk")
+    if args.stream_decode and args.from_stage:
+        parser.error("--stream-decode cannot be combined with --from-stage, staged data is not fetched")
+    if args.from_dump and args.from_stage:
+        parser.error("--from-dump cannot be combined with --from-stage, choose one source")
+    if args.stream_decode and args.from_dump:
+        parser.error("--stream-decode cannot be combined with --from-dump, dumps are not fetched")
+    if args.spool_dir and not args.from_dump:
+        parser.error("--spool-dir requires --from-dump")
+    if args.spool_dir and os.path.realpath(args.spool_dir) == os.path.realpath(args.from_dump):
+        parser.error("--spool-dir must not be the --from-dump directory")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
 
     # Set log level based on argument
     log_level = getattr(logging, args.log_level.upper())
     logger.setLevel(log_level)
 
-    if args.clean_db:
+    exporter = BulkCsvWriter(args.export_bulk_csv, association_layout=args.association_layout) if args.export_bulk_csv else None
+    report = RunReport(options=vars(args))
+    # With --from-dump the fetch functions read the local dumps instead of the API
+    source = LocalDumpSource(args.from_dump, spool_dir=args.spool_dir) if args.from_dump else None
+    with PipelineResources(data_dir=args.data_dir) as resources:
+        try:
+            if source is not None:
+                set_data_source(source)
+                logger.info(f"Splitting {source.gene_phenotypes_path} by phenotype into {source.spool_dir}")
+                with report.stage("spool_dump"):
+                    counts = source.spool()
+                report.add("spool_dump", items=sum(counts.values()))
+            run(args, resources, exporter, report)
+        finally:
+            if source is not None:
+                set_data_source(None)
+                source.close()
+            if exporter is not None:
+                exporter.close()
+            # The report is also written for failed runs, to show where they spent their time
+            if args.report:
+                report.save(args.report)
+                logger.info(f"Run report written to {args.report}")
+
+
+def run(args, resources, exporter=None, report=None):
+    """
+    Runs the pipeline steps with the parsed command line arguments.
+
+    When `exporter` is given, transformed objects are streamed to its CSV files
+    instead of being written to Neo4j. Otherwise progress is checkpointed so that an
+    interrupted run can be continued with --resume.
+
+    Wall time, item counts, bytes and HTTP requests fetched, and Neo4j counters of
+    every stage are recorded in `report`.
+    """
+    if report is None:
+        report = RunReport()
+    client_options = {}
+    if args.http_timeout is not None:
+        client_options["timeout"] = args.http_timeout
+    if args.http_retries is not None:
+        client_options["retries"] = args.http_retries
+    if client_options:
+        configure_bioindex_client(**client_options)
+    # Accumulated batched write statistics per item type, reported at the end of the run
+    write_stats = {}
+
+    def write(items, stage):
+        """Writes items to Neo4j with the batched writer unless the per-item fallback was requested."""
+        with report.stage(stage):
+            if exporter is not None:
+                exporter.write(items)
+                report.add(stage, items=count_rows(items))
+                return
+            if args.per_item_insert:
+                insert_data(items, driver=resources.driver)
+                report.add(stage, items=count_rows(items))
+                return
+            stats = insert_data_batched(
+                items,
+                driver=resources.driver,
+                batch_size=args.batch_size,
+                match_endpoints=args.load_mode == "match",
+                association_layout=args.association_layout,
+                workers=args.write_workers
+            )
+        for type_name, type_stats in stats.items():
+            report.add(stage, items=type_stats["rows"])
+            report.add_counters(stage, type_stats["counters"])
+            totals = write_stats.setdefault(type_name, {"rows": 0, "missed": 0, "seconds": 0.0})
+            totals["rows"] += type_stats["rows"]
+            totals["missed"] += type_stats["missed"]
+            totals["seconds"] += type_stats["seconds"]
+
+    # Progress checkpoint for loads into Neo4j; exports are cheap to redo from scratch
+    checkpoint = None
+    if exporter is None:
+        checkpoint = RunCheckpoint(
+            args.checkpoint_dir or os.path.join(args.data_dir, CHECKPOINT_DIR),
+            # A checkpoint only applies to a run selecting and writing the same data
+            options={
+                "phenos": args.phenos,
+                "test": args.test,
+                "test_size": args.test_size,
+                "incremental": args.incremental,
+                "load_mode": args.load_mode,
+                "association_layout": args.association_layout,
+            }
+        )
+        if args.resume and checkpoint.load():
+            logger.info(f"Resuming from {checkpoint.directory}: stages {checkpoint.stages or 'none'} done, {len(checkpoint.completed)} phenotypes completed")
+        else:
+            if args.resume:
+                logger.warning(f"No checkpoint found in {checkpoint.directory}, starting from the beginning")
+            checkpoint.reset()
+
+    # Fetched bioindex data is written to a new snapshot with --stage-dir, or read from one
+    # instead of the API with --from-stage
+    staging = source_stage = None
+    if args.stage_dir:
+        staging = StagingArea(new_snapshot_dir(args.stage_dir))
+        logger.info(f"Staging fetched bioindex data in {staging.path}")
+    if args.from_stage:
+        source_stage = StagingArea(resolve_snapshot_dir(args.from_stage))
+        logger.info(f"Reading bioindex data staged in {source_stage.path}")
+
+    def stage_done(stage):
+        return checkpoint is not None and checkpoint.stage_done(stage)
+
+    def complete_stage(stage):
+        if checkpoint is not None:
+            checkpoint.complete_stage(stage)
+
+    if args.clean_db and not stage_done("clean_db"):
         logger.warning("Cleaning database")
-        with driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
+        with report.stage("clean_db"), resources.driver.session() as session:
+            summary = session.run("MATCH (n) DETACH DELETE n").consume()
+        report.add_counters("clean_db", counters_dict(summary.counters))
         logger.info("Database cleaned")
+        complete_stage("clean_db")
+
+    # Constraints and indexes must exist before loading, otherwise every MERGE scans its label
+    if exporter is None and not args.skip_schema:
+        logger.info("Creating constraints and indexes")
+        with report.stage("schema"):
+            indexes = ensure_schema(driver=resources.driver)
+        for index in indexes:
+            log = logger.info if index["state"] == "ONLINE" else logger.warning
+            log(f"Index {index['name']} on {index['labelsOrTypes']} {index['properties']}: {index['state']} ({index['populationPercent']:.0f}%)")
 
     # Main Pipeline Steps:
     
     # 1. Fetch phenotype data from bioindex API
-    logger.info("Fetching phenotype data")
-    data = fetch_phenotype_data()
-    if args.phenos:
-        # Filter data based on specified phenotypes
-        selected_phenos = set(args.phenos.split(","))
-        data = [item for item in data if item["phenotype"] in selected_phenos]
-    if args.test:
-        logger.debug("Running in test mode")
-        data = data[:args.test_size]  # Limit data for testing
-        
+    if checkpoint is not None and checkpoint.records is not None:
+        logger.info(f"Using {len(checkpoint.records)} phenotype records from the checkpoint")
+        data = checkpoint.records
+    else:
+        logger.info("Fetching phenotype data")
+        with report.stage("fetch_phenotypes"):
+            if source_stage is not None:
+                data = source_stage.phenotype_records()
+            else:
+                data = fetch_phenotype_data(report=report)
+        report.add("fetch_phenotypes", items=len(data))
+        if staging is not None:
+            # The full phenotype list is staged, so later runs can select other phenotypes from it
+            with report.stage("stage_data"):
+                staging.write_phenotypes(data)
+        if args.phenos:
+            # Filter data based on specified phenotypes
+            selected_phenos = set(args.phenos.split(","))
+            data = [item for item in data if item["phenotype"] in selected_phenos]
+        if args.test:
+            logger.debug("Running in test mode")
+            data = data[:args.test_size]  # Limit data for testing
+        if checkpoint is not None:
+            checkpoint.save_records(data)
+
+    records = {item["phenotype"]: item for item in data}
+
     # 2. Transform raw phenotype data into structured objects
     logger.info("Transforming phenotype data")
-    transformed = transform_phenotype_data(data, portal_phenotype_info, gcat_phenotype_info, orphanet_owl, verbose=True)
+    # Only load the mapping tables for sources present in the selected phenotypes
+    sources = {phenotype_source(item["phenotype"]) for item in data}
+
+    with report.stage("load_mappings"):
+        portal_index = resources.portal_index if "portal" in sources else None
+        gcat_index = resources.gcat_index if "gcat" in sources else None
+        orphanet_index = resources.orphanet_index if "orphanet" in sources else None
+
+    with report.stage("transform_phenotypes"):
+        transformed = transform_phenotype_data(
+            data, portal_index, gcat_index, orphanet_index, verbose=True, workers=args.transform_workers
+        )
+    report.add("transform_phenotypes", items=len(transformed))
+    unchanged = []
+
+    # In incremental mode only phenotypes whose record or transformed objects changed since
+    # the last run are written. The objects are fingerprinted too, so mapping file changes
+    # are picked up, and the state is discarded when the association layout changes
+    state = None
+    if args.incremental:
+        state = IngestState(
+            args.state_file or os.path.join(args.data_dir, INGEST_STATE_FILE),
+            settings={"association_layout": args.association_layout},
+        )
+        if state.reset:
+            logger.warning(f"Incremental state in {state.path} was recorded with other settings, writing everything again")
+        objects = group_by_phenotype(transformed)
+        records = {name: [item, objects.get(name, [])] for name, item in records.items()}
+        changed = {name for name, record in records.items() if state.record_changed(name, record)}
+        unchanged = [item for name, group in objects.items() if name not in changed for item in group]
+        transformed = [item for name, group in objects.items() if name in changed for item in group]
+        logger.info(f"{len(changed)} of {len(data)} phenotypes changed since the last incremental run")
     
     # 3. Insert transformed phenotype data into Neo4j
-    logger.info("Inserting data into Neo4j")
-    insert_data(transformed, driver=driver)
+    if stage_done("phenotypes"):
+        logger.info("Phenotype data already inserted, skipping")
+    else:
+        logger.info("Inserting data into Neo4j")
+        write(transformed, "insert_phenotypes")
+        complete_stage("phenotypes")
+    if state is not None:
+        for name in changed:
+            state.update_record(name, records[name])
 
     # 4. Process gene-phenotype associations
     # Create an index of phenotypes for quick lookup
-    phenotype_index = {p.name: p for p in transformed if isinstance(p, Phenotype)}
-    genes_dir = {}
+    phenotype_index = {p.name: p for p in transformed + unchanged if isinstance(p, Phenotype)}
+    # Ids of the genes written so far; genes are upserted the first time they are seen
+    seen_genes = set()
+    failed_phenotypes = []
+    skipped_phenotypes = 0
+
+    # Phenotypes completed by an interrupted run are neither fetched nor written again
+    pending = [name for name in phenotype_index if checkpoint is None or not checkpoint.is_completed(name)]
+    if len(pending) < len(phenotype_index):
+        logger.info(f"Skipping {len(phenotype_index) - len(pending)} phenotypes completed before the run was interrupted")
 
     # For each phenotype, fetch and process associated genes
-    for _, phenotype in tqdm.tqdm(phenotype_index.items(), desc='Processing gene phenotype associations'):
-        # Fetch gene associations from bioindex API
-        data = fetch_gene_phenotype_data(phenotype.name)
+    # Gene associations are streamed from the bioindex API page by page, with several
+    # phenotypes in flight and a bounded number of pages buffered for each, and handed
+    # over in phenotype order. Every page is transformed and written before the next one
+    # is taken, so memory stays flat however many phenotypes and rows there are.
+    # The fetch stage time is how long this loop waited for pages, so together with the
+    # transform and insert stages it shows which side of the loop the run is bound by
+    if source_stage is not None:
+        # Incremental runs fingerprint whole rows, so only plain runs project the columns
+        columns = GENE_PHENOTYPE_FIELDS if state is None else None
+        fetched = source_stage.iter_gene_phenotype_pages(pending, columns=columns)
+    else:
+        # Streamed rows are projected to the fields transform reads, unless whole rows are
+        # needed to fingerprint them or to stage a complete snapshot
+        fields = GENE_PHENOTYPE_FIELDS if args.stream_decode and state is None and staging is None else None
+        fetched = stream_gene_phenotype_pages(
+            pending,
+            max_workers=args.fetch_workers,
+            max_pages=args.fetch_buffer_pages,
+            report=report,
+            fields=fields,
+            stream=args.stream_decode,
+        )
+    fetched = report.timed(fetched, "fetch_gene_phenotypes")
+
+    # Progress of the phenotype currently streamed: pages seen, rows taken in test mode,
+    # rows buffered in incremental mode, and genes and associations written
+    current = {}
+
+    def start_phenotype():
+        current.update(pages=0, taken=0, buffered=[], genes=0, associations=0)
+
+    # Associations waiting to be written and the phenotypes whose last rows are among them.
+    # A single writer gets every page as it comes; a writer pool gets enough rows at once
+    # for every worker to have a full batch of its genes
+    write_threshold = args.batch_size * args.write_workers if args.write_workers > 1 else 0
+    buffered_associations = []
+    awaiting_completion = []
+
+    def flush_associations():
+        if buffered_associations:
+            write(buffered_associations, "insert_associations")
+            buffered_associations.clear()
+        # Phenotypes are only checkpointed once all of their associations are written
+        if checkpoint is not None:
+            for name, written in awaiting_completion:
+                checkpoint.complete_phenotype(name, **written)
+        awaiting_completion.clear()
+
+    start_phenotype()
+    progress = tqdm.tqdm(total=len(pending), desc='Processing gene phenotype associations')
+    for name, page, error, last in fetched:
+        if error is not None:
+            # Pages staged before the error are left without a completion marker, so the
+            # phenotype is not replayed from the snapshot as if it were complete
+            logger.error(f"Failed to fetch gene phenotype data for {name}: {error}")
+            failed_phenotypes.append(name)
+            start_phenotype()
+            progress.update()
+            continue
+        report.add("fetch_gene_phenotypes", items=len(page))
+        if staging is not None:
+            with report.stage("stage_data"):
+                staging.write_gene_phenotypes(name, page, part=current["pages"], last=last)
+        current["pages"] += 1
         if args.test:
-            data = data[:args.test_size]  # Limit data for testing
-        # Transform gene data and create association objects
-        genes, associations = transform_gene_phenotype_data(data, phenotype_index)
-        for gene in genes:
-            genes_dir[gene.id] = gene
-        insert_data(associations, driver=driver)
+            page = page[:args.test_size - current["taken"]]  # Limit data for testing
+            current["taken"] += len(page)
+        rows = page
+        if state is not None:
+            # Fingerprints cover the whole payload, so incremental runs buffer a phenotype's
+            # pages and process them together
+            current["buffered"].extend(page)
+            if not last:
+                continue
+            data = current["buffered"]
+            # Skip phenotypes whose record and gene-phenotype payload are unchanged
+            if not state.payload_changed(name, records[name], data):
+                skipped_phenotypes += 1
+                if checkpoint is not None:
+                    checkpoint.complete_phenotype(name, genes=0, associations=0)
+                start_phenotype()
+                progress.update()
+                continue
+            rows, removed_genes = state.diff_rows(name, data)
+            # Association ids are deterministic, so changed rows are updated in place by MERGE
+            # and only the associations of removed genes need deleting
+            with report.stage("delete_associations"):
+                deleted = delete_support_associations(
+                    phenotype_index[name].id,
+                    removed_genes,
+                    driver=resources.driver,
+                    association_layout=args.association_layout
+                )
+            report.add("delete_associations", items=deleted)
+        if rows:
+            # Transform gene data and create association objects
+            with report.stage("transform_gene_phenotypes"):
+                genes, associations = transform_gene_phenotype_data(rows, phenotype_index, compact=True)
+            report.add("transform_gene_phenotypes", items=len(associations))
+            # 5. Insert genes and their associations into Neo4j
+            # Genes not written yet go first, so they exist before associations MATCH them in
+            # match mode and a completed phenotype never depends on writes still to come
+            new_genes = [gene for gene in genes if gene.id not in seen_genes]
+            if new_genes:
+                write(new_genes, "insert_genes")
+                seen_genes.update(gene.id for gene in new_genes)
+            buffered_associations.append(associations)
+            current["genes"] += len(new_genes)
+            current["associations"] += len(associations)
+        if last:
+            if state is not None:
+                state.update_payload(name, records[name], current["buffered"])
+            awaiting_completion.append((name, {"genes": current["genes"], "associations": current["associations"]}))
+            start_phenotype()
+            progress.update()
+        if sum(len(associations) for associations in buffered_associations) >= write_threshold:
+            flush_associations()
+    flush_associations()
+    progress.close()
+
+    # Fingerprints are only persisted once everything they describe has been written
+    if state is not None:
+        state.save()
+        logger.info(f"Skipped {skipped_phenotypes} phenotypes with unchanged gene phenotype data")
+
+    if failed_phenotypes:
+        logger.warning(f"Gene phenotype data could not be fetched for {len(failed_phenotypes)} phenotypes: {','.join(failed_phenotypes)}")
+
+    # The checkpoint is kept while there is work left, so failed phenotypes can be retried with --resume
+    if checkpoint is not None:
+        if failed_phenotypes:
+            checkpoint.close()
+            logger.warning(f"Rerun with --resume to retry the failed phenotypes from {checkpoint.directory}")
+        else:
+            checkpoint.remove()
 
-    # 5. Insert genes and their associations into Neo4j
-    insert_data(genes_dir.values(), driver=driver)
+    for type_name, totals in write_stats.items():
+        rate = totals["rows"] / totals["seconds"] if totals["seconds"] > 0 else 0.0
+        logger.info(f"Wrote {totals['rows']} {type_name} rows ({rate:.0f} rows/sec)")
+        if totals["missed"]:
+            logger.warning(f"Skipped {totals['missed']} {type_name} rows whose gene or phenotype does not exist")
+
+    if exporter is not None:
+        for file_name, count in exporter.counts.items():
+            logger.info(f"Exported {count} rows to {file_name}")
+        logger.info(f"Build the database offline with: {exporter.import_command()}")
+
+    if source_stage is None and not args.from_dump:
+        report.set_endpoints(get_bioindex_client().stats())
+        for endpoint, counters in report.endpoints.items():
+            logger.info(
+                f"Bioindex {endpoint}: {counters['requests']} requests, {counters['retries']} retries, "
+                f"{counters['failures']} failures, {counters['bytes'] / 2**20:.1f} MB"
+            )
+
+    for stage, stats in report.to_dict()["stages"].items():
+        logger.info(
+            f"Stage {stage}: {stats['seconds']:.1f}s, {stats['items']} items"
+            + (f", {stats['http_requests']} requests, {stats['bytes'] / 2**20:.1f} MB" if stats["http_requests"] else "")
+        )
 
     logger.info("Done")
+
+
+if __name__ == "__main__":
+    main()
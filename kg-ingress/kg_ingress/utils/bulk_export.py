@@ -0,0 +1,160 @@
+import csv
+import os
+from typing import Dict, Iterable
+from kg_ingress.models.portal_model import Phenotype, Gwas, Gene, SupportAssociation
+from kg_ingress.models.association_records import SupportAssociationBatch
+
+
+# Header of each CSV file in the neo4j-admin import format. Node ids use one id space per
+# label so relationship files can reference them unambiguously.
+NODE_FILES = {
+    "phenotype_nodes.csv": ["id:ID(Phenotype)", "name", "description", "display_name", ":LABEL"],
+    "gwas_nodes.csv": ["id:ID(Gwas)", "name", "description", ":LABEL"],
+    "gene_nodes.csv": ["id:ID(Gene)", "symbol", ":LABEL"],
+    "support_association_nodes.csv": [
+        "id:ID(SupportAssociation)",
+        "predicate",
+        "direct_support:float",
+        "indirect_support:float",
+        "combined_support:float",
+        ":LABEL",
+    ],
+}
+RELATIONSHIP_FILES = {
+    "subject_relationships.csv": [":START_ID(SupportAssociation)", ":END_ID(Gene)", ":TYPE"],
+    "object_relationships.csv": [":START_ID(SupportAssociation)", ":END_ID(Phenotype)", ":TYPE"],
+}
+
+# Files for the relationship layout, where associations are SUPPORTS relationships
+# between genes and phenotypes instead of SupportAssociation nodes
+SUPPORTS_NODE_FILES = {
+    name: header for name, header in NODE_FILES.items() if name != "support_association_nodes.csv"
+}
+SUPPORTS_RELATIONSHIP_FILES = {
+    "supports_relationships.csv": [
+        ":START_ID(Gene)",
+        ":END_ID(Phenotype)",
+        "id",
+        "predicate",
+        "direct_support:float",
+        "indirect_support:float",
+        "combined_support:float",
+        ":TYPE",
+    ],
+}
+
+
+class BulkCsvWriter:
+    """
+    Streams transformed pipeline objects to node and relationship CSV files for
+    `neo4j-admin database import full`.
+
+    Rows are written as soon as items are passed to write(), so only the ids of
+    Phenotype, Gwas and Gene nodes already written are kept in memory to drop
+    duplicates; the first occurrence of an id wins. The files contain the same
+    properties insert_data writes.
+
+    With `association_layout="relationship"` associations are written as SUPPORTS
+    relationships from genes to phenotypes, as insert_data_batched does for that layout.
+    """
+
+    def __init__(self, output_dir: str, association_layout: str = "node"):
+        if association_layout == "node":
+            self.node_files, self.relationship_files = NODE_FILES, RELATIONSHIP_FILES
+        elif association_layout == "relationship":
+            self.node_files, self.relationship_files = SUPPORTS_NODE_FILES, SUPPORTS_RELATIONSHIP_FILES
+        else:
+            raise ValueError(f"Unknown association layout: {association_layout}")
+        self.output_dir = output_dir
+        self.association_layout = association_layout
+        os.makedirs(output_dir, exist_ok=True)
+        self.counts: Dict[str, int] = {}
+        self._files = {}
+        self._writers = {}
+        for file_name, header in {**self.node_files, **self.relationship_files}.items():
+            f = open(os.path.join(output_dir, file_name), "w", newline="")
+            self._files[file_name] = f
+            self._writers[file_name] = csv.writer(f)
+            self._writers[file_name].writerow(header)
+            self.counts[file_name] = 0
+        self._seen = {Phenotype: set(), Gwas: set(), Gene: set()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def _writerow(self, file_name, row):
+        self._writers[file_name].writerow(row)
+        self.counts[file_name] += 1
+
+    def _first_occurrence(self, item_type, item_id):
+        seen = self._seen[item_type]
+        if item_id in seen:
+            return False
+        seen.add(item_id)
+        return True
+
+    def _write_association(self, association_id, predicate, direct_support, indirect_support, combined_support, gene_id, phenotype_id):
+        if self.association_layout == "relationship":
+            self._writerow("supports_relationships.csv", [
+                gene_id, phenotype_id, association_id, predicate, direct_support, indirect_support, combined_support, "SUPPORTS",
+            ])
+            return
+        self._writerow("support_association_nodes.csv", [
+            association_id, predicate, direct_support, indirect_support, combined_support, "SupportAssociation",
+        ])
+        self._writerow("subject_relationships.csv", [association_id, gene_id, "SUBJECT"])
+        self._writerow("object_relationships.csv", [association_id, phenotype_id, "OBJECT"])
+
+    def write(self, items: Iterable):
+        """
+        Appends Phenotype, Gwas, Gene and SupportAssociation objects, or
+        SupportAssociationBatch entries, to the CSV files.
+        """
+        if isinstance(items, SupportAssociationBatch):
+            items = [items]
+        for item in items:
+            if isinstance(item, SupportAssociationBatch):
+                for row in item.rows():
+                    self._write_association(
+                        row["association_id"], row["predicate"], row["direct_support"],
+                        row["indirect_support"], row["combined_support"], row["gene_id"], row["phenotype_id"]
+                    )
+            elif isinstance(item, Phenotype):
+                if self._first_occurrence(Phenotype, item.id):
+                    self._writerow("phenotype_nodes.csv", [item.id, item.name, item.description, item.display_name, "Phenotype"])
+            elif isinstance(item, Gwas):
+                if self._first_occurrence(Gwas, item.id):
+                    self._writerow("gwas_nodes.csv", [item.id, item.name, item.description, "Gwas"])
+            elif isinstance(item, Gene):
+                if self._first_occurrence(Gene, item.id):
+                    self._writerow("gene_nodes.csv", [item.id, item.symbol, "Gene"])
+            elif isinstance(item, SupportAssociation):
+                self._write_association(
+                    item.id,
+                    item.predicate.split(":")[-1], # Removes curie prefix
+                    float(item.direct_support.log_odds),
+                    float(item.indirect_support.log_odds),
+                    float(item.combined_support.log_odds),
+                    str(item.subject),
+                    str(item.object),
+                )
+            else:
+                raise ValueError(f"Unknown item type: {type(item)}")
+
+    def import_command(self, database: str = "neo4j") -> str:
+        """
+        Returns the neo4j-admin command that builds a database from the written files.
+
+        Descriptions may span several lines, which the CSV files keep in quoted fields,
+        so the import is told to accept multi-line fields.
+        """
+        nodes = " ".join(f"--nodes={os.path.join(self.output_dir, name)}" for name in self.node_files)
+        relationships = " ".join(f"--relationships={os.path.join(self.output_dir, name)}" for name in self.relationship_files)
+        return f"neo4j-admin database import full --multiline-fields=true {nodes} {relationships} {database}"
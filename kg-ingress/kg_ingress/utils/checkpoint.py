@@ -0,0 +1,127 @@
+import json
+import os
+from typing import Dict, List, Optional
+from kg_ingress.utils.ingest_state import fingerprint
+
+
+class RunCheckpoint:
+    """
+    Durable progress of a pipeline run, kept in a directory so an interrupted run can
+    be resumed without re-fetching or re-writing completed work.
+
+    The manifest holds a fingerprint of the run options, the fetched phenotype records
+    and the completed stages; it is replaced atomically on every change. Phenotypes
+    whose genes and associations were all written are appended to a separate log, one
+    JSON line each, and fsynced before the next phenotype starts, so a crash loses at
+    most the phenotype in progress.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    COMPLETED_FILE = "completed_phenotypes.jsonl"
+
+    def __init__(self, directory: str, options: dict):
+        self.directory = directory
+        self.options = fingerprint(options)
+        self.records: Optional[List[dict]] = None
+        self.stages: List[str] = []
+        self.completed: Dict[str, dict] = {}
+        self._completed_file = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, self.MANIFEST_FILE)
+
+    @property
+    def completed_path(self):
+        return os.path.join(self.directory, self.COMPLETED_FILE)
+
+    def load(self) -> bool:
+        """
+        Reads the checkpoint left by a previous run.
+
+        Returns False if there is none. Raises ValueError if it was written by a run
+        with different options, since its progress would not apply to this one.
+        """
+        if not os.path.exists(self.manifest_path):
+            return False
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["options"] != self.options:
+            raise ValueError(f"Checkpoint in {self.directory} was written by a run with different options")
+        self.records = manifest["records"]
+        self.stages = manifest["stages"]
+        if os.path.exists(self.completed_path):
+            with open(self.completed_path) as f:
+                text = f.read()
+            for line in text.splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be truncated if the run died while appending it
+                    continue
+                self.completed[entry["phenotype"]] = entry
+            if text and not text.endswith("\n"):
+                # Terminate the truncated line so the next entry starts on its own line
+                with open(self.completed_path, "a") as f:
+                    f.write("\n")
+        return True
+
+    def reset(self):
+        """Discards any previous checkpoint and starts an empty one."""
+        self.remove()
+        os.makedirs(self.directory, exist_ok=True)
+        self.records = None
+        self.stages = []
+        self.completed = {}
+        self._save_manifest()
+
+    def remove(self):
+        """Deletes the checkpoint files, e.g. once the run finished."""
+        self.close()
+        for path in (self.manifest_path, self.completed_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(self.directory) and not os.listdir(self.directory):
+            os.rmdir(self.directory)
+
+    def close(self):
+        if self._completed_file is not None:
+            self._completed_file.close()
+            self._completed_file = None
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"options": self.options, "records": self.records, "stages": self.stages}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def save_records(self, records: List[dict]):
+        """Records the fetched phenotype records so a resumed run does not fetch them again."""
+        self.records = records
+        self._save_manifest()
+
+    def stage_done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def complete_stage(self, stage: str):
+        if stage not in self.stages:
+            self.stages.append(stage)
+            self._save_manifest()
+
+    def is_completed(self, phenotype: str) -> bool:
+        return phenotype in self.completed
+
+    def complete_phenotype(self, phenotype: str, **written):
+        """
+        Records that all genes and associations of a phenotype were written, along with
+        the number of rows written per item type.
+        """
+        entry = {"phenotype": phenotype, **written}
+        if self._completed_file is None:
+            self._completed_file = open(self.completed_path, "a")
+        self._completed_file.write(json.dumps(entry) + "\n")
+        self._completed_file.flush()
+        os.fsync(self._completed_file.fileno())
+        self.completed[phenotype] = entry
@@ -0,0 +1,242 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from kg_ingress.utils.ids import canonical_sigma, file_safe_name
+
+# Dump files are <name><extension> in the dump directory
+PHENOTYPES_DUMP = "phenotypes"
+GENE_PHENOTYPES_DUMP = "gene_phenotypes"
+DUMP_EXTENSIONS = (".jsonl", ".jsonl.gz", ".tsv", ".tsv.gz")
+
+# Read buffer size; dumps and spool files are only ever read front to back
+IO_BUFFER_SIZE = 1 << 20
+
+# Spool manifest recording the dump a spool directory was split from and the split it holds
+SPOOL_MANIFEST = "kg-ingress-spool.json"
+
+# Every split is written to a new subdirectory of the spool directory named with this
+# prefix; nothing else in a spool directory is ever written or removed
+SPLIT_PREFIX = "kg-ingress-split-"
+
+# TSV columns holding numbers; all other columns are kept as strings, so gene or
+# phenotype names such as "NAN" or "1" stay names
+NUMERIC_COLUMNS = frozenset({"combined", "log_bf", "prior", "sigma"})
+
+
+def find_dump(directory: str, name: str) -> str:
+    """Returns the path of dump `name` in directory, whichever of the supported formats it has."""
+    for extension in DUMP_EXTENSIONS:
+        path = os.path.join(directory, name + extension)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"No {name} dump ({', '.join(name + e for e in DUMP_EXTENSIONS)}) in {directory}")
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(path, "rb"), IO_BUFFER_SIZE), encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="", buffering=IO_BUFFER_SIZE)
+
+
+def _parse_value(column: str, value: str):
+    if column not in NUMERIC_COLUMNS:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _read_lines(path: str) -> Iterator[Tuple[dict, str]]:
+    # Yields every row with its JSON line, which for JSON-lines dumps is the line as read
+    tsv = path.endswith((".tsv", ".tsv.gz"))
+    with _open_text(path) as f:
+        if tsv:
+            header = f.readline().rstrip("\r\n").split("\t")
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if tsv:
+                row = {key: _parse_value(key, value) for key, value in zip(header, line.split("\t")) if value != ""}
+                yield row, json.dumps(row)
+            else:
+                yield json.loads(line), line
+
+
+def read_dump(path: str) -> Iterator[dict]:
+    """
+    Yields the rows of a JSON-lines or TSV dump, optionally gzipped, in file order.
+
+    TSV dumps start with a header row. Values of the NUMERIC_COLUMNS are converted to int
+    or float and all others kept as strings, and empty values are left out of the row,
+    like fields absent from a JSON-lines row.
+    """
+    for row, _ in _read_lines(path):
+        yield row
+
+
+def _dump_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def spool_file_name(phenotype: str) -> str:
+    # Long names are shortened, and the manifest keeps the full name of every phenotype
+    return f"{file_safe_name(phenotype)}.jsonl"
+
+
+def _remove_splits(spool_dir: str, keep: str):
+    # Earlier splits, complete or interrupted, are all in subdirectories with the reserved prefix
+    for name in os.listdir(spool_dir):
+        if name.startswith(SPLIT_PREFIX) and name != keep:
+            shutil.rmtree(os.path.join(spool_dir, name), ignore_errors=True)
+
+
+def split_gene_phenotype_dump(path: str, spool_dir: str, flush_rows: int = 10_000, max_buffered_rows: int = 200_000) -> Dict[str, int]:
+    """
+    Splits a gene-phenotype dump into one JSON-lines spool file per phenotype in a single
+    sequential pass, so the rows of any phenotype can then be read on their own. Rows
+    are appended to existing spool files.
+
+    Rows are buffered per phenotype and appended to its spool file once `flush_rows` of
+    them are buffered, and all buffers are flushed whenever `max_buffered_rows` rows are
+    buffered in total, so memory stays bounded however the dump is ordered.
+
+    Returns the number of rows spooled per phenotype.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    counts, buffers, buffered = {}, {}, 0
+
+    def flush(phenotype):
+        lines = buffers.pop(phenotype)
+        with open(os.path.join(spool_dir, spool_file_name(phenotype)), "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        return len(lines)
+
+    for row, line in _read_lines(path):
+        phenotype = row["phenotype"]
+        lines = buffers.setdefault(phenotype, [])
+        lines.append(line + "\n")
+        counts[phenotype] = counts.get(phenotype, 0) + 1
+        buffered += 1
+        if len(lines) >= flush_rows:
+            buffered -= flush(phenotype)
+        elif buffered >= max_buffered_rows:
+            for name in list(buffers):
+                flush(name)
+            buffered = 0
+    for name in list(buffers):
+        flush(name)
+    return counts
+
+
+def _matches(row: dict, sigma, geneset_size) -> bool:
+    # Rows without their own sigma or gene set size belong to any query
+    return canonical_sigma(row.get("sigma", sigma)) == canonical_sigma(sigma) and row.get("gene_set_size", geneset_size) == geneset_size
+
+
+class LocalDumpSource:
+    """
+    Reads bioindex data from local dump files instead of the bioindex API, see
+    kg_ingress.assets.set_data_source.
+
+    The dump directory holds phenotypes and gene_phenotypes dumps, each as .jsonl or
+    .tsv, optionally gzipped, with one row per line shaped like the rows of the
+    pigean-phenotypes and pigean-gene-phenotype indexes. On first use the gene-phenotype
+    dump is split into per-phenotype spool files in one sequential pass (see
+    split_gene_phenotype_dump), which gene_phenotype_pages then reads front to back.
+
+    The spool is written to a new subdirectory of `spool_dir`, recorded in a manifest
+    once complete and reused by later sources as long as the dump file is unchanged, or
+    to a temporary directory removed by close(). `spool_dir` may hold other files, which
+    are left alone, but must not be the dump directory.
+    """
+
+    def __init__(self, path: str, spool_dir: Optional[str] = None, page_size: int = 10_000):
+        self.path = path
+        self.phenotypes_path = find_dump(path, PHENOTYPES_DUMP)
+        self.gene_phenotypes_path = find_dump(path, GENE_PHENOTYPES_DUMP)
+        self.page_size = page_size
+        if spool_dir is not None and os.path.realpath(spool_dir) == os.path.realpath(path):
+            raise ValueError(f"The spool directory must not be the dump directory {path}")
+        self._temporary = spool_dir is None
+        self.spool_dir = tempfile.mkdtemp(prefix="kg-ingress-spool-") if spool_dir is None else spool_dir
+        self._spooled = None
+        self._split_dir = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._temporary:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def phenotype_records(self) -> List[dict]:
+        return list(read_dump(self.phenotypes_path))
+
+    def spool(self) -> Dict[str, int]:
+        """Splits the gene-phenotype dump unless that was already done; returns the rows per phenotype."""
+        with self._lock:
+            if self._spooled is not None:
+                return self._spooled
+            manifest_path = os.path.join(self.spool_dir, SPOOL_MANIFEST)
+            signature = _dump_signature(self.gene_phenotypes_path)
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                if manifest["dump"] == signature:
+                    self._split_dir = os.path.join(self.spool_dir, manifest["split"])
+                    self._spooled = manifest["counts"]
+                    return self._spooled
+            # A stale or partial spool is split again from scratch, into a new subdirectory
+            os.makedirs(self.spool_dir, exist_ok=True)
+            split_dir = tempfile.mkdtemp(prefix=SPLIT_PREFIX, dir=self.spool_dir)
+            counts = split_gene_phenotype_dump(self.gene_phenotypes_path, split_dir)
+            # The manifest is written last, so an interrupted split is never reused
+            tmp_path = f"{manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"dump": signature, "split": os.path.basename(split_dir), "counts": counts}, f)
+            os.replace(tmp_path, manifest_path)
+            _remove_splits(self.spool_dir, keep=os.path.basename(split_dir))
+            self._split_dir = split_dir
+            self._spooled = counts
+            return counts
+
+    def _rows(self, phenotype_name: str, sigma, geneset_size, fields: Optional[Sequence[str]]) -> Iterator[dict]:
+        if phenotype_name not in self.spool():
+            return
+        with _open_text(os.path.join(self._split_dir, spool_file_name(phenotype_name))) as f:
+            for line in f:
+                row = json.loads(line)
+                if _matches(row, sigma, geneset_size):
+                    yield row if fields is None else {field: row[field] for field in fields if field in row}
+
+    def gene_phenotype_pages(self, phenotype_name: str, sigma=2, geneset_size='large', fields: Optional[Sequence[str]] = None) -> Iterator[dict]:
+        """
+        Yields the gene-phenotype rows of a phenotype in pages of `page_size` rows, as
+        bodies shaped like bioindex responses: 'data' holds the rows and 'continuation'
+        is None on the last page. A phenotype without rows yields one empty page, like
+        the API.
+        """
+        page, pages = [], 0
+        for row in self._rows(phenotype_name, sigma, geneset_size, fields):
+            if len(page) == self.page_size:
+                pages += 1
+                yield {"data": page, "continuation": f"{phenotype_name}:{pages}"}
+                page = []
+            page.append(row)
+        yield {"data": page, "continuation": None}
@@ -0,0 +1,32 @@
+import hashlib
+from urllib.parse import quote
+
+# File systems limit names to 255 bytes; quoted names longer than this are shortened
+MAX_FILE_NAME_BYTES = 200
+
+
+def canonical_sigma(sigma) -> str:
+    """Returns sigma as it appears in bioindex queries, so 2, 2.0 and "2" are all "2"."""
+    try:
+        value = float(sigma)
+    except (TypeError, ValueError):
+        return str(sigma)
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+def file_safe_name(name: str) -> str:
+    """
+    Returns name percent-encoded for use as a file name. Quoting can expand a name up to
+    twelve times, so names whose encoding is longer than MAX_FILE_NAME_BYTES are cut to a
+    prefix that fits, followed by a hash of the full name. Shortened names cannot be
+    decoded, so callers keep the original name alongside.
+    """
+    quoted = quote(name, safe='')
+    if len(quoted) <= MAX_FILE_NAME_BYTES:
+        return quoted
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+    # The prefix is cut before quoting, so no percent escape is split
+    prefix = name[:MAX_FILE_NAME_BYTES]
+    while len(quote(prefix, safe='')) > MAX_FILE_NAME_BYTES - len(digest) - 1:
+        prefix = prefix[:-1]
+    return f"{quote(prefix, safe='')}-{digest}"
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+def fingerprint(obj) -> str:
+    """
+    Compute a stable content fingerprint of a JSON-serializable object.
+
+    Keys are sorted so the fingerprint does not depend on dictionary ordering.
+    """
+    encoded = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class IngestState:
+    """
+    Content fingerprints recorded by incremental pipeline runs, persisted as a JSON file.
+
+    For every phenotype the state keeps a fingerprint of the phenotype record, a
+    fingerprint of the record together with its gene-phenotype payload, and one
+    fingerprint per gene-phenotype row keyed by gene. Later runs compare fetched data
+    against these to skip unchanged phenotypes and to find the rows that changed. Row
+    fingerprints include the record's, so all rows of a phenotype whose record changed
+    are written again.
+
+    The record is whatever identifies the written phenotype, e.g. the bioindex record
+    together with the objects transformed from it. `settings` that shape the whole graph,
+    such as the association layout, are stored with the fingerprints; a state recorded
+    with other settings is discarded, and `reset` is set, so everything is written again.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str, settings: Optional[dict] = None):
+        self.path = path
+        self.settings = settings or {}
+        self.phenotypes: Dict[str, dict] = {}
+        self.reset = False
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("version") == self.VERSION and state.get("settings") == self.settings:
+                self.phenotypes = state["phenotypes"]
+            else:
+                self.reset = True
+
+    def record_changed(self, name: str, record: dict) -> bool:
+        """Returns True if the phenotype record differs from the one last ingested."""
+        entry = self.phenotypes.get(name)
+        return entry is None or entry.get("record") != fingerprint(record)
+
+    def update_record(self, name: str, record: dict):
+        """Records the fingerprint of an ingested phenotype record."""
+        self.phenotypes.setdefault(name, {})["record"] = fingerprint(record)
+
+    def payload_changed(self, name: str, record: dict, payload: List[dict]) -> bool:
+        """Returns True if the phenotype record or its gene-phenotype payload changed."""
+        entry = self.phenotypes.get(name)
+        return entry is None or entry.get("fingerprint") != fingerprint([record, payload])
+
+    def diff_rows(self, name: str, payload: List[dict]) -> Tuple[List[dict], List[str]]:
+        """
+        Compares a gene-phenotype payload against the rows last ingested for a phenotype.
+
+        Returns the rows that are new or changed, and the genes whose rows were removed.
+        """
+        entry = self.phenotypes.get(name, {})
+        previous = entry.get("rows", {})
+        changed = [row for row in payload if previous.get(row["gene"]) != fingerprint([entry.get("record"), row])]
+        current_genes = {row["gene"] for row in payload}
+        removed = [gene for gene in previous if gene not in current_genes]
+        return changed, removed
+
+    def update_payload(self, name: str, record: dict, payload: List[dict]):
+        """Records the fingerprints of an ingested phenotype and its gene-phenotype rows."""
+        entry = self.phenotypes.setdefault(name, {})
+        entry["record"] = fingerprint(record)
+        entry["fingerprint"] = fingerprint([record, payload])
+        entry["rows"] = {row["gene"]: fingerprint([entry["record"], row]) for row in payload}
+
+    def save(self):
+        """Writes the state atomically so an interrupted run never leaves a truncated file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.VERSION, "settings": self.settings, "phenotypes": self.phenotypes}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, Optional
+
+# Neo4j SummaryCounters fields accumulated per stage
+COUNTER_FIELDS = (
+    "nodes_created",
+    "nodes_deleted",
+    "relationships_created",
+    "relationships_deleted",
+    "properties_set",
+    "labels_added",
+    "labels_removed",
+    "indexes_added",
+    "constraints_added",
+)
+
+
+def counters_dict(counters) -> Dict[str, int]:
+    """Converts a Neo4j SummaryCounters object to a plain dictionary of the tracked fields."""
+    return {field: int(getattr(counters, field, 0)) for field in COUNTER_FIELDS}
+
+
+class RunReport:
+    """
+    Per-stage timing and throughput of a pipeline run, written as a JSON report.
+
+    Every stage accumulates its wall time, the number of items it handled, and, where
+    relevant, the bytes and number of HTTP requests fetched from the bioindex, the time
+    spent in those requests, and the Neo4j summary counters of its writes. Stages can
+    be entered several times, e.g. once per phenotype, and updated from worker threads.
+    Request counters of the bioindex client are kept per endpoint in `endpoints`.
+    """
+
+    def __init__(self, options: Optional[dict] = None):
+        self.options = options or {}
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages: Dict[str, dict] = {}
+        self.endpoints: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name: str) -> dict:
+        return self.stages.setdefault(name, {
+            "seconds": 0.0,
+            "items": 0,
+            "bytes": 0,
+            "http_requests": 0,
+            "http_seconds": 0.0,
+            "counters": {},
+        })
+
+    @contextmanager
+    def stage(self, name: str):
+        """Adds the wall time spent inside the block to the stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, seconds=time.perf_counter() - start)
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        """Yields from iterable, adding the time spent waiting for each item to the stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, seconds=time.perf_counter() - start)
+                return
+            self.add(name, seconds=time.perf_counter() - start)
+            yield item
+
+    def add(self, name: str, seconds: float = 0.0, items: int = 0, bytes: int = 0, http_requests: int = 0, http_seconds: float = 0.0):
+        with self._lock:
+            stage = self._stage(name)
+            stage["seconds"] += seconds
+            stage["items"] += items
+            stage["bytes"] += bytes
+            stage["http_requests"] += http_requests
+            stage["http_seconds"] += http_seconds
+
+    def add_counters(self, name: str, counters: Dict[str, int]):
+        """Adds Neo4j counters, as returned by counters_dict, to the stage."""
+        with self._lock:
+            totals = self._stage(name)["counters"]
+            for field, value in counters.items():
+                totals[field] = totals.get(field, 0) + value
+
+    def record_response(self, name: str, response, size: Optional[int] = None):
+        """
+        Counts one HTTP response, its body size and its latency towards the stage.
+        `size` is given for streamed responses, whose content is not kept.
+        """
+        self.add(
+            name,
+            bytes=len(response.content) if size is None else size,
+            http_requests=1,
+            http_seconds=response.elapsed.total_seconds(),
+        )
+
+    def set_endpoints(self, stats: Dict[str, dict]):
+        """Sets the per-endpoint request counters, as returned by BioindexClient.stats()."""
+        with self._lock:
+            self.endpoints = {endpoint: dict(counters) for endpoint, counters in stats.items()}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                seconds = stage["seconds"]
+                stages[name] = {
+                    **stage,
+                    "counters": dict(stage["counters"]),
+                    "items_per_sec": stage["items"] / seconds if seconds > 0 else None,
+                    "bytes_per_sec": stage["bytes"] / seconds if seconds > 0 else None,
+                }
+        return {
+            "started_at": self.started_at.isoformat(),
+            "seconds": time.perf_counter() - self._start,
+            "options": self.options,
+            "stages": stages,
+            "endpoints": dict(self.endpoints),
+        }
+
+    def save(self, path: str):
+        """Writes the report as JSON, replacing the file atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
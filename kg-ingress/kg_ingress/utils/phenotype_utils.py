@@ -1,34 +1,95 @@
+import numpy as np
 import pandas as pd
-from rdflib import Graph, Literal
+from rdflib import Graph, Literal, Namespace, URIRef
+from rdflib.namespace import OWL, RDF, RDFS
+from typing import Dict, Optional, Union
 from kg_ingress.models.portal_model import Phenotype, Gwas
-import re
+import hashlib
+import os
+import pickle
 
-def preprocess_gcat_info(gcat_info: pd.DataFrame) -> pd.DataFrame:
+ORPHANET_URI_PREFIX = "http://www.orpha.net/ORDO/Orphanet_"
+EFO = Namespace("http://www.ebi.ac.uk/efo/")
+OBO_IN_OWL = Namespace("http://www.geneontology.org/formats/oboInOwl#")
+
+# Version of the index built by build_orphanet_index, part of its cache file names. Bump it
+# whenever the extraction or the shape of the index changes, so stale caches are rebuilt
+ORPHANET_INDEX_VERSION = 1
+
+# Columns of the GCAT table used downstream besides the two trait columns
+GCAT_STUDY_COLUMNS = ["STUDY ACCESSION", "STUDY"]
+
+def _transform_distinct(values: pd.Series, transform) -> pd.Series:
     """
-    Preprocess the GCAT information to extract the phenotype name and ID.
+    Apply a vectorized string transform to the distinct non-empty values of a column only,
+    then broadcast the results back to every row. Missing and empty values map to None.
     """
-    def process_col13(value):
-        if pd.isna(value) or value == "":
-            return None
-        value = value.replace(" ", "_")  # Replace spaces with underscores
-        value = re.sub(r"[^A-Za-z0-9_]", "", value)  # Remove special characters
-        return f"gcat_trait_{value}"
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype="string")
+    transformed = transform(uniques).mask(uniques == "")
+    # Code -1 marks missing values, which index the trailing None
+    lookup = np.append(transformed.to_numpy(dtype=object, na_value=None), None)
+    return pd.Series(lookup[codes], index=values.index, dtype=object)
 
-    # Function to process column 14
-    def process_col14(value):
-        if pd.isna(value) or value == "":
-            return None
-        last_part = value.strip().split("/")[-1]  # Extract last part of the URL
-        return last_part.replace("_", ":")  # Replace underscores with colons
+def _trait_names(values: pd.Series) -> pd.Series:
+    # Replace spaces with underscores and remove special characters
+    cleaned = values.str.replace(" ", "_", regex=False).str.replace(r"[^A-Za-z0-9_]", "", regex=True)
+    return "gcat_trait_" + cleaned
+
+def _trait_curies(values: pd.Series) -> pd.Series:
+    # Extract last part of the URL and replace underscores with colons
+    return values.str.strip().str.split("/").str[-1].str.replace("_", ":", regex=False)
+
+def preprocess_gcat_info(gcat_info: pd.DataFrame, trait_column=None, trait_uri_column=None) -> pd.DataFrame:
+    """
+    Preprocess the GCAT information to extract the phenotype name and ID.
+
+    The trait and trait URI columns default to columns 13 and 14 of the GCAT table
+    (MAPPED_TRAIT and MAPPED_TRAIT_URI) and may be given by name for pruned tables.
+    """
+    traits = gcat_info[trait_column] if trait_column is not None else gcat_info.iloc[:, 12]  # Column 13 (zero-based index 12)
+    trait_uris = gcat_info[trait_uri_column] if trait_uri_column is not None else gcat_info.iloc[:, 13]  # Column 14 (zero-based index 13)
 
     # Apply transformations
-    gcat_info["processed_trait_name"] = gcat_info.iloc[:, 12].apply(process_col13)  # Column 13 (zero-based index 12)
-    gcat_info["processed_curie"] = gcat_info.iloc[:, 13].apply(process_col14)  # Column 14 (zero-based index 13)
+    gcat_info["processed_trait_name"] = _transform_distinct(traits, _trait_names)
+    gcat_info["processed_curie"] = _transform_distinct(trait_uris, _trait_curies)
 
     # Keep only non-empty transformed rows
     gcat_info_filtered = gcat_info.dropna(subset=["processed_trait_name", "processed_curie"])
     return gcat_info_filtered
 
+def load_gcat_info(gcat_path: str, chunksize: Optional[int] = None) -> pd.DataFrame:
+    """
+    Load and preprocess the GCAT table, keeping only the columns used downstream.
+
+    Only the trait, trait URI, STUDY ACCESSION and STUDY columns are read, with the
+    highly repetitive trait columns stored as categoricals. The file may be gzip
+    compressed. With `chunksize`, the file is read and preprocessed that many rows at a
+    time so the full raw table is never held in memory.
+
+    :param gcat_path: Path to the GCAT TSV file (optionally .gz)
+    :param chunksize: Number of rows to read per chunk, or None to read the file at once
+    :return: DataFrame with processed_trait_name, processed_curie, STUDY ACCESSION and STUDY
+    """
+    header = pd.read_csv(gcat_path, sep="\t", nrows=0).columns
+    trait_column, trait_uri_column = header[12], header[13]
+    reader = pd.read_csv(
+        gcat_path,
+        sep="\t",
+        usecols=[trait_column, trait_uri_column] + GCAT_STUDY_COLUMNS,
+        dtype={trait_column: "category", trait_uri_column: "category"},
+        chunksize=chunksize,
+    )
+    chunks = [reader] if chunksize is None else reader
+    output_columns = ["processed_trait_name", "processed_curie"] + GCAT_STUDY_COLUMNS
+    processed = [
+        preprocess_gcat_info(chunk, trait_column, trait_uri_column)[output_columns]
+        for chunk in chunks
+    ]
+    if not processed:
+        return pd.DataFrame(columns=output_columns)
+    return pd.concat(processed, ignore_index=True)
+
 def lookup_trait_with_db_refs(orphanet_owl: Graph, orpha_id: str) -> dict:
     """
     Look up an Orphanet trait by its ORPHA ID and extract all database references.
@@ -76,9 +137,106 @@ def lookup_trait_with_db_refs(orphanet_owl: Graph, orpha_id: str) -> dict:
 
     return trait_info if trait_info["Trait URI"] else None
 
-def create_orphanet_phenotype(orphanet_owl: Graph, phenotype: str, phenotype_name: str) -> Phenotype:
+def build_orphanet_index(orphanet_owl: Graph) -> Dict[str, dict]:
+    """
+    Walk the Orphanet graph once and index every Orphanet class by its ORPHA ID.
+
+    Each entry holds the same trait details lookup_trait_with_db_refs returns for that ID,
+    so lookups against the index are dictionary accesses instead of SPARQL queries.
+
+    :param orphanet_owl: The parsed ORDO graph
+    :return: Dictionary mapping ORPHA IDs (e.g., "93460") to trait details
+    """
+    index = {}
+    for trait_uri in orphanet_owl.subjects(RDF.type, OWL.Class):
+        if not isinstance(trait_uri, URIRef) or not str(trait_uri).startswith(ORPHANET_URI_PREFIX):
+            continue
+        label = orphanet_owl.value(trait_uri, RDFS.label)
+        if label is None:
+            continue
+        description = orphanet_owl.value(trait_uri, EFO.definition)
+        orpha_id = str(trait_uri)[len(ORPHANET_URI_PREFIX):]
+        index[orpha_id] = {
+            "Orphanet ID": orpha_id,
+            "Trait URI": str(trait_uri),
+            "Label": str(label),
+            "Description": str(description) if description else "No description available",
+            "Database References": [
+                str(db_xref)
+                for db_xref in orphanet_owl.objects(trait_uri, OBO_IN_OWL.hasDbXref)
+                if isinstance(db_xref, Literal)
+            ]
+        }
+    return index
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hex digest of a file, reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_orphanet_index(owl_path: str, cache_dir: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Load the Orphanet trait index for an ORDO OWL file, using an on-disk cache.
+
+    The index built by build_orphanet_index is pickled to `cache_dir` under a name that
+    includes ORPHANET_INDEX_VERSION and the SHA-256 of the OWL file, so later runs skip
+    RDF/XML parsing entirely. When the OWL file or the index version changes the name no
+    longer matches, the index is rebuilt and stale cache files for the same OWL file are
+    removed.
+
+    :param owl_path: Path to the ORDO OWL file (RDF/XML)
+    :param cache_dir: Directory for cache files, defaults to a .cache directory next to the OWL file
+    :return: Dictionary mapping ORPHA IDs to trait details
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(owl_path)), ".cache")
+    stem = os.path.splitext(os.path.basename(owl_path))[0]
+    cache_prefix = f"{stem}-index-"
+    cache_path = os.path.join(cache_dir, f"{cache_prefix}v{ORPHANET_INDEX_VERSION}-{file_sha256(owl_path)}.pickle")
+
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
+    orphanet_owl = Graph()
+    orphanet_owl.parse(owl_path, format="xml")
+    index = build_orphanet_index(orphanet_owl)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith(cache_prefix) and name.endswith(".pickle"):
+            os.remove(os.path.join(cache_dir, name))
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return index
+
+def lookup_trait_in_index(orphanet_index: Dict[str, dict], orpha_id: str) -> Optional[dict]:
+    """
+    Look up an Orphanet trait in an index built by build_orphanet_index.
+
+    :param orpha_id: The numeric Orphanet ID (e.g., "93460")
+    :return: Dictionary with trait details including database references
+    """
+    trait_info = orphanet_index.get(orpha_id)
+    if trait_info is None:
+        return None
+    return {**trait_info, "Database References": list(trait_info["Database References"])}
+
+def create_orphanet_phenotype(orphanet_owl: Union[Graph, Dict[str, dict]], phenotype: str, phenotype_name: str) -> Phenotype:
     orphanet_id = phenotype.split("_")[-1]
-    trait_info = lookup_trait_with_db_refs(orphanet_owl, orphanet_id)
+    # Prefer the precomputed index; fall back to querying the graph directly
+    if isinstance(orphanet_owl, Graph):
+        trait_info = lookup_trait_with_db_refs(orphanet_owl, orphanet_id)
+    else:
+        trait_info = lookup_trait_in_index(orphanet_owl, orphanet_id)
     if trait_info:
         return Phenotype(
             id=trait_info["Trait URI"],
@@ -90,37 +248,77 @@ def create_orphanet_phenotype(orphanet_owl: Graph, phenotype: str, phenotype_nam
     else:
         return None
     
-def create_gcat_phenotype(gcat_phenotype_info: pd.DataFrame, phenotype: str, phenotype_name: str) -> Phenotype:
-    gcat_info = gcat_phenotype_info[gcat_phenotype_info["processed_trait_name"] == phenotype]
-    phenotypes = []
+def build_gcat_index(gcat_phenotype_info: pd.DataFrame) -> Dict[str, dict]:
+    """
+    Group preprocessed GCAT rows by processed trait name in a single pass.
+
+    Each entry holds the deduplicated xref curies and (study accession, study) pairs for
+    the trait, in the order they first appear in the table.
+
+    :param gcat_phenotype_info: GCAT table as returned by preprocess_gcat_info
+    :return: Dictionary mapping processed trait names to {"xrefs": [...], "studies": [...]}
+    """
+    index = {}
+    xrefs = gcat_phenotype_info[["processed_trait_name", "processed_curie"]].drop_duplicates()
+    for trait_name, curie in xrefs.itertuples(index=False):
+        index.setdefault(trait_name, {"xrefs": [], "studies": []})["xrefs"].append(curie)
+    study_info = gcat_phenotype_info[["processed_trait_name", "STUDY ACCESSION", "STUDY"]].drop_duplicates()
+    for trait_name, study_accession, study in study_info.itertuples(index=False):
+        index[trait_name]["studies"].append((study_accession, study))
+    return index
+
+def build_portal_index(portal_phenotype_info: pd.DataFrame) -> Dict[str, dict]:
+    """
+    Index the AMP traits mapping by portal phenotype name, keeping the first row per name.
+
+    :param portal_phenotype_info: AMP traits mapping table
+    :return: Dictionary mapping phenotype names to their mapping row
+    """
+    first_rows = portal_phenotype_info.drop_duplicates(subset="name", keep="first")
+    return {row["name"]: row for row in first_rows.to_dict("records")}
+
+def create_gcat_phenotype(gcat_phenotype_info: Union[pd.DataFrame, Dict[str, dict]], phenotype: str, phenotype_name: str) -> Phenotype:
+    # Use the precomputed index if given, otherwise group just the rows for this phenotype;
+    # that scans the whole table on every call, so callers looking up many phenotypes
+    # should build the index once with build_gcat_index
+    if isinstance(gcat_phenotype_info, pd.DataFrame):
+        gcat_phenotype_info = build_gcat_index(
+            gcat_phenotype_info[gcat_phenotype_info["processed_trait_name"] == phenotype]
+        )
+    gcat_info = gcat_phenotype_info.get(phenotype)
     studies = []
-    if gcat_info.empty:
+    if gcat_info is None:
         return None, None
-    study_info = gcat_info[["processed_trait_name", "STUDY ACCESSION", "STUDY"]].drop_duplicates()
-    xrefs = gcat_info[["processed_trait_name", "processed_curie"]].drop_duplicates()
     # Make single phenotype and grab xrefs
     phenotype_obj = Phenotype(
-        id=xrefs["processed_curie"].values[0],
+        id=gcat_info["xrefs"][0],
         name=phenotype,
         display_name=phenotype_name,
         description="No description available",
-        has_xrefs=xrefs["processed_curie"].tolist()
+        has_xrefs=list(gcat_info["xrefs"])
     )
 
     # Create studies
-    for index, row in study_info.iterrows():
+    for study_accession, study in gcat_info["studies"]:
         # Extract GCST ID from study accession
-        gwas_id = row["STUDY ACCESSION"].split("GCST")[-1]
+        gwas_id = study_accession.split("GCST")[-1]
         studies.append(Gwas(
             id=f'GCST:{gwas_id}',
-            description=row["STUDY"],
+            description=study,
             phenotype=phenotype_obj
         ))
     return phenotype_obj, studies
 
-def create_portal_phenotype(portal_phenotype_info: pd.DataFrame, phenotype: str, phenotype_name: str) -> Phenotype:
-    portal_info = portal_phenotype_info[portal_phenotype_info["name"] == phenotype]
-    if portal_info.empty:
+def create_portal_phenotype(portal_phenotype_info: Union[pd.DataFrame, Dict[str, dict]], phenotype: str, phenotype_name: str) -> Phenotype:
+    # Use the precomputed index if given, otherwise search the mapping table; that scans
+    # the whole table on every call, so callers looking up many phenotypes should build
+    # the index once with build_portal_index
+    if isinstance(portal_phenotype_info, pd.DataFrame):
+        portal_phenotype_info = build_portal_index(
+            portal_phenotype_info[portal_phenotype_info["name"] == phenotype]
+        )
+    portal_id = portal_phenotype_info.get(phenotype)
+    if portal_id is None:
         return Phenotype(
             id=f'PORTAL.TRAIT:{phenotype}',
             name=phenotype,
@@ -128,7 +326,6 @@ def create_portal_phenotype(portal_phenotype_info: pd.DataFrame, phenotype: str,
             description="No description available. Not found in AMP traits mapping.",
             has_xrefs=[]
         )
-    portal_id = portal_info.iloc[0]
     curies = portal_id["EFO_id"].split(",")
     return Phenotype(
         id=f'PORTAL.TRAIT:{portal_id["id"]}',
@@ -136,4 +333,4 @@ def create_portal_phenotype(portal_phenotype_info: pd.DataFrame, phenotype: str,
         display_name=phenotype_name,
         description=portal_id["description"],
         has_xrefs=curies
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,247 @@
+import os
+import shutil
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import unquote
+from kg_ingress.utils.ids import file_safe_name
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+PHENOTYPES_DIR = "phenotypes"
+GENE_PHENOTYPES_DIR = "gene_phenotypes"
+PARTITION_KEY = "phenotype"
+
+# File in each gene-phenotype partition holding the phenotype name, which long names
+# cannot be decoded from; dataset discovery skips files starting with an underscore
+PARTITION_NAME_FILE = "_phenotype"
+# Marker written after the last page of a phenotype, so a partition left by a failed
+# fetch is never read as if it held all of the phenotype's rows
+PARTITION_COMPLETE_FILE = "_complete"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Staging bioindex data requires pyarrow: pip install 'kg_ingress[staging]'")
+
+
+def _to_table(rows: List[dict], drop: Sequence[str] = ()) -> "pa.Table":
+    # Columns are the union of all row keys in first-seen order, so fields missing from
+    # some rows become nulls instead of being dropped
+    columns = {}
+    for row in rows:
+        for key in row:
+            if key not in drop:
+                columns.setdefault(key, None)
+    return pa.table({key: [row.get(key) for row in rows] for key in columns})
+
+
+def _to_rows(table: "pa.Table") -> List[dict]:
+    # Nulls are dropped so fields absent from the original rows stay absent
+    return [{key: value for key, value in row.items() if value is not None} for row in table.to_pylist()]
+
+
+def _write_atomically(table: "pa.Table", path: str):
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    # Dataset discovery skips dot files, so a file left by a crash is never read
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def new_snapshot_dir(stage_dir: str) -> str:
+    """Returns a new timestamped snapshot directory under stage_dir."""
+    return os.path.join(stage_dir, datetime.now().strftime("%Y%m%dT%H%M%S"))
+
+
+def resolve_snapshot_dir(path: str) -> str:
+    """
+    Returns path if it is a snapshot, otherwise the most recent snapshot directly under it.
+    """
+    if os.path.isdir(os.path.join(path, PHENOTYPES_DIR)):
+        return path
+    snapshots = sorted(
+        name for name in os.listdir(path)
+        if os.path.isdir(os.path.join(path, name, PHENOTYPES_DIR))
+    )
+    if not snapshots:
+        raise FileNotFoundError(f"No staged snapshot found in {path}")
+    return os.path.join(path, snapshots[-1])
+
+
+class StagingArea:
+    """
+    Snapshot of fetched bioindex data stored as Parquet files, so transform and insert
+    can be rerun from local disk and snapshots from different runs compared.
+
+    Phenotype records go to phenotypes/part-00000.parquet. Gene-phenotype rows are
+    partitioned by phenotype in hive layout, gene_phenotypes/phenotype=<name>/, with
+    one file per written page and the phenotype name in a _phenotype file, as long names
+    are shortened in the directory name (see file_safe_name). A _complete file marks
+    partitions whose last page was written; the others are reported as not staged.
+    Files are written atomically, and all reads accept a column projection so only the
+    needed columns are decoded.
+    """
+
+    def __init__(self, path: str):
+        _require_pyarrow()
+        self.path = path
+
+    def _partition_dir(self, phenotype: str) -> str:
+        return os.path.join(self.path, GENE_PHENOTYPES_DIR, f"{PARTITION_KEY}={file_safe_name(phenotype)}")
+
+    def _partition_names(self) -> Dict[str, str]:
+        """Returns the phenotype name of every complete partition, keyed by its directory name."""
+        root = os.path.join(self.path, GENE_PHENOTYPES_DIR)
+        if not os.path.isdir(root):
+            return {}
+        names = {}
+        prefix = f"{PARTITION_KEY}="
+        for directory in os.listdir(root):
+            if not directory.startswith(prefix):
+                continue
+            if not os.path.exists(os.path.join(root, directory, PARTITION_COMPLETE_FILE)):
+                continue
+            with open(os.path.join(root, directory, PARTITION_NAME_FILE), encoding="utf-8") as f:
+                names[directory] = f.read()
+        return names
+
+    def write_phenotypes(self, records: List[dict]):
+        _write_atomically(_to_table(records), os.path.join(self.path, PHENOTYPES_DIR, "part-00000.parquet"))
+
+    def write_gene_phenotypes(self, phenotype: str, rows: List[dict], part: int = 0, last: bool = True):
+        """
+        Writes one page of gene-phenotype rows of a phenotype as file number `part`, and
+        marks the phenotype complete if it is the `last` page.
+        """
+        # The phenotype is stored in the partition path rather than in the file
+        table = _to_table(rows, drop=[PARTITION_KEY])
+        directory = self._partition_dir(phenotype)
+        if part == 0:
+            # A phenotype fetched again starts over, so pages left by an earlier attempt
+            # are never mixed into it
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+            with open(os.path.join(directory, PARTITION_NAME_FILE), "w", encoding="utf-8") as f:
+                f.write(phenotype)
+        _write_atomically(table, os.path.join(directory, f"part-{part:05d}.parquet"))
+        if last:
+            open(os.path.join(directory, PARTITION_COMPLETE_FILE), "w").close()
+
+    def phenotype_records(self, columns: Optional[Sequence[str]] = None) -> List[dict]:
+        return _to_rows(pq.read_table(os.path.join(self.path, PHENOTYPES_DIR), columns=columns))
+
+    def staged_phenotypes(self) -> List[str]:
+        """Returns the phenotypes whose gene-phenotype rows were staged completely."""
+        return sorted(self._partition_names().values())
+
+    def _part_files(self, phenotype: str) -> List[str]:
+        directory = self._partition_dir(phenotype)
+        if not os.path.isdir(directory):
+            raise KeyError(f"No gene phenotype data staged for {phenotype}")
+        if not os.path.exists(os.path.join(directory, PARTITION_COMPLETE_FILE)):
+            raise KeyError(f"Gene phenotype data for {phenotype} was only partly staged")
+        # Files are read in name order, i.e. page order
+        return sorted(ds.dataset(directory, format="parquet").files)
+
+    @staticmethod
+    def _read_part(path: str, columns: Optional[Sequence[str]]) -> "pa.Table":
+        if columns is not None:
+            # Requested columns missing from this page are left out rather than failing
+            names = pq.read_schema(path).names
+            columns = [column for column in columns if column in names]
+        return pq.read_table(path, columns=columns)
+
+    def gene_phenotype_rows(self, phenotype: str, columns: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        Returns the staged gene-phenotype rows of a phenotype, in the order they were written.
+
+        Requested columns missing from the staged files are ignored. Raises KeyError if
+        the phenotype was not staged completely.
+        """
+        tables = [self._read_part(path, columns) for path in self._part_files(phenotype)]
+        rows = _to_rows(pa.concat_tables(tables, promote_options="permissive"))
+        for row in rows:
+            row[PARTITION_KEY] = phenotype
+        return rows
+
+    def iter_gene_phenotype_pages(self, phenotype_names: Iterable[str], columns: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Optional[List[dict]], Optional[Exception], bool]]:
+        """
+        Yields (phenotype_name, rows, error, last) for each staged page, like
+        stream_gene_phenotype_pages, reading one page file at a time. Phenotypes that were
+        not staged completely are yielded as errors.
+        """
+        for name in phenotype_names:
+            try:
+                paths = self._part_files(name)
+            except KeyError as e:
+                yield name, None, e, True
+                continue
+            for i, path in enumerate(paths):
+                rows = _to_rows(self._read_part(path, columns))
+                for row in rows:
+                    row[PARTITION_KEY] = name
+                yield name, rows, None, i == len(paths) - 1
+
+    def gene_phenotype_table(self, columns: Optional[Sequence[str]] = None) -> "pa.Table":
+        """
+        Returns all completely staged gene-phenotype rows as one Arrow table including the
+        phenotype column.
+        """
+        root = os.path.join(self.path, GENE_PHENOTYPES_DIR)
+        partition_names = self._partition_names()
+        # Only the files of complete partitions are read
+        files = [
+            path
+            for directory in sorted(partition_names)
+            for path in ds.dataset(os.path.join(root, directory), format="parquet").files
+        ]
+        partition_schema = pa.schema([(PARTITION_KEY, pa.string())])
+        partitioning = ds.partitioning(partition_schema, flavor="hive")
+        dataset = ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=root)
+        # Pages may differ in columns or numeric types, so the schema is unified over all
+        # files instead of being taken from the first one
+        schema = pa.unify_schemas(
+            [fragment.physical_schema for fragment in dataset.get_fragments()] + [partition_schema],
+            promote_options="permissive",
+        )
+        dataset = ds.dataset(files, format="parquet", partitioning=partitioning, partition_base_dir=root, schema=schema)
+        table = dataset.to_table(columns=columns)
+        if PARTITION_KEY not in table.column_names:
+            return table
+        # The partition column holds the decoded directory names, which for shortened
+        # names are replaced by the recorded phenotype names
+        prefix = f"{PARTITION_KEY}="
+        names = {unquote(directory[len(prefix):]): name for directory, name in partition_names.items()}
+        encoded = table.column(PARTITION_KEY).combine_chunks().dictionary_encode()
+        dictionary = pa.array([names.get(value, value) for value in encoded.dictionary.to_pylist()], pa.string())
+        phenotypes = pa.DictionaryArray.from_arrays(encoded.indices, dictionary).cast(pa.string())
+        return table.set_column(table.column_names.index(PARTITION_KEY), PARTITION_KEY, phenotypes)
+
+
+def compare_snapshots(old_path: str, new_path: str, columns: Sequence[str] = ("combined", "log_bf", "prior")) -> Dict[str, int]:
+    """
+    Compares the gene-phenotype rows of two snapshots by (phenotype, gene).
+
+    Returns the number of rows added, removed, and changed in any of `columns`.
+    """
+    keys = [PARTITION_KEY, "gene"]
+    old = StagingArea(old_path).gene_phenotype_table(keys + list(columns)).to_pandas()
+    new = StagingArea(new_path).gene_phenotype_table(keys + list(columns)).to_pandas()
+    merged = old.merge(new, on=keys, how="outer", suffixes=("_old", "_new"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    changed = pd.Series(False, index=both.index)
+    for column in columns:
+        old_values, new_values = both[f"{column}_old"], both[f"{column}_new"]
+        changed = changed | ((old_values != new_values) & ~(old_values.isna() & new_values.isna()))
+    return {
+        "added": int((merged["_merge"] == "right_only").sum()),
+        "removed": int((merged["_merge"] == "left_only").sum()),
+        "changed": int(changed.sum()),
+    }
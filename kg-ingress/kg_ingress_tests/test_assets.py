@@ -1,12 +1,16 @@
 import pytest
-from unittest.mock import Mock
-from kg_ingress.assets import fetch_phenotype_data, transform_phenotype_data, insert_data, fetch_gene_phenotype_data, transform_gene_phenotype_data
-from kg_ingress.models.portal_model import Phenotype, Gwas, Gene, SupportAssociation
+from unittest.mock import Mock, MagicMock
+from kg_ingress.assets import fetch_phenotype_data, transform_phenotype_data, insert_data, fetch_gene_phenotype_data, transform_gene_phenotype_data, insert_data_batched, stream_gene_phenotype_pages, support_association_id, ensure_schema
+from kg_ingress.models.portal_model import Phenotype, Gwas, Gene, SupportAssociation, CombinedSupportScore, DirectSupportScore, IndirectSupportScore
 import pandas as pd
 from rdflib import Graph
+from kg_ingress.models.association_records import SupportAssociationBatch
 from kg_ingress.utils.phenotype_utils import preprocess_gcat_info
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, SummaryCounters
 import requests
+import threading
+import time
+import zlib
 
 @pytest.fixture
 def mock_api_responses(mocker, request):
@@ -15,6 +19,7 @@ def mock_api_responses(mocker, request):
     # Phenotype response
     phenotype_response = Mock()
     phenotype_response.status_code = 200
+    phenotype_response.content = b"{}"
     phenotype_response.json.return_value = {
         "data": [
             {
@@ -45,6 +50,7 @@ def mock_api_responses(mocker, request):
     # Gene-phenotype response
     gene_phenotype_response = Mock()
     gene_phenotype_response.status_code = 200
+    gene_phenotype_response.content = b"{}"
     gene_phenotype_response.json.return_value = {
         "data": [
             {
@@ -95,10 +101,11 @@ def mock_api_responses(mocker, request):
         # Return a mock for any other URL
         default_response = Mock()
         default_response.status_code = 404
+        default_response.content = b""
         return default_response
 
-    # Apply the mock
-    mocker.patch('requests.get', side_effect=mock_get)
+    # Apply the mock to the sessions of the shared bioindex client
+    mocker.patch('requests.Session.get', side_effect=mock_get)
     
     return {
         'phenotype': phenotype_response,
@@ -203,3 +210,291 @@ def test_insert_data(mock_api_responses, portal_phenotype_info, gcat_phenotype_i
     with neo4j_driver.session() as session:
         result = session.run("MATCH (p:Phenotype) RETURN p.name")
         assert result.single()[0] == "eGFRcrcys"
+
+@pytest.fixture
+def recording_driver():
+    """Mock Neo4j driver that records every statement run inside a transaction"""
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    tx = session.begin_transaction.return_value.__enter__.return_value
+
+    def run(query, rows):
+        result = Mock()
+        # With MATCH on endpoints, associations of genes named MISSING* are not written
+        written = [row for row in rows if not str(row.get("gene_id", "")).startswith("MISSING")]
+        count = len(written) if "MATCH (g:Gene" in query else len(rows)
+        result.single.return_value = {"written": count}
+        result.consume.return_value.counters = SummaryCounters({"nodes-created": count})
+        return result
+
+    tx.run.side_effect = run
+    session.execute_write.side_effect = lambda transaction_function, *args: transaction_function(tx, *args)
+    driver.calls = tx.run.call_args_list
+    return driver
+
+def test_insert_data_batched(recording_driver):
+    """Test that insert_data_batched groups items by type into UNWIND batches"""
+    phenotype = Phenotype(id="PORTAL.TRAIT:1", name="T2D", display_name="Type 2 diabetes", description="test")
+    genes = [Gene(id=f"GENE{i}", symbol=f"GENE{i}") for i in range(5)]
+    associations = [
+        SupportAssociation(
+            id=f"sa-{i}",
+            subject=gene.id,
+            object=phenotype.id,
+            predicate="PORTALLINK:supports",
+            combined_support=CombinedSupportScore(log_odds=1.0),
+            direct_support=DirectSupportScore(log_odds=0.5),
+            indirect_support=IndirectSupportScore(log_odds=0.25)
+        )
+        for i, gene in enumerate(genes)
+    ]
+    stats = insert_data_batched([phenotype] + genes + associations, driver=recording_driver, batch_size=2)
+
+    batches = [call.kwargs["rows"] for call in recording_driver.calls]
+    assert all("UNWIND $rows AS row" in call.args[0] for call in recording_driver.calls)
+    # 1 phenotype batch, 3 gene batches (2+2+1) and 3 association batches (2+2+1)
+    assert len(batches) == 7
+    assert stats["Phenotype"]["rows"] == 1
+    assert stats["Gene"]["rows"] == 5
+    assert stats["Gene"]["batches"] == 3
+    assert stats["SupportAssociation"]["rows"] == 5
+    assert "rows_per_sec" in stats["SupportAssociation"]
+    # Summary counters are summed over the batches of each type
+    assert stats["Gene"]["counters"]["nodes_created"] == 5
+    association_rows = [row for rows in batches for row in rows if "association_id" in row]
+    assert association_rows[0] == {
+        "gene_id": "GENE0",
+        "phenotype_id": "PORTAL.TRAIT:1",
+        "association_id": "sa-0",
+        "combined_support": 1.0,
+        "direct_support": 0.5,
+        "indirect_support": 0.25,
+        "predicate": "supports",
+    }
+
+def test_insert_data_batched_unknown_type(recording_driver):
+    """Test that insert_data_batched rejects unsupported item types"""
+    with pytest.raises(ValueError):
+        insert_data_batched([{"id": "not-a-model-object"}], driver=recording_driver)
+
+def test_stream_gene_phenotype_pages(mocker):
+    """Test that streamed pages keep phenotype order, stay bounded and isolate errors"""
+    fetched = []
+
+    def fake_pages(phenotype_name, sigma, geneset_size, report=None, fields=None, stream=False):
+        for i in range(5):
+            if phenotype_name == "B" and i == 2:
+                raise ValueError("Continuation request failed with status 500")
+            fetched.append((phenotype_name, i))
+            yield {"data": [{"gene": f"{phenotype_name}{i}", "phenotype": phenotype_name}], "continuation": "token" if i < 4 else None}
+
+    mocker.patch("kg_ingress.assets.fetch_gene_phenotype_pages", side_effect=fake_pages)
+    stream = stream_gene_phenotype_pages(["A", "B", "C"], max_workers=2, max_pages=1)
+    name, rows, error, last = next(stream)
+    time.sleep(0.1)
+    # Each fetching thread stops after filling its queue of one page: A has handed over
+    # one page and buffered another, B has buffered one and waits on the next
+    assert (name, rows, last) == ("A", [{"gene": "A0", "phenotype": "A"}], False)
+    assert sorted(fetched) == [("A", 0), ("A", 1), ("A", 2), ("B", 0), ("B", 1)]
+
+    results = [(name, rows, error, last)] + list(stream)
+    assert [(name, last) for name, _, _, last in results] == [("A", False)] * 4 + [("A", True)] + [("B", False)] * 2 + [("B", True)] + [("C", False)] * 4 + [("C", True)]
+    assert [rows[0]["gene"] for name, rows, _, _ in results if name == "C"] == ["C0", "C1", "C2", "C3", "C4"]
+    assert results[7][1] is None
+    assert isinstance(results[7][2], ValueError)
+
+def test_support_association_ids_are_deterministic():
+    """Test that association ids only depend on gene, phenotype, sigma and gene set size"""
+    phenotype_index = {"T2D": Phenotype(id="PORTAL.TRAIT:1", name="T2D")}
+    rows = [
+        {"gene": "TCF7L2", "phenotype": "T2D", "combined": 3.1, "log_bf": 2.0, "prior": 1.1, "sigma": 2, "gene_set_size": "large"},
+        {"gene": "PPARG", "phenotype": "T2D", "combined": 2.2, "log_bf": 1.5, "prior": 0.7, "sigma": 2, "gene_set_size": "large"},
+    ]
+    _, first = transform_gene_phenotype_data(rows, phenotype_index)
+    _, second = transform_gene_phenotype_data([{**row, "combined": 0.0} for row in rows], phenotype_index)
+    assert [a.id for a in first] == [a.id for a in second]
+    assert first[0].id != first[1].id
+    assert first[0].id == support_association_id("TCF7L2", "T2D", 2, "large")
+    assert support_association_id("TCF7L2", "T2D", 3, "large") != first[0].id
+    assert support_association_id("TCF7L2", "T2D", 2, "small") != first[0].id
+    # Sigma read back as a float or a string gives the same id
+    assert support_association_id("TCF7L2", "T2D", 2.0, "large") == first[0].id
+    assert support_association_id("TCF7L2", "T2D", "2", "large") == first[0].id
+
+def test_ensure_schema(recording_driver):
+    """Test that the schema stage creates constraints and indexes idempotently and reports their state"""
+    session = recording_driver.session.return_value.__enter__.return_value
+    index = Mock()
+    index.data.return_value = {"name": "phenotype_id", "state": "ONLINE", "populationPercent": 100.0}
+    session.run.return_value.__iter__.return_value = iter([index])
+
+    indexes = ensure_schema(driver=recording_driver, timeout=10)
+
+    statements = [call.args[0] for call in session.run.call_args_list]
+    assert all("IF NOT EXISTS" in statement for statement in statements if statement.startswith("CREATE"))
+    for label in ["Phenotype", "Gene", "Gwas", "SupportAssociation"]:
+        assert any(f"(n:{label}) REQUIRE n.id IS UNIQUE" in statement for statement in statements)
+    assert any("combined_support" in statement for statement in statements)
+    assert "CALL db.awaitIndexes($timeout)" in statements
+    assert indexes == [{"name": "phenotype_id", "state": "ONLINE", "populationPercent": 100.0}]
+
+def test_insert_data_batched_match_endpoints(recording_driver):
+    """Test that associations with unknown endpoints are counted as missed when matching endpoints"""
+    phenotype = Phenotype(id="PORTAL.TRAIT:1", name="T2D")
+    associations = [
+        SupportAssociation(
+            id=f"sa-{gene}",
+            subject=gene,
+            object=phenotype.id,
+            predicate="PORTALLINK:supports",
+            combined_support=CombinedSupportScore(log_odds=1.0),
+            direct_support=DirectSupportScore(log_odds=0.5),
+            indirect_support=IndirectSupportScore(log_odds=0.25)
+        )
+        for gene in ["TCF7L2", "MISSING1", "PPARG"]
+    ]
+    stats = insert_data_batched(associations, driver=recording_driver, match_endpoints=True)
+
+    query = recording_driver.calls[0].args[0]
+    assert "MATCH (g:Gene {id: row.gene_id})" in query
+    assert "MERGE (g:Gene" not in query
+    assert stats["SupportAssociation"]["rows"] == 2
+    assert stats["SupportAssociation"]["missed"] == 1
+
+def track_concurrent_batches(recording_driver, partitions):
+    """
+    Makes association batches of the recording driver take a moment, recording every
+    batch running alongside one sharing a gene bucket, the most batches running at once
+    and the phenotype ids of each batch.
+    """
+    tracked = {"overlaps": [], "peak": 0, "phenotypes": []}
+    active = []
+    lock = threading.Lock()
+    tx = recording_driver.session.return_value.__enter__.return_value.begin_transaction.return_value.__enter__.return_value
+    record_run = tx.run.side_effect
+
+    def concurrent_run(query, rows):
+        associations = [row for row in rows if "association_id" in row]
+        if not associations:
+            return record_run(query, rows)
+        keys = {zlib.crc32(row["gene_id"].encode("utf-8")) % partitions for row in associations}
+        with lock:
+            tracked["overlaps"].extend(other for other in active if keys & other)
+            active.append(keys)
+            tracked["peak"] = max(tracked["peak"], len(active))
+            tracked["phenotypes"].append([row["phenotype_id"] for row in associations])
+        time.sleep(0.005)
+        with lock:
+            active.remove(keys)
+        return record_run(query, rows)
+
+    tx.run.side_effect = concurrent_run
+    return tracked
+
+def test_insert_data_batched_workers(recording_driver):
+    """Test that pooled writes match sequential ones and never write the same gene bucket concurrently"""
+    phenotypes = [Phenotype(id=f"PORTAL.TRAIT:{i}", name=f"P{i}", display_name=f"P{i}", description="test") for i in range(6)]
+    genes = [Gene(id=f"GENE{i}", symbol=f"GENE{i}") for i in range(20)]
+    associations = SupportAssociationBatch()
+    for gene in genes:
+        for phenotype in phenotypes:
+            associations.append(f"{gene.id}-{phenotype.id}", gene.id, phenotype.id, 1.0, 0.5, 0.5)
+    sequential = insert_data_batched(phenotypes + genes + [associations], driver=recording_driver, batch_size=7)
+
+    tracked = track_concurrent_batches(recording_driver, 3)
+    pooled = insert_data_batched(phenotypes + genes + [associations], driver=recording_driver, batch_size=7, workers=3)
+
+    assert not tracked["overlaps"]
+    # Every worker writes its rows in phenotype order, so concurrent batches lock phenotypes in the same order
+    assert all(batch == sorted(batch) for batch in tracked["phenotypes"])
+    assert sum(len(batch) for batch in tracked["phenotypes"]) == len(associations)
+    for type_name in ("Phenotype", "Gene", "SupportAssociation"):
+        assert pooled[type_name]["rows"] == sequential[type_name]["rows"]
+        assert pooled[type_name]["counters"] == sequential[type_name]["counters"]
+    assert recording_driver.session.return_value.__enter__.return_value.execute_write.called
+
+def test_insert_data_batched_workers_single_phenotype(recording_driver):
+    """Test that the associations of a single phenotype are written by several workers at once"""
+    phenotype = Phenotype(id="PORTAL.TRAIT:1", name="T2D", display_name="T2D", description="test")
+    associations = SupportAssociationBatch()
+    for i in range(60):
+        associations.append(f"GENE{i}-T2D", f"GENE{i}", phenotype.id, 1.0, 0.5, 0.5)
+
+    tracked = track_concurrent_batches(recording_driver, 3)
+    stats = insert_data_batched([phenotype, associations], driver=recording_driver, batch_size=5, workers=3)
+
+    assert tracked["peak"] > 1
+    assert not tracked["overlaps"]
+    assert stats["SupportAssociation"]["rows"] == 60
+
+def test_transform_gene_phenotype_data_compact(recording_driver):
+    """Test that compact association batches match the LinkML objects and write the same rows"""
+    phenotype_index = {"T2D": Phenotype(id="PORTAL.TRAIT:1", name="T2D")}
+    rows = [
+        {"gene": "TCF7L2", "phenotype": "T2D", "combined": 3.1, "log_bf": 2.0, "prior": 1.1},
+        {"gene": "PPARG", "phenotype": "T2D", "combined": 2.2, "prior": 0.7},
+        {"gene": "FTO", "phenotype": "unknown", "combined": 1.0, "log_bf": 0.5, "prior": 0.5},
+    ]
+    genes, associations = transform_gene_phenotype_data(rows, phenotype_index)
+    compact_genes, batch = transform_gene_phenotype_data(rows, phenotype_index, compact=True)
+
+    assert compact_genes == genes
+    assert len(batch) == len(associations) == 2
+    assert list(batch.to_portal_model()) == associations
+
+    insert_data_batched(associations, driver=recording_driver)
+    insert_data_batched(batch, driver=recording_driver)
+    object_rows, batch_rows = [call.kwargs["rows"] for call in recording_driver.calls]
+    assert batch_rows == object_rows
+
+
+def test_insert_data_batched_relationship_layout(recording_driver):
+    """Test that the relationship layout writes SUPPORTS relationships instead of association nodes"""
+    phenotype_index = {"T2D": Phenotype(id="PORTAL.TRAIT:1", name="T2D")}
+    rows = [
+        {"gene": gene, "phenotype": "T2D", "combined": 1.0, "log_bf": 0.5, "prior": 0.5}
+        for gene in ["TCF7L2", "MISSING1", "PPARG"]
+    ]
+    _, batch = transform_gene_phenotype_data(rows, phenotype_index, compact=True)
+    stats = insert_data_batched(batch, driver=recording_driver, match_endpoints=True, association_layout="relationship")
+
+    query = recording_driver.calls[0].args[0]
+    assert "MERGE (g)-[r:SUPPORTS {id: row.association_id}]->(p)" in query
+    assert "SupportAssociation" not in query
+    assert stats["SupportAssociation"]["rows"] == 2
+    assert stats["SupportAssociation"]["missed"] == 1
+
+    with pytest.raises(ValueError):
+        insert_data_batched(batch, driver=recording_driver, association_layout="edge")
+
+def test_transform_phenotype_data_workers():
+    """Test that the process pool transform returns exactly the serial output, in order"""
+    portal_index = {
+        f"TRAIT{i}": {"id": i, "name": f"TRAIT{i}", "description": f"Trait {i}", "EFO_id": f"EFO:{i:07d}"}
+        for i in range(0, 30, 2)
+    }
+    gcat_index = {
+        f"gcat_trait_t{i}": {"xrefs": [f"EFO:{i:07d}"], "studies": [(f"GCST{i:06d}", f"Study {i}")]}
+        for i in range(10)
+    }
+    orphanet_index = {
+        str(i): {
+            "Orphanet ID": str(i),
+            "Trait URI": f"http://www.orpha.net/ORDO/Orphanet_{i}",
+            "Label": f"Disease {i}",
+            "Description": f"Disease {i}",
+            "Database References": [f"OMIM:{i}"],
+        }
+        for i in range(0, 10, 3)
+    }
+    # Includes portal traits missing from the mappings and unknown GCAT and Orphanet traits
+    records = (
+        [{"phenotype": f"TRAIT{i}", "phenotype_name": f"Trait {i}"} for i in range(30)]
+        + [{"phenotype": f"gcat_trait_t{i}", "phenotype_name": f"T {i}"} for i in range(12)]
+        + [{"phenotype": f"Disease_{i}_Orphanet_{i}", "phenotype_name": f"Disease {i}"} for i in range(10)]
+    )
+
+    serial = transform_phenotype_data(records, portal_index, gcat_index, orphanet_index)
+    parallel = transform_phenotype_data(records, portal_index, gcat_index, orphanet_index, workers=3)
+    assert parallel == serial
+    assert len(serial) == 30 + 2 * 10 + 4
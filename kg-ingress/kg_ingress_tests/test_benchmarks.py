@@ -0,0 +1,24 @@
+import os
+import sys
+from kg_ingress import assets
+
+# The benchmark harness lives next to the package as standalone scripts
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from bench_pipeline import run_benchmark, regressions
+
+
+def test_pipeline_benchmark_smoke():
+    """Test that the synthetic benchmark runs every stage end to end against the bioindex stand-in"""
+    bioindex_url = assets.BIOINDEX_URL
+    report = run_benchmark(1000, n_phenotypes=10, page_size=50)
+    stages = report["stages"]
+
+    assert assets.BIOINDEX_URL == bioindex_url
+    assert stages["fetch_phenotypes"]["items"] == 10
+    # 100 rows per phenotype served in two pages linked by a continuation token
+    assert stages["fetch_gene_phenotypes"]["http_requests"] == 20
+    assert stages["fetch_gene_phenotypes"]["items"] == 1000
+    assert stages["insert_associations"]["items"] == 1000
+    assert stages["insert_phenotypes"]["items"] > 0
+
+    assert regressions({"1000": report}, {"1000": report}, tolerance=0.2) == []
@@ -0,0 +1,88 @@
+import csv
+import pytest
+from kg_ingress.assets import transform_gene_phenotype_data
+from kg_ingress.models.portal_model import Phenotype, Gwas
+from kg_ingress.utils.bulk_export import (
+    BulkCsvWriter,
+    NODE_FILES,
+    RELATIONSHIP_FILES,
+    SUPPORTS_NODE_FILES,
+    SUPPORTS_RELATIONSHIP_FILES,
+)
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+@pytest.fixture
+def transformed():
+    """Phenotypes, studies, genes and associations as produced by the transform steps"""
+    phenotypes = [
+        Phenotype(id="PORTAL.TRAIT:1", name="T2D", display_name="Type 2 diabetes", description="test"),
+        Phenotype(id="EFO:0004340", name="gcat_trait_bmi", display_name="BMI", description="test"),
+    ]
+    studies = [Gwas(id="GCST:001", description="Study one"), Gwas(id="GCST:001", description="Study one")]
+    phenotype_index = {p.name: p for p in phenotypes}
+    rows = [
+        {"gene": gene, "phenotype": phenotype, "combined": 1.5, "log_bf": 1.0, "prior": 0.5}
+        for phenotype in ["T2D", "gcat_trait_bmi"]
+        for gene in ["TCF7L2", "PPARG", "FTO"]
+    ]
+    genes, associations = transform_gene_phenotype_data(rows, phenotype_index)
+    return phenotypes, studies, genes, associations
+
+def test_bulk_csv_export(tmp_path, transformed):
+    """Test that exported files have neo4j-admin headers and one row per unique node"""
+    phenotypes, studies, genes, associations = transformed
+    with BulkCsvWriter(str(tmp_path)) as writer:
+        writer.write(phenotypes + studies)
+        writer.write(associations[:3])
+        writer.write(associations[3:])
+        # Genes seen again in a later call are not duplicated
+        writer.write(genes)
+        writer.write(genes)
+
+    for file_name, header in {**NODE_FILES, **RELATIONSHIP_FILES}.items():
+        assert read_csv(tmp_path / file_name)[0] == header
+
+    expected_rows = {
+        "phenotype_nodes.csv": 2,
+        "gwas_nodes.csv": 1,
+        "gene_nodes.csv": 3,
+        "support_association_nodes.csv": 6,
+        "subject_relationships.csv": 6,
+        "object_relationships.csv": 6,
+    }
+    for file_name, count in expected_rows.items():
+        assert len(read_csv(tmp_path / file_name)) == count + 1
+        assert writer.counts[file_name] == count
+
+    association_row = read_csv(tmp_path / "support_association_nodes.csv")[1]
+    assert association_row == [associations[0].id, "supports", "1.0", "0.5", "1.5", "SupportAssociation"]
+    assert read_csv(tmp_path / "object_relationships.csv")[1] == [associations[0].id, "PORTAL.TRAIT:1", "OBJECT"]
+    assert "--nodes=" in writer.import_command()
+
+def test_bulk_csv_export_relationship_layout(tmp_path, transformed):
+    """Test that the relationship layout exports associations as SUPPORTS relationships"""
+    phenotypes, _, genes, associations = transformed
+    with BulkCsvWriter(str(tmp_path), association_layout="relationship") as writer:
+        writer.write(phenotypes + genes + associations)
+
+    assert not (tmp_path / "support_association_nodes.csv").exists()
+    for file_name, header in {**SUPPORTS_NODE_FILES, **SUPPORTS_RELATIONSHIP_FILES}.items():
+        assert read_csv(tmp_path / file_name)[0] == header
+    supports = read_csv(tmp_path / "supports_relationships.csv")
+    assert len(supports) == 7
+    assert supports[1] == ["TCF7L2", "PORTAL.TRAIT:1", associations[0].id, "supports", "1.0", "0.5", "1.5", "SUPPORTS"]
+    assert "support_association_nodes.csv" not in writer.import_command()
+
+def test_bulk_csv_export_multiline_description(tmp_path):
+    """Test that multi-line descriptions stay in one quoted field and the import accepts them"""
+    phenotype = Phenotype(id="PORTAL.TRAIT:1", name="T2D", display_name="Type 2 diabetes", description="First line\nsecond line")
+    with BulkCsvWriter(str(tmp_path)) as writer:
+        writer.write([phenotype])
+
+    rows = read_csv(tmp_path / "phenotype_nodes.csv")
+    assert rows[1] == ["PORTAL.TRAIT:1", "T2D", "First line\nsecond line", "Type 2 diabetes", "Phenotype"]
+    assert "--multiline-fields=true" in writer.import_command()
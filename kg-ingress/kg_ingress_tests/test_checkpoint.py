@@ -0,0 +1,56 @@
+import pytest
+from kg_ingress.utils.checkpoint import RunCheckpoint
+
+
+@pytest.fixture
+def options():
+    return {"phenos": "T2D,BMI", "test": False}
+
+def test_checkpoint_roundtrip(tmp_path, options):
+    """Test that records, stages and completed phenotypes survive a restart"""
+    directory = str(tmp_path / "checkpoint")
+    checkpoint = RunCheckpoint(directory, options)
+    checkpoint.reset()
+    checkpoint.save_records([{"phenotype": "T2D"}, {"phenotype": "BMI"}])
+    checkpoint.complete_stage("phenotypes")
+    checkpoint.complete_phenotype("T2D", genes=2, associations=2)
+    checkpoint.close()
+
+    resumed = RunCheckpoint(directory, options)
+    assert resumed.load()
+    assert resumed.records == [{"phenotype": "T2D"}, {"phenotype": "BMI"}]
+    assert resumed.stage_done("phenotypes")
+    assert resumed.is_completed("T2D")
+    assert not resumed.is_completed("BMI")
+    assert resumed.completed["T2D"]["associations"] == 2
+
+    resumed.remove()
+    assert not (tmp_path / "checkpoint").exists()
+    assert not RunCheckpoint(directory, options).load()
+
+def test_checkpoint_truncated_entry(tmp_path, options):
+    """Test that a phenotype entry cut off by a crash is ignored and later entries still parse"""
+    directory = str(tmp_path / "checkpoint")
+    checkpoint = RunCheckpoint(directory, options)
+    checkpoint.reset()
+    checkpoint.complete_phenotype("T2D", genes=1, associations=1)
+    checkpoint.close()
+    with open(checkpoint.completed_path, "a") as f:
+        f.write('{"phenotype": "BM')
+
+    resumed = RunCheckpoint(directory, options)
+    resumed.load()
+    assert list(resumed.completed) == ["T2D"]
+    resumed.complete_phenotype("BMI", genes=1, associations=1)
+    resumed.close()
+
+    reloaded = RunCheckpoint(directory, options)
+    reloaded.load()
+    assert list(reloaded.completed) == ["T2D", "BMI"]
+
+def test_checkpoint_options_mismatch(tmp_path, options):
+    """Test that a checkpoint is not resumed by a run with different options"""
+    directory = str(tmp_path / "checkpoint")
+    RunCheckpoint(directory, options).reset()
+    with pytest.raises(ValueError):
+        RunCheckpoint(directory, {**options, "phenos": "T2D"}).load()
@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from kg_ingress import assets
+from kg_ingress.assets import fetch_phenotype_data, set_data_source, stream_gene_phenotype_pages, support_association_id
+from kg_ingress.utils import dumps
+from kg_ingress.utils.dumps import LocalDumpSource, read_dump
+
+
+def gene_rows():
+    # Phenotypes are interleaved, as in a dump that is not ordered by phenotype
+    rows = []
+    for i in range(5):
+        rows.append({"gene": f"GENE{i}", "phenotype": "T2D", "combined": i + 0.5, "log_bf": 1.0, "prior": 0.5, "sigma": 2, "gene_set_size": "large"})
+        rows.append({"gene": f"GENE{i}", "phenotype": "gcat_trait_a/b c", "combined": 1.0, "log_bf": 0.5, "prior": 0.5, "sigma": 2, "gene_set_size": "large"})
+    rows.append({"gene": "GENE9", "phenotype": "T2D", "combined": 1.0, "log_bf": 1.0, "prior": 0.0, "sigma": 3, "gene_set_size": "large"})
+    return rows
+
+
+def write_dump(directory, records, rows):
+    os.makedirs(directory, exist_ok=True)
+    with gzip.open(os.path.join(directory, "phenotypes.jsonl.gz"), "wt") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+    columns = list(rows[0])
+    with open(os.path.join(directory, "gene_phenotypes.tsv"), "w") as f:
+        f.write("\t".join(columns) + "\n")
+        for row in rows:
+            f.write("\t".join(str(row[column]) for column in columns) + "\n")
+
+
+def test_local_dump_source(tmp_path, mocker):
+    """Test that dumps are split by phenotype in one pass and read back in pages matching the query"""
+    records = [{"phenotype": "T2D", "phenotype_name": "Type 2 diabetes", "trait_group": "portal"}]
+    rows = gene_rows()
+    write_dump(tmp_path / "dump", records, rows)
+    assert list(read_dump(str(tmp_path / "dump" / "gene_phenotypes.tsv"))) == rows
+
+    spool_dir = str(tmp_path / "spool")
+    with LocalDumpSource(str(tmp_path / "dump"), spool_dir=spool_dir, page_size=2) as source:
+        assert source.phenotype_records() == records
+        pages = list(source.gene_phenotype_pages("T2D", sigma=2, geneset_size="large", fields=["gene", "combined"]))
+        assert [page["data"] for page in pages] == [
+            [{"gene": "GENE0", "combined": 0.5}, {"gene": "GENE1", "combined": 1.5}],
+            [{"gene": "GENE2", "combined": 2.5}, {"gene": "GENE3", "combined": 3.5}],
+            [{"gene": "GENE4", "combined": 4.5}],
+        ]
+        assert [bool(page["continuation"]) for page in pages] == [True, True, False]
+        assert [page["data"] for page in source.gene_phenotype_pages("T2D", sigma=3)] == [[rows[-1]]]
+        assert [page["data"] for page in source.gene_phenotype_pages("BMI")] == [[]]
+        assert source.spool() == {"T2D": 6, "gcat_trait_a/b c": 5}
+
+    # The split is reused while the dump is unchanged, and redone when it changes
+    split = mocker.spy(dumps, "split_gene_phenotype_dump")
+    with LocalDumpSource(str(tmp_path / "dump"), spool_dir=spool_dir) as source:
+        assert source.spool() == {"T2D": 6, "gcat_trait_a/b c": 5}
+    assert split.call_count == 0
+    write_dump(tmp_path / "dump", records, rows[:2])
+    # Other files in the spool directory survive a new split, and only the latest split is kept
+    (tmp_path / "spool" / "notes.jsonl").write_text("{}\n")
+    with LocalDumpSource(str(tmp_path / "dump"), spool_dir=spool_dir) as source:
+        assert source.spool() == {"T2D": 1, "gcat_trait_a/b c": 1}
+        assert [page["data"] for page in source.gene_phenotype_pages("T2D")] == [rows[:1]]
+    assert split.call_count == 1
+    assert (tmp_path / "spool" / "notes.jsonl").read_text() == "{}\n"
+    assert len([name for name in os.listdir(spool_dir) if name.startswith(dumps.SPLIT_PREFIX)]) == 1
+
+
+def test_spool_dir_must_not_be_dump_dir(tmp_path):
+    """Test that the dump directory is rejected as spool directory, so splitting never touches the dump"""
+    write_dump(tmp_path / "dump", [{"phenotype": "T2D"}], gene_rows())
+    with pytest.raises(ValueError):
+        LocalDumpSource(str(tmp_path / "dump"), spool_dir=str(tmp_path / "dump" / "."))
+
+
+def test_fetch_from_dump_source(tmp_path):
+    """Test that the fetch functions read from the data source instead of the API"""
+    records = [{"phenotype": "T2D"}, {"phenotype": "gcat_trait_a/b c"}]
+    write_dump(tmp_path / "dump", records, gene_rows())
+    with LocalDumpSource(str(tmp_path / "dump"), page_size=3) as source:
+        set_data_source(source)
+        try:
+            assert fetch_phenotype_data() == records
+            pages = list(stream_gene_phenotype_pages(["gcat_trait_a/b c", "T2D"], max_workers=2, fields=assets.GENE_PHENOTYPE_FIELDS))
+        finally:
+            set_data_source(None)
+        spool_dir = source.spool_dir
+    assert not os.path.exists(spool_dir)
+    assert [(name, len(rows), last) for name, rows, _, last in pages] == [
+        ("gcat_trait_a/b c", 3, False), ("gcat_trait_a/b c", 2, True), ("T2D", 3, False), ("T2D", 2, True),
+    ]
+    assert all(error is None for _, _, error, _ in pages)
+
+
+def test_tsv_dump_values(tmp_path):
+    """Test that only numeric TSV columns are parsed and that a float sigma matches integer queries"""
+    path = tmp_path / "gene_phenotypes.tsv"
+    path.write_text(
+        "gene\tphenotype\tcombined\tlog_bf\tprior\tsigma\tgene_set_size\n"
+        "NAN\t1\t1.5\tnan\t0\t2.0\tlarge\n"
+        "INF\t1\t-inf\t\t0.5\t2.0\tlarge\n"
+    )
+    first, second = read_dump(str(path))
+    assert first["gene"] == "NAN" and first["phenotype"] == "1"
+    assert first["combined"] == 1.5 and first["log_bf"] != first["log_bf"] and first["prior"] == 0
+    assert second["gene"] == "INF" and second["combined"] == float("-inf") and "log_bf" not in second
+
+    assert dumps._matches(first, 2, "large")
+    assert not dumps._matches(first, 3, "large")
+    assert support_association_id(first["gene"], first["phenotype"], first["sigma"], "large") == \
+        support_association_id("NAN", "1", 2, "large")
+
+
+def test_spool_long_phenotype_names(tmp_path):
+    """Test that phenotypes whose quoted names exceed file name limits are spooled and read back"""
+    name = "gcat_trait_" + "é/ " * 100
+    rows = [{"gene": "TCF7L2", "phenotype": name, "combined": 1.0, "log_bf": 0.5, "prior": 0.5, "sigma": 2, "gene_set_size": "large"}]
+    write_dump(tmp_path / "dump", [{"phenotype": name}], rows)
+    with LocalDumpSource(str(tmp_path / "dump"), spool_dir=str(tmp_path / "spool")) as source:
+        assert source.spool() == {name: 1}
+        assert [page["data"] for page in source.gene_phenotype_pages(name)] == [rows]
@@ -0,0 +1,77 @@
+import pytest
+from kg_ingress.utils.ingest_state import IngestState, fingerprint
+
+
+@pytest.fixture
+def record():
+    return {"phenotype": "T2D", "phenotype_name": "Type 2 diabetes", "trait_group": "portal"}
+
+@pytest.fixture
+def payload():
+    return [
+        {"gene": "TCF7L2", "phenotype": "T2D", "combined": 3.1, "log_bf": 2.0, "prior": 1.1},
+        {"gene": "PPARG", "phenotype": "T2D", "combined": 2.2, "log_bf": 1.5, "prior": 0.7},
+    ]
+
+def test_fingerprint_ignores_key_order():
+    """Test that fingerprints only depend on content"""
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+def test_ingest_state_roundtrip(tmp_path, record, payload):
+    """Test that recorded fingerprints survive a save and detect unchanged data"""
+    path = str(tmp_path / "state.json")
+    state = IngestState(path)
+    assert state.record_changed("T2D", record)
+    assert state.payload_changed("T2D", record, payload)
+    state.update_payload("T2D", record, payload)
+    state.save()
+
+    reloaded = IngestState(path)
+    assert not reloaded.record_changed("T2D", record)
+    assert not reloaded.payload_changed("T2D", record, payload)
+    assert reloaded.record_changed("T2D", {**record, "phenotype_name": "T2D"})
+
+def test_ingest_state_diff_rows(tmp_path, record, payload):
+    """Test that only new or changed rows and removed genes are reported"""
+    state = IngestState(str(tmp_path / "state.json"))
+    state.update_payload("T2D", record, payload)
+
+    updated = [
+        {**payload[0], "combined": 3.5},
+        {"gene": "KCNJ11", "phenotype": "T2D", "combined": 1.0, "log_bf": 0.5, "prior": 0.5},
+    ]
+    assert state.payload_changed("T2D", record, updated)
+    changed, removed = state.diff_rows("T2D", updated)
+    assert [row["gene"] for row in changed] == ["TCF7L2", "KCNJ11"]
+    assert removed == ["PPARG"]
+
+def test_ingest_state_record_change_rewrites_rows(tmp_path, record, payload):
+    """Test that all rows of a phenotype count as changed once its record changed"""
+    state = IngestState(str(tmp_path / "state.json"))
+    state.update_record("T2D", record)
+    state.update_payload("T2D", record, payload)
+    assert state.diff_rows("T2D", payload) == ([], [])
+
+    # e.g. a mapping file change giving the phenotype another id
+    renamed = {**record, "id": "EFO:0001360"}
+    assert state.record_changed("T2D", renamed)
+    state.update_record("T2D", renamed)
+    changed, removed = state.diff_rows("T2D", payload)
+    assert changed == payload
+    assert removed == []
+
+def test_ingest_state_settings(tmp_path, record, payload):
+    """Test that a state recorded with other settings is discarded"""
+    path = str(tmp_path / "state.json")
+    state = IngestState(path, settings={"association_layout": "node"})
+    state.update_payload("T2D", record, payload)
+    state.save()
+
+    same = IngestState(path, settings={"association_layout": "node"})
+    assert not same.reset
+    assert not same.payload_changed("T2D", record, payload)
+    other = IngestState(path, settings={"association_layout": "relationship"})
+    assert other.reset
+    assert other.record_changed("T2D", record)
+    assert other.payload_changed("T2D", record, payload)
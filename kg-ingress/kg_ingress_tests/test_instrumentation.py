@@ -0,0 +1,46 @@
+import json
+from datetime import timedelta
+from unittest.mock import Mock
+from neo4j import SummaryCounters
+from kg_ingress.utils.instrumentation import RunReport, counters_dict
+
+
+def test_run_report_stages(tmp_path):
+    """Test that stages accumulate time, items, HTTP traffic and counters and are saved as JSON"""
+    report = RunReport(options={"phenos": "T2D"})
+    with report.stage("transform"):
+        pass
+    report.add("transform", items=3)
+    with report.stage("transform"):
+        pass
+    report.add("transform", items=2)
+
+    response = Mock(content=b"x" * 100, elapsed=timedelta(milliseconds=250))
+    report.record_response("fetch", response)
+    report.record_response("fetch", response)
+
+    counters = counters_dict(SummaryCounters({"nodes-created": 4, "properties-set": 8}))
+    report.add_counters("insert", counters)
+    report.add_counters("insert", counters)
+    report.set_endpoints({"cont": {"requests": 3, "retries": 1, "failures": 0, "bytes": 300, "seconds": 0.1}})
+
+    path = tmp_path / "report.json"
+    report.save(str(path))
+    saved = json.loads(path.read_text())
+    stages = saved["stages"]
+    assert saved["options"] == {"phenos": "T2D"}
+    assert stages["transform"]["items"] == 5
+    assert stages["transform"]["seconds"] >= 0
+    assert stages["fetch"]["http_requests"] == 2
+    assert stages["fetch"]["bytes"] == 200
+    assert stages["fetch"]["http_seconds"] == 0.5
+    assert stages["insert"]["counters"]["nodes_created"] == 8
+    assert stages["insert"]["counters"]["properties_set"] == 16
+    assert saved["endpoints"]["cont"]["retries"] == 1
+
+def test_run_report_timed():
+    """Test that timed yields every item and records the waiting time in the stage"""
+    report = RunReport()
+    assert list(report.timed(range(3), "fetch")) == [0, 1, 2]
+    assert report.stages["fetch"]["seconds"] > 0
+    assert report.stages["fetch"]["items"] == 0
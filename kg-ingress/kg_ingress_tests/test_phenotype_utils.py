@@ -3,13 +3,48 @@ import pandas as pd
 from rdflib import Graph
 import os
 from unittest.mock import Mock
+from kg_ingress.models.portal_model import Phenotype, Gwas
+from kg_ingress.utils import phenotype_utils
 from kg_ingress.utils.phenotype_utils import (
     create_orphanet_phenotype,
     create_gcat_phenotype, 
     create_portal_phenotype,
     preprocess_gcat_info,
+    lookup_trait_with_db_refs,
+    build_orphanet_index,
+    lookup_trait_in_index,
+    load_orphanet_index,
+    build_gcat_index,
+    build_portal_index,
+    load_gcat_info,
 )
 
+# Small ORDO excerpt covering a trait with xrefs, a trait without a definition,
+# a non-Orphanet class and an Orphanet resource that is not an owl:Class
+SAMPLE_ORDO_OWL = """<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+         xmlns:owl="http://www.w3.org/2002/07/owl#"
+         xmlns:efo="http://www.ebi.ac.uk/efo/"
+         xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+    <owl:Class rdf:about="http://www.orpha.net/ORDO/Orphanet_477754">
+        <rdfs:label xml:lang="en">Genetic cerebral small vessel disease</rdfs:label>
+        <efo:definition xml:lang="en">A group of rare genetic diseases affecting small cerebral vessels.</efo:definition>
+        <oboInOwl:hasDbXref>ICD-10:I67.3</oboInOwl:hasDbXref>
+        <oboInOwl:hasDbXref>MONDO:0018787</oboInOwl:hasDbXref>
+    </owl:Class>
+    <owl:Class rdf:about="http://www.orpha.net/ORDO/Orphanet_93460">
+        <rdfs:label xml:lang="en">Sample disease without definition</rdfs:label>
+    </owl:Class>
+    <owl:Class rdf:about="http://www.ebi.ac.uk/efo/EFO_0000001">
+        <rdfs:label>experimental factor</rdfs:label>
+    </owl:Class>
+    <rdf:Description rdf:about="http://www.orpha.net/ORDO/Orphanet_1">
+        <rdfs:label>Not a class</rdfs:label>
+    </rdf:Description>
+</rdf:RDF>
+"""
+
 # Setup fixtures for data files
 @pytest.fixture
 def sample_phenotype_api_response(mocker):
@@ -97,3 +132,194 @@ def test_create_portal_phenotype(sample_phenotype_api_response, portal_phenotype
             phenotype = create_portal_phenotype(portal_phenotype_data, item['phenotype'], item['phenotype_name'])
             print(phenotype)
             assert phenotype is not None
+
+@pytest.fixture
+def sample_orphanet_graph():
+    """Parse the small ORDO excerpt"""
+    graph = Graph()
+    graph.parse(data=SAMPLE_ORDO_OWL, format="xml")
+    return graph
+
+def test_orphanet_index_matches_sparql(sample_orphanet_graph):
+    """Test that index lookups return exactly what the SPARQL lookup returns"""
+    index = build_orphanet_index(sample_orphanet_graph)
+    assert set(index) == {"477754", "93460"}
+    for orpha_id in ["477754", "93460", "1", "999999"]:
+        expected = lookup_trait_with_db_refs(sample_orphanet_graph, orpha_id)
+        assert lookup_trait_in_index(index, orpha_id) == expected
+    assert sorted(index["477754"]["Database References"]) == ["ICD-10:I67.3", "MONDO:0018787"]
+
+def test_create_orphanet_phenotype_from_index(sample_orphanet_graph):
+    """Test that phenotypes built from the index match those built from the graph"""
+    index = build_orphanet_index(sample_orphanet_graph)
+    phenotype = "Genetic_cerebral_small_vessel_disease_Orphanet_477754"
+    from_graph = create_orphanet_phenotype(sample_orphanet_graph, phenotype, "Genetic cerebral small vessel disease")
+    from_index = create_orphanet_phenotype(index, phenotype, "Genetic cerebral small vessel disease")
+    assert from_index == from_graph
+    assert create_orphanet_phenotype(index, "Unknown_Orphanet_999999", "Unknown") is None
+
+def test_load_orphanet_index_cache(tmp_path, mocker):
+    """Test that the Orphanet index is cached by OWL file hash and rebuilt when the file changes"""
+    owl_path = tmp_path / "ordo.owl"
+    owl_path.write_text(SAMPLE_ORDO_OWL)
+    cache_dir = tmp_path / "cache"
+
+    index = load_orphanet_index(str(owl_path), cache_dir=str(cache_dir))
+    assert set(index) == {"477754", "93460"}
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A second load must come from the cache without parsing the OWL file
+    parse = mocker.patch("kg_ingress.utils.phenotype_utils.Graph.parse")
+    assert load_orphanet_index(str(owl_path), cache_dir=str(cache_dir)) == index
+    parse.assert_not_called()
+    mocker.stopall()
+
+    # Changing the OWL file invalidates the cache
+    owl_path.write_text(SAMPLE_ORDO_OWL.replace("Orphanet_93460", "Orphanet_93461"))
+    rebuilt = load_orphanet_index(str(owl_path), cache_dir=str(cache_dir))
+    assert set(rebuilt) == {"477754", "93461"}
+    assert len(os.listdir(cache_dir)) == 1
+
+    # So does a new index version
+    mocker.patch("kg_ingress.utils.phenotype_utils.ORPHANET_INDEX_VERSION", 2)
+    build = mocker.spy(phenotype_utils, "build_orphanet_index")
+    assert load_orphanet_index(str(owl_path), cache_dir=str(cache_dir)) == rebuilt
+    build.assert_called_once()
+    assert [name.split("-")[-2] for name in os.listdir(cache_dir)] == ["v2"]
+
+@pytest.fixture
+def sample_gcat_info():
+    """Small preprocessed GCAT table with duplicated studies and xrefs"""
+    return pd.DataFrame({
+        "processed_trait_name": ["gcat_trait_a", "gcat_trait_a", "gcat_trait_a", "gcat_trait_b"],
+        "processed_curie": ["EFO:1", "EFO:2", "EFO:1", "EFO:3"],
+        "STUDY ACCESSION": ["GCST001", "GCST002", "GCST001", "GCST003"],
+        "STUDY": ["Study one", "Study two", "Study one", "Study three"],
+    })
+
+@pytest.fixture
+def sample_portal_info():
+    """Small AMP traits mapping table with a duplicated phenotype name"""
+    return pd.DataFrame({
+        "id": [1, 2, 3],
+        "name": ["T2D", "BMI", "T2D"],
+        "description": ["Type 2 diabetes", "Body mass index", "Duplicate entry"],
+        "EFO_id": ["EFO:0001360,MONDO:0005148", "EFO:0004340", "EFO:9"],
+    })
+
+def test_create_gcat_phenotype_lookups(sample_gcat_info):
+    """Test that GCAT index and DataFrame lookups both build the expected objects"""
+    index = build_gcat_index(sample_gcat_info)
+    assert index["gcat_trait_a"] == {
+        "xrefs": ["EFO:1", "EFO:2"],
+        "studies": [("GCST001", "Study one"), ("GCST002", "Study two")],
+    }
+    trait_a = Phenotype(
+        id="EFO:1",
+        name="gcat_trait_a",
+        display_name="Trait A",
+        description="No description available",
+        has_xrefs=["EFO:1", "EFO:2"]
+    )
+    trait_b = Phenotype(
+        id="EFO:3",
+        name="gcat_trait_b",
+        display_name="Trait B",
+        description="No description available",
+        has_xrefs=["EFO:3"]
+    )
+    expected = {
+        "gcat_trait_a": (trait_a, [
+            Gwas(id="GCST:001", description="Study one", phenotype=trait_a),
+            Gwas(id="GCST:002", description="Study two", phenotype=trait_a),
+        ]),
+        "gcat_trait_b": (trait_b, [Gwas(id="GCST:003", description="Study three", phenotype=trait_b)]),
+    }
+    for gcat_info in [index, sample_gcat_info]:
+        assert create_gcat_phenotype(gcat_info, "gcat_trait_a", "Trait A") == expected["gcat_trait_a"]
+        assert create_gcat_phenotype(gcat_info, "gcat_trait_b", "Trait B") == expected["gcat_trait_b"]
+        assert create_gcat_phenotype(gcat_info, "gcat_trait_missing", "Missing") == (None, None)
+
+def test_create_portal_phenotype_lookups(sample_portal_info):
+    """Test that portal index and DataFrame lookups both build the expected objects"""
+    index = build_portal_index(sample_portal_info)
+    assert index["T2D"]["id"] == 1
+    expected = {
+        "T2D": Phenotype(
+            id="PORTAL.TRAIT:1",
+            name="T2D",
+            display_name="Type 2 diabetes",
+            description="Type 2 diabetes",
+            has_xrefs=["EFO:0001360", "MONDO:0005148"]
+        ),
+        "BMI": Phenotype(
+            id="PORTAL.TRAIT:2",
+            name="BMI",
+            display_name="Body mass index",
+            description="Body mass index",
+            has_xrefs=["EFO:0004340"]
+        ),
+        "missing": Phenotype(
+            id="PORTAL.TRAIT:missing",
+            name="missing",
+            display_name="Missing",
+            description="No description available. Not found in AMP traits mapping.",
+            has_xrefs=[]
+        ),
+    }
+    for portal_info in [index, sample_portal_info]:
+        for phenotype, phenotype_obj in expected.items():
+            assert create_portal_phenotype(portal_info, phenotype, phenotype_obj.display_name) == phenotype_obj
+
+# Header of the GCAT studies table; MAPPED_TRAIT and MAPPED_TRAIT_URI are columns 13 and 14
+GCAT_HEADER = [
+    "DATE ADDED TO CATALOG", "PUBMEDID", "FIRST AUTHOR", "DATE", "JOURNAL", "LINK", "STUDY",
+    "DISEASE/TRAIT", "INITIAL SAMPLE SIZE", "REPLICATION SAMPLE SIZE", "PLATFORM [SNPS PASSING QC]",
+    "ASSOCIATION COUNT", "MAPPED_TRAIT", "MAPPED_TRAIT_URI", "STUDY ACCESSION", "GENOTYPING TECHNOLOGY",
+]
+
+@pytest.fixture
+def sample_gcat_raw():
+    """Small raw GCAT table including missing, empty and special-character traits"""
+    rows = [
+        ("Study one", "trait in response to platinum", "http://www.ebi.ac.uk/efo/EFO_0005951", "GCST001"),
+        ("Study two", "body mass index (BMI), adjusted", " http://www.ebi.ac.uk/efo/EFO_0004340 ", "GCST002"),
+        ("Study three", None, "http://www.ebi.ac.uk/efo/EFO_0000001", "GCST003"),
+        ("Study four", "height", None, "GCST004"),
+        ("Study five", "trait in response to platinum", "http://www.ebi.ac.uk/efo/EFO_0005951", "GCST005"),
+    ]
+    data = {column: ["x"] * len(rows) for column in GCAT_HEADER}
+    data["STUDY"] = [row[0] for row in rows]
+    data["MAPPED_TRAIT"] = [row[1] for row in rows]
+    data["MAPPED_TRAIT_URI"] = [row[2] for row in rows]
+    data["STUDY ACCESSION"] = [row[3] for row in rows]
+    return pd.DataFrame(data, columns=GCAT_HEADER)
+
+def test_preprocess_gcat_info(sample_gcat_raw):
+    """Test the GCAT trait name and curie transforms"""
+    result = preprocess_gcat_info(sample_gcat_raw.copy())
+    assert result["processed_trait_name"].tolist() == [
+        "gcat_trait_trait_in_response_to_platinum",
+        "gcat_trait_body_mass_index_BMI_adjusted",
+        "gcat_trait_trait_in_response_to_platinum",
+    ]
+    assert result["processed_curie"].tolist() == ["EFO:0005951", "EFO:0004340", "EFO:0005951"]
+    assert result["STUDY ACCESSION"].tolist() == ["GCST001", "GCST002", "GCST005"]
+
+@pytest.mark.parametrize("file_name,chunksize", [
+    ("gcat.tsv", None),
+    ("gcat.tsv", 2),
+    ("gcat.tsv.gz", 2),
+])
+def test_load_gcat_info(tmp_path, sample_gcat_raw, file_name, chunksize):
+    """Test that the pruned, optionally chunked loader matches preprocessing the full table"""
+    gcat_path = tmp_path / file_name
+    sample_gcat_raw.to_csv(gcat_path, sep="\t", index=False)
+    expected = preprocess_gcat_info(pd.read_csv(gcat_path, sep="\t"))
+
+    result = load_gcat_info(str(gcat_path), chunksize=chunksize)
+    assert list(result.columns) == ["processed_trait_name", "processed_curie", "STUDY ACCESSION", "STUDY"]
+    for column in result.columns:
+        assert result[column].tolist() == expected[column].tolist()
+    assert build_gcat_index(result) == build_gcat_index(expected)
+
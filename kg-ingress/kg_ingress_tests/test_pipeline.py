@@ -0,0 +1,114 @@
+import json
+import os
+import pytest
+import pandas as pd
+from unittest.mock import MagicMock
+from kg_ingress import pipeline
+from kg_ingress.pipeline import PipelineResources, PORTAL_PHENOTYPES_FILE, CHECKPOINT_DIR
+from kg_ingress.assets import phenotype_source
+
+
+@pytest.fixture
+def portal_only_data_dir(tmp_path):
+    """Data directory containing only the portal phenotype mappings"""
+    pd.DataFrame({
+        "id": [1],
+        "name": ["T2D"],
+        "description": ["Type 2 diabetes"],
+        "EFO_id": ["EFO:0001360"],
+    }).to_csv(tmp_path / PORTAL_PHENOTYPES_FILE, index=False)
+    return tmp_path
+
+def test_pipeline_resources_are_lazy(portal_only_data_dir, mocker):
+    """Test that resources are only built when first accessed"""
+    driver_factory = mocker.patch("kg_ingress.pipeline.GraphDatabase.driver")
+    with PipelineResources(data_dir=str(portal_only_data_dir)) as resources:
+        # Only the portal mappings exist, so touching any other table would fail
+        assert resources.portal_index["T2D"]["id"] == 1
+        assert resources.portal_index is resources.portal_index
+        driver_factory.assert_not_called()
+        assert resources.driver is driver_factory.return_value
+    driver_factory.return_value.close.assert_called_once()
+
+def test_pipeline_resources_missing_file(tmp_path):
+    """Test that a missing mapping file only fails when that table is needed"""
+    resources = PipelineResources(data_dir=str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        resources.gcat_index
+
+def test_phenotype_source():
+    """Test dispatching phenotypes to their source"""
+    assert phenotype_source("Genetic_cerebral_small_vessel_disease_Orphanet_477754") == "orphanet"
+    assert phenotype_source("gcat_trait_right_ventricular_stroke_volume_measurement") == "gcat"
+    assert phenotype_source("eGFRcrcys") == "portal"
+
+def test_parse_args_rejects_clean_incremental():
+    """Test that an incremental run cannot empty the database its fingerprints describe"""
+    with pytest.raises(SystemExit):
+        pipeline.parse_args(["--clean-db", "--incremental"])
+    assert pipeline.parse_args(["--incremental"]).incremental
+
+def test_parse_args_rejects_spool_in_dump_dir(tmp_path):
+    """Test that the dump directory cannot be used as spool directory"""
+    with pytest.raises(SystemExit):
+        pipeline.parse_args(["--from-dump", str(tmp_path), "--spool-dir", str(tmp_path)])
+
+def test_resume_after_failed_phenotype(tmp_path, mocker):
+    """Test that a resumed run neither re-fetches phenotype records nor redoes completed phenotypes"""
+    records = [
+        {"phenotype": "T2D", "phenotype_name": "Type 2 diabetes"},
+        {"phenotype": "BMI", "phenotype_name": "Body mass index"},
+    ]
+    failing = {"BMI"}
+
+    def fetch_gene_phenotype_pages(name, *args, **kwargs):
+        if name in failing:
+            raise ValueError("API request failed with status 503")
+        yield {"data": [{"gene": "TCF7L2", "phenotype": name, "combined": 1.0, "log_bf": 0.5, "prior": 0.5}], "continuation": None}
+
+    fetch_phenotypes = mocker.patch("kg_ingress.pipeline.fetch_phenotype_data", return_value=records)
+    fetch_genes = mocker.patch("kg_ingress.assets.fetch_gene_phenotype_pages", side_effect=fetch_gene_phenotype_pages)
+    writes = mocker.patch("kg_ingress.pipeline.insert_data_batched", return_value={})
+    resources = PipelineResources(data_dir=str(tmp_path))
+    resources.__dict__.update(driver=MagicMock(), portal_index={})
+    mocker.patch("kg_ingress.pipeline.PipelineResources", return_value=resources)
+
+    pipeline.main(["--data-dir", str(tmp_path), "--skip-schema"])
+    assert os.path.exists(tmp_path / CHECKPOINT_DIR / "completed_phenotypes.jsonl")
+
+    failing.clear()
+    fetch_genes.reset_mock()
+    writes.reset_mock()
+    pipeline.main(["--data-dir", str(tmp_path), "--skip-schema", "--resume"])
+
+    fetch_phenotypes.assert_called_once()
+    assert [call.args[0] for call in fetch_genes.call_args_list] == ["BMI"]
+    # Only the gene and associations of the retried phenotype are written
+    assert writes.call_count == 2
+    assert not os.path.exists(tmp_path / CHECKPOINT_DIR)
+
+def test_export_reports_association_rows(tmp_path, mocker):
+    """Test that exported associations are reported as rows, not as the pages they were buffered in"""
+    records = [{"phenotype": "T2D", "phenotype_name": "Type 2 diabetes"}]
+
+    def fetch_gene_phenotype_pages(name, *args, **kwargs):
+        for page in range(20):
+            rows = [
+                {"gene": f"GENE{page}_{i}", "phenotype": name, "combined": 1.0, "log_bf": 0.5, "prior": 0.5}
+                for i in range(50)
+            ]
+            yield {"data": rows, "continuation": None if page == 19 else str(page)}
+
+    mocker.patch("kg_ingress.pipeline.fetch_phenotype_data", return_value=records)
+    mocker.patch("kg_ingress.assets.fetch_gene_phenotype_pages", side_effect=fetch_gene_phenotype_pages)
+    resources = PipelineResources(data_dir=str(tmp_path))
+    resources.__dict__.update(portal_index={})
+    mocker.patch("kg_ingress.pipeline.PipelineResources", return_value=resources)
+
+    report_path = tmp_path / "report.json"
+    pipeline.main([
+        "--data-dir", str(tmp_path), "--export-bulk-csv", str(tmp_path / "export"), "--report", str(report_path),
+    ])
+    stages = json.loads(report_path.read_text())["stages"]
+    assert stages["insert_genes"]["items"] == 1000
+    assert stages["insert_associations"]["items"] == 1000
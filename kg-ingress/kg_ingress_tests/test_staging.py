@@ -0,0 +1,100 @@
+import os
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from kg_ingress.utils.staging import StagingArea, compare_snapshots, resolve_snapshot_dir
+
+
+@pytest.fixture
+def records():
+    return [
+        {"phenotype": "T2D", "phenotype_name": "Type 2 diabetes", "trait_group": "portal"},
+        {"phenotype": "Disease_Orphanet_1", "phenotype_name": "Disease", "trait_group": "orphanet", "dummy": 1},
+    ]
+
+def gene_rows(phenotype, genes, combined=1.5):
+    return [
+        {"gene": gene, "phenotype": phenotype, "combined": combined, "log_bf": 1.0, "prior": 0.5}
+        for gene in genes
+    ]
+
+def test_staging_roundtrip(tmp_path, records):
+    """Test that staged records and pages read back unchanged, in page order"""
+    staging = StagingArea(str(tmp_path / "snapshot"))
+    staging.write_phenotypes(records)
+    # A phenotype name that is not a safe path segment
+    name = "gcat_trait_a/b c"
+    pages = [gene_rows(name, ["TCF7L2", "PPARG"]), gene_rows(name, ["FTO"], combined=2)]
+    # Fields missing from a row stay missing
+    del pages[1][0]["log_bf"]
+    for part, rows in enumerate(pages):
+        staging.write_gene_phenotypes(name, rows, part=part, last=part == len(pages) - 1)
+    staging.write_gene_phenotypes("T2D", gene_rows("T2D", ["TCF7L2"]))
+
+    assert staging.phenotype_records() == records
+    assert staging.staged_phenotypes() == ["T2D", name]
+    assert staging.gene_phenotype_rows(name) == pages[0] + pages[1]
+    assert staging.gene_phenotype_rows(name, columns=["gene", "log_bf", "sigma"]) == [
+        {"gene": "TCF7L2", "log_bf": 1.0, "phenotype": name},
+        {"gene": "PPARG", "log_bf": 1.0, "phenotype": name},
+        {"gene": "FTO", "phenotype": name},
+    ]
+    table = staging.gene_phenotype_table(["phenotype", "gene", "combined"])
+    assert table.num_rows == 4
+    assert sorted(table.column("phenotype").to_pylist()) == ["T2D", name, name, name]
+
+    pages = list(staging.iter_gene_phenotype_pages([name, "missing"], columns=["gene"]))
+    assert [(rows, last) for _, rows, _, last in pages[:2]] == [
+        ([{"gene": "TCF7L2", "phenotype": name}, {"gene": "PPARG", "phenotype": name}], False),
+        ([{"gene": "FTO", "phenotype": name}], True),
+    ]
+    assert pages[2][1] is None and pages[2][3] and isinstance(pages[2][2], KeyError)
+
+def test_staging_partial_phenotype(tmp_path):
+    """Test that a phenotype whose last page was never staged is reported rather than read"""
+    staging = StagingArea(str(tmp_path / "snapshot"))
+    staging.write_gene_phenotypes("T2D", gene_rows("T2D", ["TCF7L2"]))
+    for part in range(2):
+        staging.write_gene_phenotypes("BMI", gene_rows("BMI", [f"GENE{part}"]), part=part, last=False)
+
+    assert staging.staged_phenotypes() == ["T2D"]
+    assert staging.gene_phenotype_table(["phenotype", "gene"]).column("gene").to_pylist() == ["TCF7L2"]
+    with pytest.raises(KeyError):
+        staging.gene_phenotype_rows("BMI")
+    (_, rows, error, last), = staging.iter_gene_phenotype_pages(["BMI"])
+    assert rows is None and last and isinstance(error, KeyError)
+
+    # Fetching the phenotype again replaces the pages of the failed attempt
+    staging.write_gene_phenotypes("BMI", gene_rows("BMI", ["FTO"]))
+    assert staging.gene_phenotype_rows("BMI") == gene_rows("BMI", ["FTO"])
+
+def test_compare_snapshots(tmp_path, records):
+    """Test that snapshot comparison counts added, removed and changed associations"""
+    old = StagingArea(str(tmp_path / "stage" / "20240101T000000"))
+    new = StagingArea(str(tmp_path / "stage" / "20240201T000000"))
+    for staging in (old, new):
+        staging.write_phenotypes(records)
+    old.write_gene_phenotypes("T2D", gene_rows("T2D", ["TCF7L2", "PPARG", "FTO"]))
+    new_rows = gene_rows("T2D", ["TCF7L2", "PPARG", "GCK"])
+    new_rows[1]["prior"] = 0.9
+    new.write_gene_phenotypes("T2D", new_rows)
+
+    assert resolve_snapshot_dir(str(tmp_path / "stage")) == new.path
+    assert resolve_snapshot_dir(old.path) == old.path
+    assert compare_snapshots(old.path, new.path) == {"added": 1, "removed": 1, "changed": 1}
+
+def test_staging_long_phenotype_names(tmp_path):
+    """Test that phenotype names too long to quote into a file name are staged under a shortened one"""
+    staging = StagingArea(str(tmp_path / "snapshot"))
+    name = "gcat_trait_" + "é/ " * 100
+    other = name + "x"
+    staging.write_gene_phenotypes(name, gene_rows(name, ["TCF7L2"]))
+    staging.write_gene_phenotypes(other, gene_rows(other, ["PPARG"]))
+
+    directories = os.listdir(tmp_path / "snapshot" / "gene_phenotypes")
+    assert len(directories) == 2 and all(len(directory.encode()) <= 255 for directory in directories)
+    assert staging.staged_phenotypes() == sorted([name, other])
+    assert staging.gene_phenotype_rows(name) == gene_rows(name, ["TCF7L2"])
+    table = staging.gene_phenotype_table(["phenotype", "gene"])
+    assert sorted(zip(table.column("phenotype").to_pylist(), table.column("gene").to_pylist())) == sorted([(name, "TCF7L2"), (other, "PPARG")])
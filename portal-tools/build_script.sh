@@ -1,7 +1,10 @@
+# Run from portal-tools/; the build context is the repository root so the image can
+# include the shared bioindex client
 docker buildx build \
+  -f Dockerfile \
   --platform linux/amd64 \
   -t gcr.io/simage-main/portal-tools:latest \
   --push \
   --cache-to=type=registry,ref=gcr.io/simage-main/portal-tools:cache,mode=max \
   --cache-from=type=registry,ref=gcr.io/simage-main/portal-tools:cache \
-  .
\ No newline at end of file
+  ..
\ No newline at end of file
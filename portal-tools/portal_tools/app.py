@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import portal_tools.tools.pigean as pigean
+import portal_tools.tools.cypher_utils as cypher_utils
 from portal_tools.tools.cypher_utils import run_cypher
 import os
 from sentence_transformers import SentenceTransformer
@@ -12,9 +13,7 @@ CORS(app)
 
 model = SentenceTransformer('all-MiniLM-L6-v2')
 print('Fetching phenotype data...')
-portal_phenotypes = pigean.fetch_phenotype_data()
-portal_names = [item['phenotype_name'] for item in portal_phenotypes]
-portal_names_embeddings = model.encode(portal_names)
+portal_phenotypes, portal_names_embeddings = pigean.load_phenotype_catalog(model)
 print('Done! And ready to go!')
 
 @app.route('/search_phenotypes', methods=['POST'])
@@ -28,10 +27,8 @@ def search_phenotypes():
 
 @app.route('/force_phenotype_embedding_update', methods=['POST'])
 def force_phenotype_embedding_update():
-    global portal_names_embeddings
-    portal_phenotypes = pigean.fetch_phenotype_data()
-    portal_names = [item['phenotype_name'] for item in portal_phenotypes]
-    portal_names_embeddings = model.encode(portal_names)
+    global portal_phenotypes, portal_names_embeddings
+    portal_phenotypes, portal_names_embeddings = pigean.load_phenotype_catalog(model)
     return jsonify({'message': 'Phenotype embeddings updated'})
 
 @app.route('/get_top_genes', methods=['POST'])
@@ -47,6 +44,20 @@ def get_top_genes():
     result = pigean.get_top_genes(phenotype_id, top_n, metric, sigma, geneset_size)
     return jsonify({'result': result})
 
+@app.route('/get_graph_top_genes', methods=['POST'])
+def get_graph_top_genes():
+    data = request.get_json()
+    phenotype_id = data.get('phenotype_id')
+    top_n = data.get('top_n', 25)
+    metric = data.get('metric', 'combined')
+    if phenotype_id is None:
+        return jsonify({'error': '"phenotype_id" is required'}), 400
+    if metric not in cypher_utils.METRIC_PROPERTIES:
+        return jsonify({'error': f'"metric" must be one of {", ".join(cypher_utils.METRIC_PROPERTIES)}'}), 400
+    # ranked in the knowledge graph, read with the layout set by ASSOCIATION_LAYOUT
+    result = cypher_utils.get_top_genes(phenotype_id, top_n, metric)
+    return jsonify({'result': result})
+
 @app.route('/get_factors', methods=['POST'])
 def get_factors():
     data = request.get_json()
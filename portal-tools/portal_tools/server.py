@@ -4,6 +4,7 @@ import requests
 
 # Import the tools we want to expose to the MCP server
 from portal_tools.tools.pigean import find_phenotype_data, get_top_genes
+from portal_tools.tools import cypher_utils
 
 mcp = FastMCP('portal-tools')
 
@@ -69,5 +70,24 @@ def pigean_top_genes(phenotype_name:str, top_n:int, metric:str='combined', sigma
     """
     return get_top_genes(phenotype_name, top_n, metric, sigma, geneset_size)
 
+@mcp.tool()
+def graph_top_genes(phenotype_name:str, top_n:int, metric:str='combined'):
+    """
+    This tool returns the top N genes for a given phenotype ranked by their PIGEAN support scores stored in the portal knowledge graph. The graph holds the scores for sigma 2 and the large gene sets, so use pigean_top_genes for other settings.
+
+    Args:
+        phenotype_name: The name of the phenotype to get the top genes for
+        top_n: The number of top genes to return
+        metric: The metric to use for ranking the genes, either 'combined', 'indirect', or 'direct'
+
+    Returns:
+        A list of JSON objects where each object contains the following fields:
+        - gene_id: The id of the gene
+        - gene_name: The name of the gene
+        - metric_value: The metric value for the gene
+        - metric_name: The name of the metric
+    """
+    return cypher_utils.get_top_genes(phenotype_name, top_n, metric)
+
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -13,14 +13,40 @@ NEO4J_URI = "bolt://{}".format(NEO4J_IP_PORT)
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
+# how the kg-ingress pipeline stored gene-phenotype associations ('node' or 'relationship')
+ASSOCIATION_LAYOUT = os.getenv('ASSOCIATION_LAYOUT', 'node')
+
+# support score property for each ranking metric
+METRIC_PROPERTIES = {
+    'combined': 'combined_support',
+    'direct': 'direct_support',
+    'indirect': 'indirect_support',
+}
+
+# top genes of a phenotype, per association layout
+TOP_GENES_QUERIES = {
+    'node': """
+        MATCH (p:Phenotype {{name: $phenotype}})<-[:OBJECT]-(sa:SupportAssociation)-[:SUBJECT]->(g:Gene)
+        RETURN g.id AS gene_id, g.symbol AS gene_name, sa.{prop} AS metric_value
+        ORDER BY metric_value DESC
+        LIMIT $top_n
+        """,
+    'relationship': """
+        MATCH (g:Gene)-[r:SUPPORTS]->(p:Phenotype {{name: $phenotype}})
+        RETURN g.id AS gene_id, g.symbol AS gene_name, r.{prop} AS metric_value
+        ORDER BY metric_value DESC
+        LIMIT $top_n
+        """,
+}
+
 # Neo4j driver
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
 
 # methods
-def run_cypher(cypher_query: str, log=False):
+def run_cypher(cypher_query: str, log=False, parameters: Dict = None):
     '''
-    queries a neo4j database
+    queries a neo4j database, passing the optional parameters to the query
     '''
     # initialize
     list_result = []
@@ -39,7 +65,7 @@ def run_cypher(cypher_query: str, log=False):
             # with driver.session(config=SessionConfig(default_access_mode="READ")) as session:
             # read only for driver versino >=5
             with driver.session(default_access_mode="r") as session:        
-                cypher_result = session.run(query)
+                cypher_result = session.run(query, parameters)
                 # Convert each record to a dictionary
                 list_result = [record.data() for record in cypher_result]
             
@@ -56,3 +82,25 @@ def run_cypher(cypher_query: str, log=False):
     # return
     return result
 
+
+def top_genes_query(metric: str = 'combined', layout: str = ASSOCIATION_LAYOUT) -> str:
+    '''
+    builds the cypher query ranking the genes of a phenotype by a support metric
+    ('combined', 'direct', 'indirect') for the given association layout
+    '''
+    if metric not in METRIC_PROPERTIES:
+        raise ValueError(f"Invalid metric: {metric}")
+    if layout not in TOP_GENES_QUERIES:
+        raise ValueError(f"Invalid association layout: {layout}")
+    return TOP_GENES_QUERIES[layout].format(prop=METRIC_PROPERTIES[metric])
+
+
+def get_top_genes(phenotype_id: str, top_n: int = 10, metric: str = 'combined', layout: str = ASSOCIATION_LAYOUT, log=False) -> List[Dict]:
+    '''
+    returns the top N genes of a phenotype from the graph, in the same shape as pigean.get_top_genes
+    '''
+    query = top_genes_query(metric=metric, layout=layout)
+    result = run_cypher(query, log=log, parameters={'phenotype': phenotype_id, 'top_n': top_n})
+    if result['message'] != "all good":
+        raise ValueError(f"Cypher query failed: {result['message']}")
+    return [dict(row, metric_name=metric) for row in result['data']]
@@ -1,36 +1,47 @@
+import heapq
 from typing import List
-import requests
+from bioindex_client import BioindexClient
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+# Shared bioindex client: pooled keep-alive connections, timeouts and retries. Failed
+# requests raise bioindex_client.BioindexError, a ValueError subclass
+bioindex = BioindexClient()
+
 
 def fetch_phenotype_data():
     """
     Fetches phenotype data from the bioindex API using pagination.
     Returns a list of all phenotype records from the API.
     """
-    url = "https://bioindex-dev.hugeamp.org/api/bio/query/pigean-phenotypes?q=1"
-    all_data = []
-    
-    # Initial request
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-        
-    data = response.json()
-    all_data.extend(data['data'])
-    
-    # Handle pagination using continuation tokens
-    while data['continuation']:
-        cont_url = f"https://bioindex-dev.hugeamp.org/api/bio/cont?token={data['continuation']}"
-        response = requests.get(cont_url)
-        if response.status_code != 200:
-            raise ValueError(f"Continuation request failed with status {response.status_code}")
-            
-        data = response.json()
-        all_data.extend(data['data'])
-        
-    return all_data
+    return bioindex.query("pigean-phenotypes", "1")
+
+def iter_phenotype_pages():
+    """
+    Yields the phenotype records from the bioindex API one page at a time. The next page
+    is already being fetched while the caller works on the current one.
+    """
+    for data in bioindex.query_pages("pigean-phenotypes", "1"):
+        yield data['data']
+
+def load_phenotype_catalog(model):
+    """
+    Fetches all phenotype records and encodes their names with `model`, encoding each
+    page while the next one is downloaded.
+
+    Returns the phenotype records and the matching np.ndarray of name embeddings, as
+    used by search_phenotypes.
+    """
+    phenotype_data = []
+    embeddings = []
+    for page in iter_phenotype_pages():
+        if not page:
+            continue
+        phenotype_data.extend(page)
+        embeddings.append(model.encode([item['phenotype_name'] for item in page]))
+    if not embeddings:
+        return phenotype_data, np.empty((0, model.get_sentence_embedding_dimension()))
+    return phenotype_data, np.concatenate(embeddings)
 
 def search_phenotypes(phenotype_names, phenotype_names_embeddings, model, phenotype_data, top_n=50):
     """
@@ -92,24 +103,8 @@ def fetch_gene_phenotype_data(phenotype_id, sigma=2, geneset_size='small'):
         sigma: Statistical significance threshold
         geneset_size: Size of the gene set to return ('large', 'medium', 'small')
     """
-    url = f"https://bioindex-dev.hugeamp.org/api/bio/query/pigean-gene-phenotype"
     q = f"{phenotype_id},{sigma},{geneset_size}"
-    response = requests.get(url, params={'q': q})
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-    
-    data = response.json()
-    all_data = data['data']
-    
-    while data['continuation']:
-        cont_url = f"https://bioindex-dev.hugeamp.org/api/bio/cont?token={data['continuation']}"
-        response = requests.get(cont_url)
-        if response.status_code != 200:
-            raise ValueError(f"Continuation request failed with status {response.status_code}")
-            
-        data = response.json()
-        all_data.extend(data['data'])
-    return all_data
+    return bioindex.query("pigean-gene-phenotype", q)
 
 def get_top_genes(phenotype_id, top_n=10, metric='combined', sigma=2, geneset_size='small'):
     """
@@ -122,7 +117,6 @@ def get_top_genes(phenotype_id, top_n=10, metric='combined', sigma=2, geneset_si
         sigma: Statistical significance threshold, default is 2
         geneset_size: Size of the gene set to return ('large', 'small'), default is 'small'
     """
-    data = fetch_gene_phenotype_data(phenotype_id, sigma, geneset_size)
     # Parse out the metric name
     if metric == 'combined':
         metric_name = 'combined'
@@ -132,11 +126,12 @@ def get_top_genes(phenotype_id, top_n=10, metric='combined', sigma=2, geneset_si
         metric_name = 'log_bf'
     else:
         raise ValueError(f"Invalid metric: {metric}")
-    # Sort the data by the specified metric in descending order
-    sorted_data = sorted(data, key=lambda x: x[metric_name], reverse=True)
-    # Parse out the sorted data into a list of JSON objects
+    # Rows are decoded as they arrive with only the gene and metric kept, and only the
+    # top N are held, however many genes the phenotype has
+    q = f"{phenotype_id},{sigma},{geneset_size}"
+    rows = bioindex.query_records("pigean-gene-phenotype", q, fields=["gene", metric_name])
     top_genes = []
-    for item in sorted_data[:top_n]:
+    for item in heapq.nlargest(top_n, rows, key=lambda x: x[metric_name]):
         top_genes.append({
             "gene_id": item['gene'],
             "gene_name": item['gene'],
@@ -149,16 +144,13 @@ def get_top_genes(phenotype_id, top_n=10, metric='combined', sigma=2, geneset_si
 def fetch_gene_genesets(phenotype_id:str, sigma=2, geneset_size='small', metric:str='beta'):
     """
     Fetches the genesets for a given gene.
+
+    Follows continuation tokens, so genesets from every page are returned, not only the
+    first page. Raises BioindexError (a ValueError) if the request fails after retries.
     """
-    url = f"https://bioindex-dev.hugeamp.org/api/bio/query/pigean-gene-set-phenotype"
     q = f"{phenotype_id},{sigma},{geneset_size}"
-    response = requests.get(url, params={'q': q})
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-    
-    _data = response.json()
     data = []
-    for item in _data['data']:
+    for item in bioindex.query_records("pigean-gene-set-phenotype", q, fields=[metric, "gene_set", "phenotype"]):
         data.append({
             "metric_value": item[metric],
             "metric_name": metric,
@@ -180,16 +172,13 @@ def get_gene_genesets(phenotype_id:str, top_n:int=10, metric:str='beta', sigma:i
 def fetch_factors(phenotype_id:str, sigma:int=2, geneset_size:str='small'):
     """
     Fetches the factors for a given phenotype.
+
+    Follows continuation tokens, so factors from every page are returned, not only the
+    first page. Raises BioindexError (a ValueError) if the request fails after retries.
     """
-    url = f"https://bioindex-dev.hugeamp.org/api/bio/query/pigean-factor"
     q = f"{phenotype_id},{sigma},{geneset_size}"
-    response = requests.get(url, params={'q': q})
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status {response.status_code}")
-    
-    _data = response.json()
     data = []
-    for item in _data['data']:
+    for item in bioindex.query("pigean-factor", q):
         curated_item = {
             "factor_label": item['label'],
             "gene_set_score": item['gene_set_score'],
@@ -0,0 +1,56 @@
+import pytest
+
+from portal_tools.tools import cypher_utils
+from portal_tools.tools.cypher_utils import get_top_genes, top_genes_query
+
+
+def normalize(query):
+    return " ".join(query.split())
+
+
+def test_top_genes_query_node_layout():
+    """Test that the node layout ranks genes through their SupportAssociation node"""
+    assert normalize(top_genes_query("direct", layout="node")) == (
+        "MATCH (p:Phenotype {name: $phenotype})<-[:OBJECT]-(sa:SupportAssociation)-[:SUBJECT]->(g:Gene) "
+        "RETURN g.id AS gene_id, g.symbol AS gene_name, sa.direct_support AS metric_value "
+        "ORDER BY metric_value DESC "
+        "LIMIT $top_n"
+    )
+
+
+def test_top_genes_query_relationship_layout():
+    """Test that the relationship layout ranks genes by the properties of their SUPPORTS relationship"""
+    assert normalize(top_genes_query("indirect", layout="relationship")) == (
+        "MATCH (g:Gene)-[r:SUPPORTS]->(p:Phenotype {name: $phenotype}) "
+        "RETURN g.id AS gene_id, g.symbol AS gene_name, r.indirect_support AS metric_value "
+        "ORDER BY metric_value DESC "
+        "LIMIT $top_n"
+    )
+
+
+def test_top_genes_query_validation():
+    """Test that unknown metrics and layouts are rejected"""
+    assert "sa.combined_support" in top_genes_query(layout="node")
+    with pytest.raises(ValueError, match="Invalid metric"):
+        top_genes_query("beta", layout="node")
+    with pytest.raises(ValueError, match="Invalid association layout"):
+        top_genes_query("combined", layout="edges")
+
+
+def test_get_top_genes(monkeypatch):
+    """Test that top genes are read with the query of the layout and labelled with the metric"""
+    calls = []
+
+    def fake_run_cypher(query, log=False, parameters=None):
+        calls.append((query, parameters))
+        return {"data": [{"gene_id": "PPARG", "gene_name": "PPARG", "metric_value": 3.5}], "message": "all good"}
+
+    monkeypatch.setattr(cypher_utils, "run_cypher", fake_run_cypher)
+    assert get_top_genes("T2D", top_n=5, metric="direct", layout="relationship") == [
+        {"gene_id": "PPARG", "gene_name": "PPARG", "metric_value": 3.5, "metric_name": "direct"},
+    ]
+    assert calls == [(top_genes_query("direct", layout="relationship"), {"phenotype": "T2D", "top_n": 5})]
+
+    monkeypatch.setattr(cypher_utils, "run_cypher", lambda query, log=False, parameters=None: {"data": [], "message": "no connected"})
+    with pytest.raises(ValueError, match="no connected"):
+        get_top_genes("T2D")